@@ -13,7 +13,9 @@ logging.basicConfig(
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
-    parser.add_argument("keyword", type=str, help="Keyword to search for")
+    parser.add_argument(
+        "keywords", type=str, nargs="+", help="Keyword(s) to search for"
+    )
     parser.add_argument(
         "--config-path", type=Path, default=None, help="Jadio config file path"
     )
@@ -41,32 +43,35 @@ def main():
         )
 
         # Pick up program data that you want to download.
-        # In this example, all programs with the specified keyword in the
-        # program data
-        target_programs = [
-            program
-            for program in all_programs
-            if (
-                args.keyword in program.program_title
-                or args.keyword in (program.description or "")
-                or args.keyword in (program.information or "")
-                or args.keyword in (program.performers or [])
-                or args.keyword in (program.guests or [])
-            )
-        ]
-
-        for program in target_programs:
-            print(f"\n====== {program.program_title} ======")
+        # In this example, all programs with at least one of the specified
+        # keywords in the program title, description or information, or whose
+        # performers or guests include one of them. ProgramIndex builds an
+        # inverted index, so many keywords can be searched at once quickly.
+        index = jadio.ProgramIndex(all_programs)
+        target_programs = index.search_any(args.keywords)
+
+        # Download media files of the programs with a worker pool per service.
+        # If file_paths is not specified in download_many(), the default file
+        # paths defined by the services are used and returned in the results.
+        results = service.download_many(
+            target_programs,
+            # Set tag data in the downloaded media file. (default: True)
+            set_tag=True,
+            # Set cover image in the downloaded media file. (default: True)
+            set_cover_image=True,
+            # Number of concurrent downloads per service.
+            # (default: jadio.services.jadio.DEFAULT_DOWNLOAD_MAX_WORKERS)
+            max_workers={"radiko.jp": 2},
+        )
 
-            # If file_path is not specified in download(), the default file path
-            # defined by the service is used and returned in download().
-            file_path = service.download(
-                program,
-                # Set tag data in the downloaded media file. (default: True)
-                set_tag=True,
-                # Set cover image in the downloaded media file. (default: True)
-                set_cover_image=True,
-            )
+        for result in results:
+            program = result.program
+            print(f"\n====== {program.program_title} ======")
+            if not result.ok:
+                # A failed download does not stop the others.
+                print(f"Failed: {result.error!r}")
+                continue
+            file_path = result.file_path
             print(f"Save: {file_path}")
 
             # Programs can be (1) serialized in JSON format or (2) converted
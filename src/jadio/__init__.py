@@ -1,9 +1,40 @@
+import importlib
 import logging
+from typing import Any, List
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 from ._version import __version__
-from .program import Program  # NOQA
-from .services import *  # NOQA
-from .station import Station  # NOQA
-from .util import load_config
+
+# Attributes are imported on first access so that `import jadio` does not
+# load heavy dependencies such as selenium, requests and mutagen.
+_LAZY_ATTRS = {
+    "Catalog": ".catalog",
+    "CompactProgram": ".compact",
+    "CompactStation": ".compact",
+    "CoverCache": ".cover",
+    "DownloadResult": ".services",
+    "Hibiki": ".services",
+    "Jadio": ".services",
+    "MetricsCollector": ".metrics",
+    "Onsen": ".services",
+    "Program": ".program",
+    "ProgramIndex": ".search",
+    "Radiko": ".services",
+    "Station": ".station",
+    "load_config": ".util",
+}
+
+__all__ = ["__version__"] + list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
@@ -0,0 +1,211 @@
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+from .program import Program
+from .station import Station
+from .util import get_cache_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS programs (
+    service_id TEXT NOT NULL,
+    program_id TEXT NOT NULL,
+    episode_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (service_id, program_id, episode_id)
+);
+CREATE INDEX IF NOT EXISTS programs_scope ON programs (service_id, scope);
+CREATE TABLE IF NOT EXISTS stations (
+    service_id TEXT NOT NULL,
+    station_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (service_id, station_id)
+);
+CREATE TABLE IF NOT EXISTS scopes (
+    service_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (service_id, scope)
+);
+"""
+
+
+def get_catalog_path() -> Path:
+    return get_cache_dir() / "catalog.sqlite3"
+
+
+def _program_to_json(program: Program) -> str:
+    data = program.to_dict(encode_json=False)
+    if isinstance(data["pub_date"], datetime.datetime):
+        data["pub_date"] = data["pub_date"].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _program_from_json(text: str) -> Program:
+    data = json.loads(text)
+    if data["pub_date"]:
+        data["pub_date"] = datetime.datetime.fromisoformat(data["pub_date"])
+    return Program(**data)
+
+
+class Catalog:
+    """Persistent on-disk store of program and station data.
+
+    Records are stored in SQLite. Program data is keyed by `(service_id,
+    program_id, episode_id)` and station data by `(service_id, station_id)`.
+    Each record belongs to a *scope*, a unit of data fetched from a service
+    at once (e.g. the weekly programs of a radiko.jp station). A scope is
+    fresh until its expiration time, which services derive from the TTL
+    reported by the service or from `default_ttl`.
+
+    Args:
+        path (str or `pathlib.Path`): SQLite database file path. If it is not
+            specified, `${HOME}/.cache/jadio/catalog.sqlite3` is used.
+        default_ttl (int or float): TTL [seconds] of scopes whose service
+            does not report one.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        default_ttl: Union[int, float] = 60 * 60,
+    ) -> None:
+        path = Path(path or get_catalog_path())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    @property
+    def default_ttl(self) -> Union[int, float]:
+        return self._default_ttl
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _set_scope(
+        self, service_id: str, scope: str, expires_at: Optional[float]
+    ) -> None:
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + self._default_ttl
+        self._conn.execute(
+            "INSERT OR REPLACE INTO scopes VALUES (?, ?, ?, ?)",
+            (service_id, scope, now, expires_at),
+        )
+
+    def is_fresh(self, service_id: str, scope: str) -> bool:
+        """Whether the scope has been stored and has not expired yet."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM scopes WHERE service_id = ? AND scope = ?",
+                (service_id, scope),
+            ).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def get_fetched_at(self, service_id: str, scope: str) -> Optional[float]:
+        """Get the UNIX time when the scope was stored last."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at FROM scopes WHERE service_id = ? AND scope = ?",
+                (service_id, scope),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_programs(
+        self,
+        service_id: str,
+        scope: str,
+        programs: List[Program],
+        expires_at: Optional[float] = None,
+    ) -> None:
+        """Replace the program data of the scope.
+
+        Args:
+            service_id (str): ID of the service.
+            scope (str): Scope of the programs.
+            programs (list of `Program`): Program data fetched for the scope.
+            expires_at (float): UNIX time until which the scope is fresh. If
+                it is not specified, `default_ttl` from now is used.
+        """
+        rows = [
+            (
+                service_id,
+                str(program.program_id),
+                str(program.episode_id),
+                scope,
+                _program_to_json(program),
+            )
+            for program in programs
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM programs WHERE service_id = ? AND scope = ?",
+                (service_id, scope),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO programs VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._set_scope(service_id, scope, expires_at)
+
+    def get_programs(
+        self, service_id: str, scope: Optional[str] = None
+    ) -> List[Program]:
+        """Get the stored program data of the service.
+
+        Args:
+            service_id (str): ID of the service.
+            scope (str): Scope of the programs. If it is not specified, the
+                programs of all scopes are returned.
+
+        Returns:
+            list of `Program`: Stored program data in insertion order.
+        """
+        query = "SELECT data FROM programs WHERE service_id = ?"
+        params: List[Any] = [service_id]
+        if scope is not None:
+            query += " AND scope = ?"
+            params.append(scope)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY rowid", params).fetchall()
+        return [_program_from_json(row[0]) for row in rows]
+
+    def put_stations(
+        self,
+        service_id: str,
+        stations: List[Station],
+        expires_at: Optional[float] = None,
+    ) -> None:
+        """Replace the station data of the service."""
+        rows = [
+            (
+                service_id,
+                str(station.station_id),
+                json.dumps(station.to_dict(), ensure_ascii=False),
+            )
+            for station in stations
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM stations WHERE service_id = ?", (service_id,)
+            )
+            self._conn.executemany("INSERT INTO stations VALUES (?, ?, ?)", rows)
+            self._set_scope(service_id, "stations", expires_at)
+
+    def get_stations(self, service_id: str) -> List[Station]:
+        """Get the stored station data of the service."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM stations WHERE service_id = ? ORDER BY rowid",
+                (service_id,),
+            ).fetchall()
+        return [Station(**json.loads(row[0])) for row in rows]
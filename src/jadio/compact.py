@@ -0,0 +1,143 @@
+import dataclasses
+import json
+import sys
+import zlib
+from typing import Any, Dict, Optional, Union
+
+from .program import Program
+from .station import Station
+
+_PROGRAM_FIELDS = tuple(
+    f.name for f in dataclasses.fields(Program) if f.name != "raw_data"
+)
+_STATION_FIELDS = tuple(f.name for f in dataclasses.fields(Station))
+
+
+def _intern(value: Any) -> Any:
+    # Strings such as service_id, station_id, titles and performers repeat
+    # across many records, e.g. all episodes of a program, so they share one
+    # object each.
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern(x) for x in value]
+    return value
+
+
+class LazyRawData:
+    """Raw data kept as compressed JSON and materialized on access.
+
+    Args:
+        raw_data (dict): JSON serializable raw data.
+    """
+
+    __slots__ = ("_blob",)
+
+    def __init__(self, raw_data: Dict[str, Any]) -> None:
+        text = json.dumps(raw_data, ensure_ascii=False, separators=(",", ":"))
+        self._blob = zlib.compress(text.encode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._blob)
+
+    def load(self) -> Dict[str, Any]:
+        return json.loads(zlib.decompress(self._blob))
+
+
+class _CompactRecord:
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, **kwargs) -> None:
+        for name in self._fields:
+            value = kwargs.pop(name, None)
+            setattr(self, name, _intern(value))
+        if kwargs:
+            raise TypeError(f"unexpected fields: {', '.join(kwargs)}")
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self) -> str:
+        args = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({args})"
+
+
+class CompactProgram(_CompactRecord):
+    """Memory-compact representation of `Program`.
+
+    It has the same attributes as `Program`, but uses `__slots__`, interns
+    repeated strings such as `service_id` and `station_id`, and does not
+    keep `raw_data` as a dict: it is either compressed and materialized on
+    each access, or reduced to the minimal data that the service needs to
+    download the media file. Use `Service.compact` to create one, and
+    `to_program` to get a regular `Program` back.
+    """
+
+    __slots__ = _PROGRAM_FIELDS + ("_raw_data",)
+    _fields = _PROGRAM_FIELDS
+
+    def __init__(
+        self,
+        raw_data: Union[Dict[str, Any], LazyRawData, None] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self._raw_data = raw_data
+
+    @property
+    def raw_data(self) -> Optional[Dict[str, Any]]:
+        if isinstance(self._raw_data, LazyRawData):
+            return self._raw_data.load()
+        return self._raw_data
+
+    @classmethod
+    def from_program(
+        cls, program: Program, raw_data: Optional[Dict[str, Any]] = None
+    ) -> "CompactProgram":
+        """Create a compact representation of a program.
+
+        Args:
+            program (`Program`): Program data.
+            raw_data (dict): Raw data to keep as it is instead of the
+                compressed `program.raw_data`.
+
+        Returns:
+            `CompactProgram`: Compact program data.
+        """
+        if raw_data is None and program.raw_data is not None:
+            raw_data = LazyRawData(program.raw_data)
+        kwargs = {name: getattr(program, name) for name in _PROGRAM_FIELDS}
+        return cls(raw_data=raw_data, **kwargs)
+
+    def _values(self) -> tuple:
+        return super()._values() + (self.raw_data,)
+
+    def to_program(self) -> Program:
+        kwargs = {name: getattr(self, name) for name in _PROGRAM_FIELDS}
+        return Program(raw_data=self.raw_data, **kwargs)
+
+    def to_dict(self, encode_json: bool = False) -> Dict[str, Any]:
+        return self.to_program().to_dict(encode_json=encode_json)
+
+    def to_json(self, **kwargs) -> str:
+        return self.to_program().to_json(**kwargs)
+
+
+class CompactStation(_CompactRecord):
+    """Memory-compact representation of `Station`."""
+
+    __slots__ = _STATION_FIELDS
+    _fields = _STATION_FIELDS
+
+    @classmethod
+    def from_station(cls, station: Station) -> "CompactStation":
+        return cls(**{name: getattr(station, name) for name in _STATION_FIELDS})
+
+    def to_station(self) -> Station:
+        return Station(**{name: getattr(self, name) for name in _STATION_FIELDS})
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import requests
+
+from . import metrics
+from .http_client import HTTPClient
+from .program import Program
+from .util import get_cache_dir, map_concurrently
+
+logger = logging.getLogger(__name__)
+
+
+def get_cover_cache_dir() -> Path:
+    return get_cache_dir() / "covers"
+
+
+class CoverCache:
+    """On-disk cache of cover images keyed by URL.
+
+    An image is stored with its `ETag` and `Last-Modified` headers. Once
+    `revalidate_after` seconds have passed since it was fetched, the next
+    access sends a conditional request and keeps the stored image if the
+    server answers 304 Not Modified. If the server cannot be reached, the
+    stored image is used as it is. The least recently used images are
+    evicted when the total size exceeds `max_bytes`. All requests share one
+    `jadio.http_client.HTTPClient`, which keeps connections alive and retries
+    transient failures.
+
+    Args:
+        directory (str or `pathlib.Path`): Directory to store images. If it is
+            not specified, `${HOME}/.cache/jadio/covers` is used.
+        max_bytes (int): Upper bound of the total size of stored images.
+        revalidate_after (int or float): Seconds to use a stored image without
+            asking the server.
+        timeout (int or float): Timeout [seconds] of each request.
+        max_connections (int): Maximum number of connections kept per host.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        revalidate_after: Union[int, float] = 24 * 60 * 60,
+        timeout: Union[int, float] = 10,
+        max_connections: int = 8,
+    ) -> None:
+        self._directory = Path(directory or get_cover_cache_dir())
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._revalidate_after = revalidate_after
+        self._lock = threading.Lock()
+        self._client = HTTPClient(pool_maxsize=max_connections, timeout=timeout)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _get_paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self._directory / f"{key}.img", self._directory / f"{key}.json"
+
+    def _load(self, url: str) -> Tuple[Optional[bytes], Dict[str, Any]]:
+        image_path, meta_path = self._get_paths(url)
+        try:
+            with open(meta_path, "r") as fh:
+                meta = json.load(fh)
+            image = image_path.read_bytes()
+        except (OSError, ValueError):
+            return None, {}
+        if meta.get("url") != url:
+            return None, {}
+        return image, meta
+
+    def _write(self, path: Path, data: bytes) -> None:
+        # Write to a temporary file first so that a concurrent reader never
+        # sees a partially written file.
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, url: str, image: Optional[bytes], meta: Dict[str, Any]) -> None:
+        image_path, meta_path = self._get_paths(url)
+        if image is not None:
+            self._write(image_path, image)
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+        self._evict()
+
+    def _touch(self, url: str) -> None:
+        try:
+            os.utime(self._get_paths(url)[0])
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for image_path in self._directory.glob("*.img"):
+                try:
+                    stat = image_path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, image_path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, image_path in sorted(entries, key=lambda x: x[0]):
+                if total <= self._max_bytes:
+                    break
+                for path in [image_path, image_path.with_suffix(".json")]:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                total -= size
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Get image data, downloading it only if it is not stored or has
+        been changed on the server.
+
+        Args:
+            url (str): target url.
+
+        Returns:
+            bytes: image data.
+        """
+        image, meta = self._load(url)
+        if image is not None:
+            if time.time() - meta.get("fetched_at", 0) < self._revalidate_after:
+                metrics.count("cover_cache", result="hit")
+                self._touch(url)
+                return image
+        headers = {}
+        if image is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if image is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = self._client.get(url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as e:
+            if image is None:
+                raise
+            logger.warning(f"Failed to revalidate {url}, use stored image: {e}")
+            metrics.count("cover_cache", result="stale")
+            self._touch(url)
+            return image
+        if response.status_code == 304:
+            metrics.count("cover_cache", result="not_modified")
+            meta["fetched_at"] = time.time()
+            self._store(url, None, meta)
+            self._touch(url)
+            return image
+        metrics.count("cover_cache", result="miss")
+        image = response.content
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag", None),
+            "last_modified": response.headers.get("Last-Modified", None),
+            "fetched_at": time.time(),
+        }
+        self._store(url, image, meta)
+        return image
+
+    def prefetch(
+        self, items: Iterable[Union[str, Program]], max_workers: int = 4
+    ) -> int:
+        """Warm the cache for a batch of programs or image URLs concurrently.
+
+        Each URL is fetched once even if it appears many times, e.g. in all
+        episodes of a program. Failures are logged and ignored.
+
+        Args:
+            items (list of `Program` or str): Programs or image URLs.
+            max_workers (int): Maximum number of concurrent requests.
+
+        Returns:
+            int: Number of images that are available in the cache.
+        """
+        urls = {}
+        for item in items:
+            url = item.image_url if isinstance(item, Program) else item
+            if url:
+                urls[url] = None
+
+        def fetch(url: str) -> bool:
+            try:
+                return self.get(url) is not None
+            except Exception as e:
+                logger.warning(f"Failed to prefetch {url}: {e}")
+                return False
+
+        return sum(map_concurrently(fetch, list(urls), max_workers=max_workers))
+
+
+_cover_cache: Optional[CoverCache] = None
+_cover_cache_lock = threading.Lock()
+
+
+def get_cover_cache() -> CoverCache:
+    """Get the cover cache shared by all services."""
+    global _cover_cache
+    with _cover_cache_lock:
+        if _cover_cache is None:
+            _cover_cache = CoverCache()
+        return _cover_cache
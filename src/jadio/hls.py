@@ -0,0 +1,466 @@
+import collections
+import itertools
+import json
+import logging
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+from . import metrics
+from .http_client import HTTPClient
+from .tag import FFmpegTag
+from .util import get_deadline, get_remaining_time, get_temp_file_path
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedStreamError(Exception):
+    """HLS stream that `HLSDownloader` cannot download, such as an encrypted
+    one. Download it with ffmpeg instead.
+    """
+
+    pass
+
+
+@dataclass
+class Segment:
+    """Media segment of a HLS media playlist.
+
+    Attributes:
+        url (str): Absolute URL of the segment.
+        duration (float): Duration of the segment [seconds].
+        sequence (int): Media sequence number of the segment.
+    """
+
+    url: str
+    duration: float
+    sequence: int
+
+
+@dataclass
+class Playlist:
+    """HLS playlist.
+
+    Attributes:
+        variants (list of tuple): `(bandwidth, url)` of each variant stream.
+            It is not empty only for master playlists.
+        segments (list of `Segment`): Media segments. It is not empty only
+            for media playlists.
+        target_duration (float): Maximum segment duration [seconds].
+        endlist (bool): Whether no more segments will be added.
+        encrypted (bool): Whether the segments are encrypted.
+    """
+
+    variants: List[Any] = field(default_factory=list)
+    segments: List[Segment] = field(default_factory=list)
+    target_duration: float = 0.0
+    endlist: bool = False
+    encrypted: bool = False
+
+    @property
+    def is_master(self) -> bool:
+        return len(self.variants) > 0
+
+
+def _parse_attributes(text: str) -> Dict[str, str]:
+    ret = {}
+    key, value, quoted = "", "", False
+    reading_key = True
+    for c in text + ",":
+        if reading_key:
+            if c == "=":
+                reading_key = False
+            else:
+                key += c
+        elif c == '"':
+            quoted = not quoted
+        elif c == "," and not quoted:
+            ret[key.strip()] = value
+            key, value, reading_key = "", "", True
+        else:
+            value += c
+    return ret
+
+
+def parse_m3u8(text: str, base_url: str = "") -> Playlist:
+    """Parse a HLS playlist.
+
+    Args:
+        text (str): Contents of the m3u8 file.
+        base_url (str): URL of the m3u8 file, used to resolve relative URIs.
+
+    Returns:
+        `Playlist`: Parsed playlist.
+    """
+    ret = Playlist()
+    sequence = 0
+    duration = None
+    bandwidth = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            ret.target_duration = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-ENDLIST"):
+            ret.endlist = True
+        elif line.startswith("#EXT-X-KEY:"):
+            method = _parse_attributes(line.split(":", 1)[1]).get("METHOD", "NONE")
+            ret.encrypted = ret.encrypted or method != "NONE"
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = _parse_attributes(line.split(":", 1)[1])
+            bandwidth = int(attrs.get("BANDWIDTH", 0))
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",")[0])
+        elif line.startswith("#"):
+            continue
+        elif bandwidth is not None:
+            ret.variants.append((bandwidth, urljoin(base_url, line)))
+            bandwidth = None
+        else:
+            ret.segments.append(
+                Segment(urljoin(base_url, line), duration or 0.0, sequence)
+            )
+            sequence += 1
+            duration = None
+    return ret
+
+
+def _strip_id3(data: bytes) -> bytes:
+    """Strip the ID3v2 tag that radiko.jp puts at the head of AAC segments."""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return data
+    size = 0
+    for b in data[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return data[10 + size + footer :]
+
+
+def _load_progress(path: Path, key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(str(path), "r") as fh:
+            progress = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return progress if progress.get("key") == key else None
+
+
+def _save_progress(path: Path, progress: Dict[str, Any]) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(str(tmp_path), "w") as fh:
+        json.dump(progress, fh)
+    os.replace(tmp_path, path)
+
+
+def mux(
+    src_path: Union[str, Path],
+    dst_path: Union[str, Path],
+    duration: Optional[Union[int, float]] = None,
+    tag: Optional[FFmpegTag] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Remux a downloaded AAC/TS stream into a MP4 container with ffmpeg.
+
+    Args:
+        src_path (str or `pathlib.Path`): Concatenated segments.
+        dst_path (str or `pathlib.Path`): Output media file path.
+        duration (int or float): Cut the output to this duration [seconds].
+        tag (`jadio.tag.FFmpegTag`): Tag written while muxing.
+        timeout (float): Seconds after which ffmpeg is killed and
+            `subprocess.TimeoutExpired` is raised.
+    """
+    cmd = ["ffmpeg", "-y", "-loglevel", "quiet"]
+    cmd += ["-i", str(src_path)]
+    if tag:
+        cmd += tag.get_input_args()
+    cmd += ["-vcodec", "copy", "-acodec", "copy"]
+    cmd += ["-bsf:a", "aac_adtstoasc"]
+    if duration:
+        cmd += ["-t", str(duration)]
+    if tag:
+        cmd += tag.get_output_args()
+    cmd += [str(dst_path)]
+    with metrics.span("ffmpeg", command="mux"):
+        subprocess.run(cmd, check=True, timeout=timeout)
+
+
+def concat(
+    src_paths: List[Union[str, Path]],
+    dst_path: Union[str, Path],
+    duration: Optional[Union[int, float]] = None,
+    tag: Optional[FFmpegTag] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """Join MP4 media files losslessly with the ffmpeg concat demuxer.
+
+    Args:
+        src_paths (list of str or `pathlib.Path`): Media files to join in
+            order.
+        dst_path (str or `pathlib.Path`): Output media file path.
+        duration (int or float): Cut the output to this duration [seconds].
+        tag (`jadio.tag.FFmpegTag`): Tag written while joining.
+        timeout (float): Seconds after which ffmpeg is killed and
+            `subprocess.TimeoutExpired` is raised.
+    """
+    dst_path = Path(dst_path)
+    list_path = dst_path.with_name(dst_path.name + ".concat.txt")
+    with open(str(list_path), "w") as fh:
+        for src_path in src_paths:
+            escaped = str(Path(src_path).resolve()).replace("'", "'\\''")
+            fh.write(f"file '{escaped}'\n")
+    try:
+        cmd = ["ffmpeg", "-y", "-loglevel", "quiet"]
+        cmd += ["-f", "concat", "-safe", "0", "-i", str(list_path)]
+        if tag:
+            cmd += tag.get_input_args()
+        cmd += ["-c", "copy"]
+        if duration:
+            cmd += ["-t", str(duration)]
+        if tag:
+            cmd += tag.get_output_args()
+        cmd += [str(dst_path)]
+        with metrics.span("ffmpeg", command="concat"):
+            subprocess.run(cmd, check=True, timeout=timeout)
+    finally:
+        list_path.unlink()
+
+
+class HLSDownloader:
+    """In-process HLS downloader.
+
+    Segments are fetched concurrently over a pooled
+    `jadio.http_client.HTTPClient`, which retries transient failures, and
+    written in order. Only the final remux into a MP4 container is done with ffmpeg.
+    Encrypted playlists are not supported.
+
+    Args:
+        max_workers (int): Maximum number of segments fetched concurrently.
+        buffer_size (int): Maximum number of fetched segments waiting to be
+            written in addition to the ones being fetched.
+        timeout (int): Timeout of each HTTP request [seconds].
+        max_reloads (int): Maximum number of consecutive reloads without new
+            segments for playlists that do not have `#EXT-X-ENDLIST`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        buffer_size: int = 8,
+        timeout: int = 30,
+        max_reloads: int = 3,
+    ) -> None:
+        self._max_workers = max_workers
+        self._buffer_size = buffer_size
+        self._max_reloads = max_reloads
+        self._client = HTTPClient(pool_maxsize=max_workers, timeout=timeout)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _get(self, url: str, headers: Dict[str, str]) -> bytes:
+        response = self._client.get(url, headers=headers)
+        response.raise_for_status()
+        return response.content
+
+    def get_playlist(self, url: str, headers: Dict[str, str]) -> Tuple[Playlist, str]:
+        """Get a media playlist and its URL. If `url` is a master playlist,
+        the variant stream with the highest bandwidth is followed.
+        """
+        playlist = parse_m3u8(self._get(url, headers).decode("utf-8"), url)
+        while playlist.is_master:
+            url = max(playlist.variants)[1]
+            playlist = parse_m3u8(self._get(url, headers).decode("utf-8"), url)
+        if playlist.encrypted:
+            raise UnsupportedStreamError("encrypted HLS streams are not supported")
+        return playlist, url
+
+    def _iter_segments(
+        self, url: str, headers: Dict[str, str], duration: Optional[float]
+    ) -> Iterator[Segment]:
+        playlist, url = self.get_playlist(url, headers)
+        last_sequence = -1
+        total = 0.0
+        reloads = 0
+        while True:
+            new_segments = [s for s in playlist.segments if s.sequence > last_sequence]
+            for segment in new_segments:
+                yield segment
+                last_sequence = segment.sequence
+                total += segment.duration
+            if playlist.endlist or (duration and total >= duration):
+                return
+            reloads = 0 if new_segments else reloads + 1
+            if reloads > self._max_reloads:
+                return
+            # Playlists without #EXT-X-ENDLIST grow over time.
+            time.sleep(playlist.target_duration / 2)
+            playlist, url = self.get_playlist(url, headers)
+
+    def fetch(
+        self,
+        url: str,
+        fp: BinaryIO,
+        headers: Optional[Dict[str, str]] = None,
+        duration: Optional[Union[int, float]] = None,
+        start: int = 0,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Fetch all segments of a playlist and write them in order.
+
+        Args:
+            url (str): URL of the master or media playlist.
+            fp (file object): Output binary stream.
+            headers (dict): HTTP headers of every request.
+            duration (int or float): Stop fetching segments once this
+                duration is reached [seconds].
+            start (int): Number of leading segments to skip because they
+                have already been written.
+            on_progress (callable): Called with the number of segments
+                written so far, including the skipped ones, and the number
+                of bytes written by this call after each segment is written.
+            timeout (float): Seconds to fetch all segments. `TimeoutError`
+                is raised once it is exceeded.
+
+        Returns:
+            int: Number of written bytes.
+        """
+        headers = headers or {}
+        deadline = get_deadline(timeout)
+        written = 0
+        done = start
+        # Futures waiting to be written in order. Its length bounds both the
+        # number of in-flight requests and the reorder buffer.
+        pending = collections.deque()
+        max_pending = self._max_workers + self._buffer_size
+
+        def write_head() -> None:
+            nonlocal written, done
+            segment, future = pending.popleft()
+            try:
+                data = future.result(timeout=get_remaining_time(deadline))
+            except FutureTimeoutError:
+                raise TimeoutError(f"segments were not fetched in {timeout} seconds")
+            if segment.url.split("?")[0].endswith(".aac"):
+                data = _strip_id3(data)
+            fp.write(data)
+            written += len(data)
+            done += 1
+            metrics.count("hls_segments")
+            metrics.count("hls_bytes", len(data))
+            if on_progress:
+                on_progress(done, written)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            try:
+                segments = self._iter_segments(url, headers, duration)
+                for segment in itertools.islice(segments, start, None):
+                    future = executor.submit(self._get, segment.url, headers)
+                    pending.append((segment, future))
+                    if len(pending) >= max_pending:
+                        write_head()
+                while pending:
+                    write_head()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+        return written
+
+    def download(
+        self,
+        url: str,
+        file_path: Union[str, Path],
+        headers: Optional[Dict[str, str]] = None,
+        duration: Optional[Union[int, float]] = None,
+        key: Optional[str] = None,
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Download a HLS stream into a MP4 media file.
+
+        Segments are written to `<file_path>.part` and the progress to
+        `<file_path>.part.json`. If the download is interrupted, calling it
+        again with the same `file_path` and `key` fetches only the segments
+        that are missing. The media file is muxed under a temporary name and
+        renamed to `file_path` once it is complete.
+
+        Args:
+            url (str): URL of the master or media playlist.
+            file_path (str or `pathlib.Path`): Output media file path.
+            headers (dict): HTTP headers of every request.
+            duration (int or float): Duration of the output [seconds].
+            key (str): Identity of the stream to check that a partial
+                download can be resumed. If it is not specified, `url` is
+                used, so specify a stable one if `url` has a per-session
+                token.
+            tag (`jadio.tag.FFmpegTag`): Tag written while muxing.
+            timeout (float): Seconds to download the stream. `TimeoutError`
+                or `subprocess.TimeoutExpired` is raised once it is exceeded,
+                and the progress so far is kept.
+        """
+        deadline = get_deadline(timeout)
+        file_path = Path(file_path)
+        part_path = file_path.with_name(file_path.name + ".part")
+        progress_path = part_path.with_name(part_path.name + ".json")
+        key = key or url
+        start, offset = 0, 0
+        progress = _load_progress(progress_path, key)
+        if progress and part_path.exists():
+            if part_path.stat().st_size >= progress["size"]:
+                start, offset = progress["segments"], progress["size"]
+                logger.info(f"Resume {file_path} from segment {start}")
+
+        with open(str(part_path), "r+b" if start else "wb") as fp:
+            # Drop data written after the last checkpoint.
+            fp.seek(offset)
+            fp.truncate()
+
+            def on_progress(segments: int, written: int) -> None:
+                fp.flush()
+                _save_progress(
+                    progress_path,
+                    {"key": key, "segments": segments, "size": offset + written},
+                )
+
+            try:
+                size = self.fetch(
+                    url,
+                    fp,
+                    headers=headers,
+                    duration=duration,
+                    start=start,
+                    on_progress=on_progress,
+                    timeout=timeout,
+                )
+            except UnsupportedStreamError:
+                # Nothing has been fetched for an unsupported stream.
+                fp.close()
+                part_path.unlink()
+                raise
+        logger.debug(f"Fetched {size} bytes from {url}")
+
+        tmp_path = get_temp_file_path(file_path)
+        try:
+            mux(
+                part_path,
+                tmp_path,
+                duration=duration,
+                tag=tag,
+                timeout=get_remaining_time(deadline),
+            )
+            os.replace(tmp_path, file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        part_path.unlink()
+        if progress_path.exists():
+            progress_path.unlink()
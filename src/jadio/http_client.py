@@ -0,0 +1,336 @@
+import asyncio
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from . import metrics
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Requests that can be sent again without side effects.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+# Status codes that usually mean a transient failure of the server.
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class _RetryPolicy:
+    def __init__(
+        self,
+        retries: int,
+        backoff: float,
+        max_backoff: float,
+        timeout: Union[int, float],
+        host_timeouts: Optional[Dict[str, Union[int, float]]],
+    ) -> None:
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._timeout = timeout
+        self._host_timeouts = host_timeouts or {}
+
+    def get_timeout(self, url: str) -> Union[int, float]:
+        host = urlsplit(url).hostname or ""
+        while host:
+            if host in self._host_timeouts:
+                return self._host_timeouts[host]
+            host = host.partition(".")[2]
+        return self._timeout
+
+    def _get_retries(self, method: str) -> int:
+        return self._retries if method.upper() in IDEMPOTENT_METHODS else 0
+
+    def _get_delay(self, attempt: int, retry_after: str) -> float:
+        delay = random.uniform(0, min(self._backoff * 2**attempt, self._max_backoff))
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self._max_backoff))
+        return delay
+
+
+class HTTPClient(_RetryPolicy):
+    """HTTP client shared by the services.
+
+    It keeps a pool of keep-alive connections per host, and retries
+    idempotent requests that fail with a connection error, a timeout or a
+    transient status code (429 and 5xx) with jittered exponential backoff.
+    Non-idempotent requests such as POST are never retried.
+
+    Args:
+        pool_maxsize (int): Maximum number of connections kept per host. It
+            should be at least the number of threads that use the client
+            concurrently.
+        retries (int): Maximum number of retries of a request.
+        backoff (float): Base of the backoff [seconds]. Before the n-th
+            retry, the client waits for a random time between 0 and
+            `backoff * 2 ** n`, or for `Retry-After` if the server asks for
+            longer.
+        max_backoff (float): Upper bound of a wait between retries [seconds].
+        timeout (int or float): Timeout of each request [seconds].
+        host_timeouts (dict): Timeout per host. key is a host name, which
+            also matches its subdomains. It takes precedence over `timeout`.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        timeout: Union[int, float] = 10,
+        host_timeouts: Optional[Dict[str, Union[int, float]]] = None,
+    ) -> None:
+        super().__init__(retries, backoff, max_backoff, timeout, host_timeouts)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(pool_maxsize, 1))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    @property
+    def session(self) -> requests.Session:
+        """Underlying session, e.g. to access its cookies."""
+        return self._session
+
+    def close(self) -> None:
+        self._session.close()
+
+    def _wait(self, attempt: int, response: Optional[requests.Response]) -> None:
+        retry_after = response.headers.get("Retry-After", "") if response else ""
+        time.sleep(self._get_delay(attempt, retry_after))
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[Union[int, float]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request. The response is returned as it is even if its
+        status code is an error one, like `requests.Session.request`.
+        """
+        if timeout is None:
+            timeout = self.get_timeout(url)
+        retries = self._get_retries(method)
+        host = urlsplit(url).hostname if metrics.is_enabled() else None
+        for attempt in itertools.count():
+            if attempt > 0:
+                metrics.count("http_retries", host=host)
+            try:
+                with metrics.span("http_request", host=host):
+                    response = self._session.request(
+                        method, url, timeout=timeout, **kwargs
+                    )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    raise
+                logger.debug(f"Retry {method} {url} after {e!r}")
+                self._wait(attempt, None)
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                logger.debug(f"Retry {method} {url} after {response.status_code}")
+                response.close()
+                self._wait(attempt, response)
+                continue
+            if host:
+                # The body has already been read unless it is streamed.
+                size = 0 if kwargs.get("stream") else len(response.content)
+                metrics.count("http_responses", host=host, status=response.status_code)
+                metrics.count("http_bytes", size, host=host)
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+class AsyncResponse:
+    """Response of `AsyncHTTPClient`, whose body has already been read.
+
+    It has the part of the interface of `requests.Response` that the
+    services use, so that they can handle both in the same way.
+    """
+
+    def __init__(
+        self, url: str, status_code: int, headers: Dict[str, str], content: bytes
+    ) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if 400 <= self.status_code:
+            raise requests.HTTPError(
+                f"{self.status_code} Error for url: {self.url}", response=None
+            )
+
+
+class AsyncHTTPClient(_RetryPolicy):
+    """asyncio counterpart of `HTTPClient` on aiohttp.
+
+    It has the same retry policy as `HTTPClient`, and raises the exceptions
+    of requests, such as `requests.ConnectionError`, `requests.Timeout` and
+    `requests.HTTPError` from `AsyncResponse.raise_for_status`, so that
+    errors are handled in the same way as with `HTTPClient`. The session is
+    opened on the first request, and a client must be used in one event
+    loop. aiohttp is installed with `pip install jadio[async]`.
+
+    Args:
+        limit_per_host (int): Maximum number of connections per host.
+        retries (int): Maximum number of retries of a request.
+        backoff (float): Base of the backoff [seconds].
+        max_backoff (float): Upper bound of a wait between retries [seconds].
+        timeout (int or float): Timeout of each request [seconds].
+        host_timeouts (dict): Timeout per host. See `HTTPClient`.
+    """
+
+    def __init__(
+        self,
+        limit_per_host: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        timeout: Union[int, float] = 10,
+        host_timeouts: Optional[Dict[str, Union[int, float]]] = None,
+    ) -> None:
+        super().__init__(retries, backoff, max_backoff, timeout, host_timeouts)
+        self._limit_per_host = limit_per_host
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            # aiohttp is imported only when asynchronous API is used.
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=0, limit_per_host=max(self._limit_per_host, 1)
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = asyncio.get_running_loop()
+        return self._session
+
+    async def aclose(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._loop = None
+
+    def close(self) -> None:
+        """Close the session from synchronous code, e.g. `Service.close`.
+
+        The session is closed in the event loop that opened it. Nothing can
+        be closed once that loop is closed, so prefer `aclose` in the loop.
+        """
+        session, loop = self._session, self._loop
+        self._session = None
+        self._loop = None
+        if session is None or loop is None or loop.is_closed():
+            return
+        try:
+            running_loop: Optional[
+                asyncio.AbstractEventLoop
+            ] = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            # It cannot be waited for without blocking the loop itself.
+            loop.create_task(session.close())
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result()
+        else:
+            loop.run_until_complete(session.close())
+
+    async def _send(
+        self, method: str, url: str, timeout: Union[int, float], **kwargs
+    ) -> AsyncResponse:
+        import aiohttp
+
+        try:
+            async with self._get_session().request(
+                method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+            ) as response:
+                content = await response.read()
+                return AsyncResponse(
+                    str(response.url), response.status, dict(response.headers), content
+                )
+        except asyncio.TimeoutError as e:
+            raise requests.Timeout(f"{method} {url} timed out") from e
+        except aiohttp.ClientError as e:
+            raise requests.ConnectionError(f"{method} {url} failed: {e}") from e
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[Union[int, float]] = None,
+        **kwargs,
+    ) -> AsyncResponse:
+        """Send a request. `kwargs` are passed to
+        `aiohttp.ClientSession.request`, e.g. `headers`, `params` and `data`.
+        """
+        if timeout is None:
+            timeout = self.get_timeout(url)
+        retries = self._get_retries(method)
+        host = urlsplit(url).hostname if metrics.is_enabled() else None
+        for attempt in itertools.count():
+            if attempt > 0:
+                metrics.count("http_retries", host=host)
+            try:
+                with metrics.span("http_request", host=host):
+                    response = await self._send(method, url, timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    raise
+                logger.debug(f"Retry {method} {url} after {e!r}")
+                await asyncio.sleep(self._get_delay(attempt, ""))
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                logger.debug(f"Retry {method} {url} after {response.status_code}")
+                retry_after = response.headers.get("Retry-After", "")
+                await asyncio.sleep(self._get_delay(attempt, retry_after))
+                continue
+            if host:
+                metrics.count("http_responses", host=host, status=response.status_code)
+                metrics.count("http_bytes", len(response.content), host=host)
+            return response
+
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("POST", url, **kwargs)
+
+
+_http_client: Optional[HTTPClient] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """Get the HTTP client shared by functions that are not bound to a
+    service, such as `jadio.util.get_image`.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HTTPClient()
+        return _http_client
@@ -0,0 +1,239 @@
+import json
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Tuple
+
+# Timed spans and counters emitted by the services and the components they
+# share, such as `jadio.http_client.HTTPClient`, `jadio.hls.HLSDownloader`
+# and `jadio.cover.CoverCache`. Nothing is measured until an observer is
+# added, so the instrumentation costs only a check of an empty tuple.
+
+_observers: Tuple["Observer", ...] = ()
+_observers_lock = threading.Lock()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Observer:
+    """Base class of observers of spans and counters.
+
+    Subclasses override the methods of interest. They are called from the
+    threads that emit the metrics, so they must be thread-safe and fast.
+    """
+
+    def on_span(self, name: str, seconds: float, labels: Dict[str, str]) -> None:
+        """Called when a timed span finishes.
+
+        Args:
+            name (str): Name of the span, e.g. `ffmpeg`.
+            seconds (float): Elapsed time of the span.
+            labels (dict): Labels of the span, e.g. `{"service": "radiko.jp"}`.
+                `error` is set to the exception class name if the span
+                raised.
+        """
+        pass
+
+    def on_count(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        """Called when a counter is incremented.
+
+        Args:
+            name (str): Name of the counter, e.g. `http_requests`.
+            value (float): Increment.
+            labels (dict): Labels of the counter, e.g. `{"host": "radiko.jp"}`.
+        """
+        pass
+
+
+def add_observer(observer: Observer) -> None:
+    """Start sending spans and counters of this process to the observer."""
+    global _observers
+    with _observers_lock:
+        _observers = _observers + (observer,)
+
+
+def remove_observer(observer: Observer) -> None:
+    global _observers
+    with _observers_lock:
+        _observers = tuple(x for x in _observers if x is not observer)
+
+
+def is_enabled() -> bool:
+    """Whether any observer is added. Use it to skip computing the value of
+    a counter that is expensive to get.
+    """
+    return bool(_observers)
+
+
+class _Span:
+    def __init__(self, name: str, labels: Dict[str, str]) -> None:
+        self._name = name
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        seconds = time.perf_counter() - self._start
+        if exc_type is not None:
+            self._labels["error"] = exc_type.__name__
+        for observer in _observers:
+            observer.on_span(self._name, seconds, self._labels)
+
+
+_NULL_SPAN = nullcontext()
+
+
+def span(name: str, **labels: Any) -> ContextManager:
+    """Measure the elapsed time of a `with` block.
+
+    Args:
+        name (str): Name of the span.
+        labels: Labels of the span. Values are converted to str.
+    """
+    if not _observers:
+        return _NULL_SPAN
+    return _Span(name, {k: str(v) for k, v in labels.items()})
+
+
+def count(name: str, value: float = 1, **labels: Any) -> None:
+    """Increment a counter.
+
+    Args:
+        name (str): Name of the counter.
+        value (float): Increment.
+        labels: Labels of the counter. Values are converted to str.
+    """
+    if not _observers:
+        return
+    labels = {k: str(v) for k, v in labels.items()}
+    for observer in _observers:
+        observer.on_count(name, value, labels)
+
+
+def _to_key(name: str, labels: Dict[str, str]) -> Tuple[str, Labels]:
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    values = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + values + "}"
+
+
+class MetricsCollector(Observer):
+    """Observer that aggregates spans and counters in memory.
+
+    Spans are aggregated into the number of calls, the total and the
+    maximum seconds per name and labels.
+
+    Examples:
+        >>> collector = MetricsCollector()
+        >>> jadio.metrics.add_observer(collector)
+        >>> service.download(program)
+        >>> print(collector.to_prometheus())
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._spans: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def on_span(self, name: str, seconds: float, labels: Dict[str, str]) -> None:
+        key = _to_key(name, labels)
+        with self._lock:
+            stats = self._spans.get(key)
+            if stats is None:
+                self._spans[key] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def on_count(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        key = _to_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._spans.clear()
+
+    def get_counter(self, name: str, **labels: Any) -> float:
+        """Get the total of a counter. Counters whose labels include all the
+        specified labels are summed up.
+        """
+        labels = {k: str(v) for k, v in labels.items()}
+        with self._lock:
+            return sum(
+                value
+                for (key, key_labels), value in self._counters.items()
+                if key == name and labels.items() <= dict(key_labels).items()
+            )
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the aggregated metrics as JSON-serializable data."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            spans = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": stats[0],
+                    "seconds": stats[1],
+                    "max_seconds": stats[2],
+                }
+                for (name, labels), stats in sorted(self._spans.items())
+            ]
+        return {"counters": counters, "spans": spans}
+
+    def to_json(self, **kwargs) -> str:
+        """Export the aggregated metrics as JSON. `kwargs` are passed to
+        `json.dumps`.
+        """
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def to_prometheus(self, prefix: str = "jadio_") -> str:
+        """Export the aggregated metrics in the Prometheus text format.
+
+        A counter becomes `<prefix><name>_total`, and a span becomes a
+        summary `<prefix><name>_seconds` and a gauge
+        `<prefix><name>_seconds_max`.
+        """
+        data = self.to_dict()
+        lines = []
+
+        def add_type(metric: str, type_: str) -> None:
+            line = f"# TYPE {metric} {type_}"
+            if line not in types:
+                types.add(line)
+                lines.append(line)
+
+        types = set()
+        for counter in data["counters"]:
+            metric = f"{prefix}{counter['name']}_total"
+            add_type(metric, "counter")
+            labels = _format_labels(tuple(counter["labels"].items()))
+            lines.append(f"{metric}{labels} {counter['value']:g}")
+        for span_ in data["spans"]:
+            metric = f"{prefix}{span_['name']}_seconds"
+            add_type(metric, "summary")
+            labels = _format_labels(tuple(span_["labels"].items()))
+            lines.append(f"{metric}_count{labels} {span_['count']}")
+            lines.append(f"{metric}_sum{labels} {span_['seconds']:.6f}")
+        for span_ in data["spans"]:
+            metric = f"{prefix}{span_['name']}_seconds_max"
+            add_type(metric, "gauge")
+            labels = _format_labels(tuple(span_["labels"].items()))
+            lines.append(f"{metric}{labels} {span_['max_seconds']:.6f}")
+        return "\n".join(lines) + "\n"
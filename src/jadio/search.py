@@ -0,0 +1,151 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .program import Program
+
+_TEXT_FIELDS = ["program_title", "description", "information"]
+_PERSON_FIELDS = ["performers", "guests"]
+
+
+def _get_key(program: Program) -> Tuple[str, str, str]:
+    return (
+        str(program.service_id),
+        str(program.program_id),
+        str(program.episode_id),
+    )
+
+
+def _get_texts(program: Program) -> List[str]:
+    ret = [getattr(program, field) or "" for field in _TEXT_FIELDS]
+    for field in _PERSON_FIELDS:
+        value = getattr(program, field)
+        # Some services provide performers as a single string when it cannot
+        # be split into names, so it is searched as a text.
+        if isinstance(value, str):
+            ret.append(value)
+    return ret
+
+
+def _get_persons(program: Program) -> List[str]:
+    ret = []
+    for field in _PERSON_FIELDS:
+        value = getattr(program, field)
+        if isinstance(value, list):
+            ret += value
+    return ret
+
+
+def _get_bigrams(text: str) -> Set[str]:
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+class ProgramIndex:
+    """Inverted index to search programs by keywords.
+
+    A program matches a keyword if the keyword is a substring of
+    `program_title`, `description` or `information`, or if it is exactly one
+    of `performers` or `guests`. Texts are indexed by character bi-grams,
+    which works for Japanese text without word segmentation, and candidates
+    are verified with a substring check, so there are no false positives.
+
+    Args:
+        programs (list of `Program`): Programs to index first.
+    """
+
+    def __init__(self, programs: Optional[Iterable[Program]] = None) -> None:
+        self._programs: Dict[int, Program] = {}
+        self._doc_ids: Dict[Tuple[str, str, str], int] = {}
+        self._bigrams: Dict[str, Set[int]] = {}
+        self._persons: Dict[str, Set[int]] = {}
+        self._next_doc_id = 0
+        if programs:
+            self.add(programs)
+
+    def __len__(self) -> int:
+        return len(self._programs)
+
+    def _postings(self, program: Program) -> Tuple[Set[str], Set[str]]:
+        bigrams = set()
+        for text in _get_texts(program):
+            bigrams |= _get_bigrams(text)
+        return bigrams, set(_get_persons(program))
+
+    def add(self, programs: Iterable[Program]) -> None:
+        """Add programs to the index. A program already indexed with the same
+        `(service_id, program_id, episode_id)` is replaced.
+        """
+        for program in programs:
+            self.remove(program)
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            self._programs[doc_id] = program
+            self._doc_ids[_get_key(program)] = doc_id
+            bigrams, persons = self._postings(program)
+            for bigram in bigrams:
+                self._bigrams.setdefault(bigram, set()).add(doc_id)
+            for person in persons:
+                self._persons.setdefault(person, set()).add(doc_id)
+
+    def remove(self, program: Program) -> bool:
+        """Remove a program from the index.
+
+        Returns:
+            bool: Whether the program was indexed.
+        """
+        doc_id = self._doc_ids.pop(_get_key(program), None)
+        if doc_id is None:
+            return False
+        bigrams, persons = self._postings(self._programs.pop(doc_id))
+        for postings, terms in [(self._bigrams, bigrams), (self._persons, persons)]:
+            for term in terms:
+                postings[term].discard(doc_id)
+                if not postings[term]:
+                    del postings[term]
+        return True
+
+    def _search_text(self, keyword: str) -> Set[int]:
+        if len(keyword) < 2:
+            candidates = self._programs.keys()
+        else:
+            postings = sorted(
+                (self._bigrams.get(bigram, set()) for bigram in _get_bigrams(keyword)),
+                key=len,
+            )
+            candidates = set.intersection(*postings) if postings else set()
+        return {
+            doc_id
+            for doc_id in candidates
+            if any(keyword in text for text in _get_texts(self._programs[doc_id]))
+        }
+
+    def _search(self, keyword: str) -> List[int]:
+        if not keyword:
+            return []
+        doc_ids = self._search_text(keyword) | self._persons.get(keyword, set())
+        return sorted(doc_ids)
+
+    def search(self, keyword: str) -> List[Program]:
+        """Search programs that match the keyword.
+
+        Returns:
+            list of `Program`: Matched programs in the order they were added.
+        """
+        return [self._programs[doc_id] for doc_id in self._search(keyword)]
+
+    def search_many(self, keywords: Iterable[str]) -> Dict[str, List[Program]]:
+        """Search programs for each of the keywords.
+
+        Returns:
+            dict: Matched programs for each keyword.
+        """
+        return {keyword: self.search(keyword) for keyword in keywords}
+
+    def search_any(self, keywords: Iterable[str]) -> List[Program]:
+        """Search programs that match at least one of the keywords.
+
+        Returns:
+            list of `Program`: Matched programs in the order they were added.
+        """
+        doc_ids = set()
+        for keyword in keywords:
+            doc_ids.update(self._search(keyword))
+        return [self._programs[doc_id] for doc_id in sorted(doc_ids)]
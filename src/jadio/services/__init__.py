@@ -1,4 +1,26 @@
-from .hibiki import Hibiki  # NOQA
-from .jadio import Jadio  # NOQA
-from .onsen import Onsen  # NOQA
-from .radiko import Radiko  # NOQA
+import importlib
+from typing import Any, List
+
+# Each service is imported on first access so that using one service does not
+# load the dependencies of the others, e.g. selenium for `Onsen`.
+_LAZY_ATTRS = {
+    "DownloadResult": ".base",
+    "Hibiki": ".hibiki",
+    "Jadio": ".jadio",
+    "Onsen": ".onsen",
+    "Radiko": ".radiko",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
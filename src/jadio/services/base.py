@@ -1,18 +1,186 @@
 import abc
+import asyncio
 import logging
+import os
+import subprocess
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Type, TypeVar, Union
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
+from .. import metrics
+from ..catalog import Catalog
+from ..compact import CompactProgram
+from ..cover import get_cover_cache
 from ..program import Program
 from ..station import Station
-from ..tag import get_mp4_tag, set_mp4_tag
+from ..sync import SyncState
+from ..tag import FFmpegTag, get_mp4_tag, set_mp4_tag
+from ..util import get_deadline, get_remaining_time, get_temp_file_path
 
 logger = logging.getLogger(__name__)
 
 ServiceType = TypeVar("ServiceType", bound="Service")
 
 
+@dataclass
+class DownloadResult:
+    """Result of a download job of `Service.download_many`.
+
+    Attributes:
+        program (`Program`): Program data of the job.
+        file_path (`pathlib.Path`): Downloaded media file path. If the job
+            failed, it is the requested file path (if any).
+        error (Exception): Error raised by the job. It is None if the job
+            succeeded.
+    """
+
+    program: Program
+    file_path: Optional[Path] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _download_job(
+    service: "Service",
+    program: Program,
+    file_path: Optional[Union[str, Path]],
+    set_tag: bool,
+    set_cover_image: bool,
+    tag_while_muxing: bool,
+    job_timeout: Optional[float],
+    deadline: Optional[float],
+) -> Path:
+    """Run one job of `_run_download_jobs` within the batch deadline."""
+    timeout = get_remaining_time(deadline)
+    if timeout is None or (job_timeout is not None and job_timeout < timeout):
+        timeout = job_timeout
+    return service.download(
+        program,
+        file_path,
+        set_tag,
+        set_cover_image,
+        tag_while_muxing=tag_while_muxing,
+        timeout=timeout,
+    )
+
+
+def _run_download_jobs(
+    jobs: Sequence[Tuple["Service", Program, Optional[Union[str, Path]]]],
+    max_workers: Dict[str, int],
+    set_tag: bool = True,
+    set_cover_image: bool = True,
+    timeout: Optional[float] = None,
+    tag_while_muxing: bool = False,
+    job_timeout: Optional[float] = None,
+) -> List[DownloadResult]:
+    """Run download jobs with a worker pool per `service_id`.
+
+    Args:
+        jobs (list of tuple): `(service, program, file_path)` of each job.
+        max_workers (dict): Maximum number of concurrent jobs per
+            `service_id`. If a service is not specified, its jobs are run one
+            by one.
+        set_tag (bool): Set tag information in the downloaded media files.
+        set_cover_image (bool): Set cover image in the downloaded media
+            files.
+        timeout (float): Seconds to wait for the whole batch. Jobs that are
+            still running by then are reported as `TimeoutError`, and jobs
+            that have not started are cancelled and reported as
+            `concurrent.futures.CancelledError`. Each job downloads with at
+            most the time left in the batch, so services that support
+            download timeouts stop it at the batch deadline; jobs of the
+            other services keep running in the background until they finish.
+        tag_while_muxing (bool): Write the tag while muxing the media files.
+        job_timeout (float): Seconds to download each media file from the
+            start of its job. See `Service.download`.
+
+    Returns:
+        list of `DownloadResult`: Results in the same order as `jobs`.
+    """
+    if set_tag and set_cover_image:
+        # Episodes of the same program usually share one cover image, so it
+        # is fetched once up front instead of by every job.
+        get_cover_cache().prefetch(program for _, program, _ in jobs)
+    deadline = get_deadline(timeout)
+    executors: Dict[str, ThreadPoolExecutor] = {}
+    futures = []
+    try:
+        for service, program, file_path in jobs:
+            service_id = service.service_id()
+            if service_id not in executors:
+                executors[service_id] = ThreadPoolExecutor(
+                    max_workers=max(max_workers.get(service_id, 1), 1),
+                    thread_name_prefix=f"jadio-download-{service_id}",
+                )
+            future = executors[service_id].submit(
+                _download_job,
+                service,
+                program,
+                file_path,
+                set_tag,
+                set_cover_image,
+                tag_while_muxing,
+                job_timeout,
+                deadline,
+            )
+            futures.append(future)
+        done, _ = wait(futures, timeout=timeout)
+
+        ret = []
+        for (_, program, file_path), future in zip(jobs, futures):
+            file_path = Path(file_path) if file_path else None
+            if future not in done:
+                # Only jobs that have not started can be cancelled.
+                if future.cancel():
+                    error = CancelledError(
+                        f"download did not start in {timeout} seconds"
+                    )
+                else:
+                    error = TimeoutError(
+                        f"download did not finish in {timeout} seconds"
+                    )
+            else:
+                error = future.exception()
+            if error:
+                logger.warning(
+                    f"Failed to download {program.service_id} / {program.program_title}"
+                    f" / {program.episode_title}: {error!r}"
+                )
+                ret.append(DownloadResult(program, file_path, error))
+            else:
+                ret.append(DownloadResult(program, future.result()))
+        return ret
+    finally:
+        for executor in executors.values():
+            # Stuck jobs must not block the caller.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
 class Service(abc.ABC):
+    _catalog: Optional[Catalog] = None
+    _station_index: Optional[Dict[str, Station]] = None
+    # Whether `_download_media` accepts `tag` to write it while muxing.
+    _supports_tag_while_muxing: bool = False
+    # Whether `_download_media` accepts `timeout` and kills the processes it
+    # runs once it is exceeded.
+    _supports_download_timeout: bool = False
+
     @classmethod
     @abc.abstractmethod
     def service_id(cls) -> str:
@@ -40,6 +208,13 @@ class Service(abc.ABC):
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.close()
 
+    async def __aenter__(self: Type[ServiceType]) -> ServiceType:
+        await self.alogin()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.aclose()
+
     def login(self) -> None:
         """It is used when you need to login to that service, such as a
         premium member.
@@ -50,6 +225,62 @@ class Service(abc.ABC):
         """Disconnecting a session with that service, logging out, etc."""
         return None
 
+    # The asynchronous API below runs the synchronous one in a worker thread
+    # unless a service overrides it with a native implementation.
+
+    async def alogin(self) -> None:
+        """asyncio counterpart of `login`."""
+        await asyncio.to_thread(self.login)
+
+    async def aclose(self) -> None:
+        """asyncio counterpart of `close`."""
+        await asyncio.to_thread(self.close)
+
+    def set_catalog(self, catalog: Optional[Catalog]) -> None:
+        """Set a persistent catalog of program and station data.
+
+        Data fetched from the service is stored in the catalog, and
+        `get_programs(use_cache=True)` answers from it while it is fresh.
+
+        Args:
+            catalog (`Catalog`): Catalog to use. None disables it.
+        """
+        self._catalog = catalog
+
+    def _load_cached_programs(
+        self, scope: str, use_cache: bool
+    ) -> Optional[List[Program]]:
+        """Get the program data of the scope from the catalog if it is fresh."""
+        if not (use_cache and self._catalog):
+            return None
+        if not self._catalog.is_fresh(self.service_id(), scope):
+            metrics.count("catalog_cache", service=self.service_id(), result="miss")
+            return None
+        metrics.count("catalog_cache", service=self.service_id(), result="hit")
+        return self._catalog.get_programs(self.service_id(), scope)
+
+    def _store_cached_programs(
+        self, scope: str, programs: List[Program], expires_at: Optional[float] = None
+    ) -> None:
+        """Store the fetched program data of the scope in the catalog."""
+        if self._catalog:
+            self._catalog.put_programs(self.service_id(), scope, programs, expires_at)
+
+    def _iter_and_store_programs(
+        self, scope: str, programs: Iterable[Program]
+    ) -> Iterator[Program]:
+        """Yield the fetched program data of the scope and store them in the
+        catalog once all of them are yielded.
+        """
+        # Programs are kept only to be stored in the catalog at the end.
+        stored: Optional[List[Program]] = [] if self._catalog else None
+        for program in programs:
+            if stored is not None:
+                stored.append(program)
+            yield program
+        if stored is not None:
+            self._store_cached_programs(scope, stored)
+
     def get_stations(self, **kwargs) -> List[Station]:
         """Get broadcast station data hosted by that service.
 
@@ -61,6 +292,36 @@ class Service(abc.ABC):
         """
         return []
 
+    async def aget_stations(self, **kwargs) -> List[Station]:
+        """asyncio counterpart of `get_stations`."""
+        return await asyncio.to_thread(self.get_stations, **kwargs)
+
+    def get_station(self, station_id: str) -> Station:
+        """Get broadcast station data by its ID.
+
+        The stations are indexed by `station_id` on the first call after each
+        refresh of the station data, see `clear_station_cache`.
+
+        Args:
+            station_id (str): ID of the station.
+
+        Returns:
+            `Station`: Station data.
+        """
+        index = self._station_index
+        if index is None:
+            index = {station.station_id: station for station in self.get_stations()}
+            self._station_index = index
+        if station_id not in index:
+            raise ValueError(f"{station_id} is not found on {self.service_id()}")
+        return index[station_id]
+
+    def clear_station_cache(self) -> None:
+        """Discard the station data kept in memory so that the next call of
+        `get_stations` or `get_station` fetches it again.
+        """
+        self._station_index = None
+
     def get_station_from_program(self, program: Program) -> Station:
         """Get broadcast station data for the specified program.
 
@@ -75,14 +336,7 @@ class Service(abc.ABC):
         """
         if not program.station_id:
             raise RuntimeError(f"{self.service_id()} has no concept of station.")
-        ret = list(
-            filter(lambda x: x.station_id == program.station_id, self.get_stations())
-        )
-        if len(ret) == 0:
-            raise ValueError(
-                f"{program.station_id} is not found on {self.service_id()}"
-            )
-        return ret[0]
+        return self.get_station(program.station_id)
 
     @abc.abstractmethod
     def get_programs(self, **kwargs) -> List[Program]:
@@ -93,50 +347,306 @@ class Service(abc.ABC):
         """
         ...
 
+    async def aget_programs(self, **kwargs) -> List[Program]:
+        """asyncio counterpart of `get_programs`."""
+        return await asyncio.to_thread(self.get_programs, **kwargs)
+
+    def iter_programs(self, **kwargs) -> Iterator[Program]:
+        """Iterate over all program data provided by the service.
+
+        Services override it to yield programs lazily as their responses
+        arrive, so that consumers can act on the first programs before all
+        of them are fetched. It accepts the same arguments as `get_programs`.
+
+        Yields:
+            `Program`: Program data provided by the service.
+        """
+        yield from self.get_programs(**kwargs)
+
+    def get_new_programs(
+        self, since_state: Optional[str] = None, **kwargs
+    ) -> Tuple[List[Program], str]:
+        """Get program data added or changed since the previous call.
+
+        Args:
+            since_state (str): State token returned by the previous call. If
+                it is not specified, all programs are returned.
+            **kwargs: Arguments of `get_programs`.
+
+        Returns:
+            tuple: list of added or changed `Program` and the state token to
+                pass to the next call.
+        """
+        state = SyncState.decode(since_state)
+        ret = self._sync_programs(state, **kwargs)
+        return ret, state.encode()
+
+    def _sync_programs(self, state: SyncState, **kwargs) -> List[Program]:
+        """Update the state with the current program data and return the
+        added or changed programs.
+        """
+        return state.update(self.service_id(), "programs", self.get_programs(**kwargs))
+
     def download(
         self,
         program: Program,
         file_path: Optional[Union[str, Path]] = None,
         set_tag: bool = True,
         set_cover_image: bool = True,
+        tag_while_muxing: bool = False,
+        timeout: Optional[float] = None,
     ) -> Path:
         """Download the media file of the specified program data.
 
+        The media file is written under a temporary name and renamed to
+        `file_path` once it is complete, so an interrupted download never
+        leaves a truncated file there. Services keep the progress of an
+        interrupted download where they can, and calling this method again
+        fetches only the missing part.
+
         Args:
             program (`Program`): Program data for the media file to download.
             file_path (str or `pathlib.Path`): Downloaded media file path.
             set_tag (bool): Set tag information in the downloaded media file.
             set_cover_image (bool): Set cover image in the downloaded media
                 file.
+            tag_while_muxing (bool): Write the tag while muxing the media
+                file with ffmpeg instead of rewriting the file afterwards.
+                Only the part of the tag that ffmpeg cannot write is set
+                afterwards. It is ignored by services that do not mux.
+            timeout (float): Seconds to download the media file. ffmpeg is
+                killed once it is exceeded, and the progress so far is kept.
+                It is ignored by services that do not support it.
 
         Returns:
             str or `pathlib.Path`: Downloaded media file path.
+
+        Raises:
+            TimeoutError: The download did not finish in `timeout` seconds.
         """
+        file_path = self._get_file_path(program, file_path)
+        service_id = self.service_id()
+        with metrics.span("download", service=service_id):
+            tmp_path = get_temp_file_path(file_path)
+            kwargs = {}
+            if set_tag and tag_while_muxing and self._supports_tag_while_muxing:
+                kwargs["tag"] = self._get_ffmpeg_tag(program, tmp_path, set_cover_image)
+            if timeout is not None and self._supports_download_timeout:
+                kwargs["timeout"] = timeout
+            tag = kwargs.get("tag", None)
+            try:
+                with metrics.span("download_media", service=service_id):
+                    self._download_media(program, tmp_path, **kwargs)
+            except subprocess.TimeoutExpired as e:
+                raise TimeoutError(
+                    f"download did not finish in {timeout} seconds"
+                ) from e
+            finally:
+                if tag:
+                    tag.close()
+            self._finish_download(
+                program, tmp_path, file_path, set_tag, set_cover_image, tag
+            )
+        return file_path
+
+    async def adownload(
+        self,
+        program: Program,
+        file_path: Optional[Union[str, Path]] = None,
+        set_tag: bool = True,
+        set_cover_image: bool = True,
+        tag_while_muxing: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Path:
+        """asyncio counterpart of `download`."""
+        file_path = self._get_file_path(program, file_path)
+        service_id = self.service_id()
+        with metrics.span("download", service=service_id):
+            tmp_path = get_temp_file_path(file_path)
+            kwargs = {}
+            if set_tag and tag_while_muxing and self._supports_tag_while_muxing:
+                # Getting the tag may fetch the station list and the cover.
+                kwargs["tag"] = await asyncio.to_thread(
+                    self._get_ffmpeg_tag, program, tmp_path, set_cover_image
+                )
+            if timeout is None or not self._supports_download_timeout:
+                timeout = None
+            else:
+                kwargs["timeout"] = timeout
+            tag = kwargs.get("tag", None)
+            try:
+                with metrics.span("download_media", service=service_id):
+                    # Cancelling kills ffmpeg, and the steps run in threads
+                    # get the remaining time from `_adownload_media`.
+                    await asyncio.wait_for(
+                        self._adownload_media(program, tmp_path, **kwargs), timeout
+                    )
+            except (asyncio.TimeoutError, subprocess.TimeoutExpired) as e:
+                raise TimeoutError(
+                    f"download did not finish in {timeout} seconds"
+                ) from e
+            finally:
+                if tag:
+                    tag.close()
+            # Tagging reads and writes the whole file and may fetch the cover.
+            await asyncio.to_thread(
+                self._finish_download,
+                program,
+                tmp_path,
+                file_path,
+                set_tag,
+                set_cover_image,
+                tag,
+            )
+        return file_path
+
+    def _get_file_path(
+        self, program: Program, file_path: Optional[Union[str, Path]]
+    ) -> Path:
         file_path = Path(file_path or self._get_default_file_path(program))
         logger.info(
             f"Download {program.service_id} / {program.program_title} / {program.episode_title}"
             f" to {file_path}"
         )
-        self._download_media(program, file_path)
-        if set_tag:
-            if program.station_id:
-                station = self.get_station_from_program(program)
-                artist = station.name
-            else:
-                artist = self.name()
-            set_mp4_tag(file_path, get_mp4_tag(artist, program, set_cover_image))
         return file_path
 
+    def _finish_download(
+        self,
+        program: Program,
+        tmp_path: Path,
+        file_path: Path,
+        set_tag: bool,
+        set_cover_image: bool,
+        tag: Optional[FFmpegTag] = None,
+    ) -> None:
+        """Move the downloaded media file to `file_path` and tag it. If `tag`
+        was written while muxing, only its rest is set.
+        """
+        if not tmp_path.exists():
+            raise RuntimeError(f"failed to download {file_path}")
+        os.replace(tmp_path, file_path)
+        service_id = self.service_id()
+        if metrics.is_enabled():
+            size = file_path.stat().st_size
+            metrics.count("downloaded_bytes", size, service=service_id)
+        if set_tag:
+            with metrics.span("set_tag", service=service_id):
+                if tag:
+                    rest = tag.get_rest()
+                else:
+                    rest = self._get_mp4_tag(program, set_cover_image)
+                if rest:
+                    set_mp4_tag(file_path, rest)
+
+    def _get_mp4_tag(self, program: Program, set_cover_image: bool) -> Dict[str, Any]:
+        if program.station_id:
+            artist = self.get_station_from_program(program).name
+        else:
+            artist = self.name()
+        return get_mp4_tag(artist, program, set_cover_image)
+
+    def _get_ffmpeg_tag(
+        self, program: Program, file_path: Path, set_cover_image: bool
+    ) -> FFmpegTag:
+        tag = self._get_mp4_tag(program, set_cover_image)
+        # An attached picture would be another video stream of a video file.
+        return FFmpegTag(tag, file_path, attach_cover=not program.is_video)
+
+    def download_many(
+        self,
+        programs: Sequence[Program],
+        file_paths: Optional[Sequence[Optional[Union[str, Path]]]] = None,
+        set_tag: bool = True,
+        set_cover_image: bool = True,
+        max_workers: int = 1,
+        timeout: Optional[float] = None,
+        tag_while_muxing: bool = False,
+        job_timeout: Optional[float] = None,
+    ) -> List[DownloadResult]:
+        """Download the media files of the specified programs with a worker
+        pool.
+
+        A failed job does not stop the others; its error is returned in the
+        result instead of being raised.
+
+        Args:
+            programs (list of `Program`): Program data for the media files to
+                download.
+            file_paths (list of str or `pathlib.Path`): Downloaded media file
+                path of each program. None uses the default file path.
+            set_tag (bool): Set tag information in the downloaded media files.
+            set_cover_image (bool): Set cover image in the downloaded media
+                files.
+            max_workers (int): Maximum number of concurrent downloads.
+            timeout (float): Seconds to wait for the whole batch. Running
+                downloads are reported as `TimeoutError`, and downloads that
+                have not started are cancelled and reported as
+                `concurrent.futures.CancelledError`. A running download is
+                stopped at the batch deadline only if the service supports
+                `download` timeouts; otherwise it keeps running in the
+                background until it finishes.
+            tag_while_muxing (bool): Write the tag while muxing the media
+                files. See `download`.
+            job_timeout (float): Seconds to download each media file. See
+                `download`. Unlike `timeout`, it stops a stuck download so
+                that the ones queued behind it can run.
+
+        Returns:
+            list of `DownloadResult`: Results in the same order as `programs`.
+        """
+        file_paths = file_paths or [None] * len(programs)
+        jobs = [(self, p, f) for p, f in zip(programs, file_paths)]
+        return _run_download_jobs(
+            jobs,
+            {self.service_id(): max_workers},
+            set_tag=set_tag,
+            set_cover_image=set_cover_image,
+            timeout=timeout,
+            tag_while_muxing=tag_while_muxing,
+            job_timeout=job_timeout,
+        )
+
+    def compact(self, program: Program, keep_raw_data: bool = True) -> CompactProgram:
+        """Get a memory-compact representation of program data.
+
+        Args:
+            program (`Program`): Program data provided by the service.
+            keep_raw_data (bool): Keep the whole `raw_data` compressed. If it
+                is False, only the minimal raw data needed by `download` is
+                kept.
+
+        Returns:
+            `CompactProgram`: Compact program data, which can be passed to
+                `download` as it is.
+        """
+        raw_data = None if keep_raw_data else self._get_minimal_raw_data(program)
+        return CompactProgram.from_program(program, raw_data)
+
+    def _get_minimal_raw_data(self, program: Program) -> Dict[str, Any]:
+        """Get the minimal part of `raw_data` needed to download the media
+        file of the program.
+        """
+        return {}
+
     @abc.abstractmethod
     def _download_media(self, program: Program, file_path: Union[str, Path]) -> None:
         """Core method of downloading the media file.
 
+        Services that set `_supports_tag_while_muxing` accept `tag` of
+        `jadio.tag.FFmpegTag` as well and write it while muxing.
+
         Args:
             program (`Program`): Program data for the media file to download.
             file_path (str or `pathlib.Path`): Downloaded media file path.
         """
         ...
 
+    async def _adownload_media(
+        self, program: Program, file_path: Union[str, Path], **kwargs
+    ) -> None:
+        """asyncio counterpart of `_download_media`."""
+        await asyncio.to_thread(self._download_media, program, file_path, **kwargs)
+
     @abc.abstractmethod
     def _get_default_file_path(self, program: Program) -> Path:
         """Get the default media file path for the specified program data.
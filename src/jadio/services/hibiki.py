@@ -1,14 +1,17 @@
+import asyncio
 import json
 import logging
 import subprocess
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 from urllib.parse import urljoin
 
-import requests
-
+from .. import metrics
+from ..hls import HLSDownloader, UnsupportedStreamError
+from ..http_client import AsyncHTTPClient, HTTPClient
 from ..program import Program
-from ..util import check_dict_deep, to_datetime
+from ..tag import FFmpegTag
+from ..util import arun, check_dict_deep, get_deadline, get_remaining_time, to_datetime
 from .base import Service
 
 logger = logging.getLogger(__name__)
@@ -37,22 +40,66 @@ def _convert_raw_data_to_program(raw_data: Dict[str, Any], service_id: str) -> P
 
 
 class Hibiki(Service):
-    """hibiki-radio.jp service class."""
-
-    def __init__(self) -> None:
+    """hibiki-radio.jp service class.
+
+    Args:
+        native_hls (bool): Download HLS streams with the in-process
+            `jadio.hls.HLSDownloader` instead of ffmpeg. ffmpeg is then used
+            only to remux the fetched stream into a MP4 container.
+        timeout (int or float): Timeout [seconds] of each API request.
+        base_url (str): Base URL of the API. It can point to a local
+            stand-in such as `jadio.testing.server.FakeServer`.
+        pool_maxsize (int): Maximum number of HTTP connections kept per host.
+            It is 10 by default.
+        host_timeouts (dict): Timeout [seconds] of HTTP requests per host.
+            key is a host name, which also matches its subdomains. It takes
+            precedence over `timeout`.
+    """
+
+    _supports_tag_while_muxing = True
+    _supports_download_timeout = True
+
+    def __init__(
+        self,
+        native_hls: bool = False,
+        timeout: Union[int, float] = 10,
+        base_url: str = "https://vcms-api.hibiki-radio.jp/api/v1/",
+        pool_maxsize: int = 10,
+        host_timeouts: Optional[Dict[str, Union[int, float]]] = None,
+    ) -> None:
         super().__init__()
-        self._session = requests.session()
+        self._client = HTTPClient(
+            pool_maxsize=pool_maxsize, timeout=timeout, host_timeouts=host_timeouts
+        )
+        self._aclient = AsyncHTTPClient(
+            limit_per_host=pool_maxsize, timeout=timeout, host_timeouts=host_timeouts
+        )
+        self._hls = HLSDownloader() if native_hls else None
+        self._base_url = base_url
 
     def _get(self, href: str) -> Dict[str, Any]:
-        url = urljoin("https://vcms-api.hibiki-radio.jp/api/v1/", href)
-        response = self._session.get(
+        url = urljoin(self._base_url, href)
+        response = self._client.get(url, headers={"X-Requested-With": "XMLHttpRequest"})
+        response.raise_for_status()
+        return json.loads(response.text)
+
+    async def _aget(self, href: str) -> Dict[str, Any]:
+        url = urljoin(self._base_url, href)
+        response = await self._aclient.get(
             url, headers={"X-Requested-With": "XMLHttpRequest"}
         )
         response.raise_for_status()
         return json.loads(response.text)
 
     def close(self) -> None:
-        self._session.close()
+        self._client.close()
+        self._aclient.close()
+        if self._hls:
+            self._hls.close()
+
+    async def aclose(self) -> None:
+        await self._aclient.aclose()
+        await super().aclose()
 
     @classmethod
     def service_id(cls) -> str:
@@ -66,24 +113,128 @@ class Hibiki(Service):
     def link_url(cls) -> str:
         return "https://hibiki-radio.jp/"
 
-    def get_programs(self, **kwargs) -> List[Program]:
-        ret = []
-        for raw_program in self._get("programs"):
+    def iter_programs(self, use_cache: bool = False, **kwargs) -> Iterator[Program]:
+        """Iterate over all program data provided by the service.
+
+        Args:
+            use_cache (bool): Answer from the catalog set by `set_catalog` if
+                its data is still fresh.
+
+        Yields:
+            `Program`: Program data provided by the service.
+        """
+        cached = self._load_cached_programs("programs", use_cache)
+        if cached is not None:
+            yield from cached
+            return
+        yield from self._iter_and_store_programs(
+            "programs", self._iter_converted_programs(self._get("programs"))
+        )
+
+    def _iter_converted_programs(
+        self, raw_programs: List[Dict[str, Any]]
+    ) -> Iterator[Program]:
+        for raw_program in raw_programs:
             if not check_dict_deep(raw_program, ["episode", "video", "id"]):
                 continue
-            ret.append(_convert_raw_data_to_program(raw_program, self.service_id()))
+            yield _convert_raw_data_to_program(raw_program, self.service_id())
+
+    def get_programs(self, use_cache: bool = False, **kwargs) -> List[Program]:
+        """Get all program data provided by the service.
+
+        See `iter_programs` for the arguments.
+
+        Returns:
+            list of `Program`: All program data provided by the service.
+        """
+        ret = list(self.iter_programs(use_cache, **kwargs))
         logger.info(f"Get {len(ret)} program(s) from {self.service_id()}")
         return ret
 
-    def _download_media(self, program: Program, file_path: Union[str, Path]) -> None:
+    async def aget_programs(self, use_cache: bool = False, **kwargs) -> List[Program]:
+        ret = self._load_cached_programs("programs", use_cache)
+        if ret is None:
+            raw_programs = await self._aget("programs")
+            ret = list(
+                self._iter_and_store_programs(
+                    "programs", self._iter_converted_programs(raw_programs)
+                )
+            )
+        logger.info(f"Get {len(ret)} program(s) from {self.service_id()}")
+        return ret
+
+    def _get_minimal_raw_data(self, program: Program) -> Dict[str, Any]:
+        video_id = program.raw_data["episode"]["video"]["id"]
+        return {"episode": {"video": {"id": video_id}}}
+
+    def _download_media(
+        self,
+        program: Program,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        deadline = get_deadline(timeout)
         video_id = program.raw_data["episode"]["video"]["id"]
         video = self._get(f"videos/play_check?video_id={video_id}")
+        if self._hls:
+            try:
+                # The playlist URL has a per-session token.
+                self._hls.download(
+                    video["playlist_url"],
+                    file_path,
+                    key=f"{video_id}",
+                    tag=tag,
+                    timeout=get_remaining_time(deadline),
+                )
+                return
+            except UnsupportedStreamError as e:
+                logger.info(f"{e}, fall back to ffmpeg")
+        cmd = self._get_ffmpeg_command(video["playlist_url"], file_path, tag)
+        with metrics.span("ffmpeg", command="download", service=self.service_id()):
+            subprocess.run(cmd, check=True, timeout=get_remaining_time(deadline))
+
+    async def _adownload_media(
+        self,
+        program: Program,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        deadline = get_deadline(timeout)
+        video_id = program.raw_data["episode"]["video"]["id"]
+        video = await self._aget(f"videos/play_check?video_id={video_id}")
+        if self._hls:
+            try:
+                # The native downloader fetches segments with its own threads.
+                await asyncio.to_thread(
+                    self._hls.download,
+                    video["playlist_url"],
+                    file_path,
+                    key=f"{video_id}",
+                    tag=tag,
+                    timeout=get_remaining_time(deadline),
+                )
+                return
+            except UnsupportedStreamError as e:
+                logger.info(f"{e}, fall back to ffmpeg")
+        cmd = self._get_ffmpeg_command(video["playlist_url"], file_path, tag)
+        with metrics.span("ffmpeg", command="download", service=self.service_id()):
+            await arun(cmd)
+
+    def _get_ffmpeg_command(
+        self, url: str, file_path: Union[str, Path], tag: Optional[FFmpegTag] = None
+    ) -> List[str]:
         cmd = ["ffmpeg", "-y", "-loglevel", "quiet"]
-        cmd += ["-i", video["playlist_url"]]
+        cmd += ["-i", url]
+        if tag:
+            cmd += tag.get_input_args()
         cmd += ["-vcodec", "copy", "-acodec", "copy"]
         cmd += ["-bsf:a", "aac_adtstoasc"]
+        if tag:
+            cmd += tag.get_output_args()
         cmd += [str(file_path)]
-        subprocess.run(cmd)
+        return cmd
 
     def _get_default_file_path(self, program: Program) -> Path:
         ext = "mp4" if program.is_video else "m4a"
@@ -1,13 +1,35 @@
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
 
+from ..catalog import Catalog
+from ..compact import CompactProgram
 from ..program import Program
 from ..station import Station
-from .base import Service
+from ..sync import SyncState
+from ..util import submit_daemon
+from .base import DownloadResult, Service, _run_download_jobs
 from .hibiki import Hibiki
 from .onsen import Onsen
 from .radiko import Radiko
 
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent downloads per service in `Jadio.download_many`.
+# radiko.jp tolerates fewer parallel timefree streams than the CDNs of the
+# other services.
+DEFAULT_DOWNLOAD_MAX_WORKERS = {
+    "radiko.jp": 2,
+    "onsen.ag": 4,
+    "hibiki-radio.jp": 4,
+}
+
 
 def _get_all_service_cls() -> List[Service]:
     return [Radiko, Onsen, Hibiki]
@@ -19,14 +41,47 @@ class Jadio(Service):
     Args:
         configs (dict): dict that defines the arguments for each service
             class. key is `service_id`.
+        timeouts (dict): Seconds to wait for each service in `get_programs`
+            and `get_stations`. key is `service_id`. A service that does not
+            respond in time or fails is skipped and the results of the other
+            services are returned. If a service is not specified, it is waited
+            for without limit. A service that timed out is not interrupted:
+            its call runs to the end in a daemon thread, which does not keep
+            the interpreter from exiting.
+        catalog (`Catalog`): Persistent catalog shared by all services. See
+            `Service.set_catalog`.
+        service_ids (list of str): IDs of the services to use. If it is not
+            specified, all services are used.
+
+    Each service is constructed on first use, so services that are not used,
+    e.g. in a process that only downloads an episode of one service, cost
+    nothing.
     """
 
-    def __init__(self, configs: Dict[str, Any]) -> None:
+    def __init__(
+        self,
+        configs: Dict[str, Any],
+        timeouts: Optional[Dict[str, float]] = None,
+        catalog: Optional[Catalog] = None,
+        service_ids: Optional[Sequence[str]] = None,
+    ) -> None:
         super().__init__()
-        self._services = {
-            cls.service_id(): cls(**configs.get(cls.service_id(), {}))
-            for cls in _get_all_service_cls()
-        }
+        all_service_cls = {cls.service_id(): cls for cls in _get_all_service_cls()}
+        if service_ids is None:
+            service_ids = list(all_service_cls)
+        unknown = [x for x in service_ids if x not in all_service_cls]
+        if unknown:
+            raise ValueError(f"unknown service_id: {', '.join(unknown)}")
+        self._service_cls = {x: all_service_cls[x] for x in service_ids}
+        self._configs = configs
+        self._services: Dict[str, Service] = {}
+        self._lock = threading.Lock()
+        # A service is constructed and logs in under its own lock, so that a
+        # slow or failing service does not block the others.
+        self._service_locks = {x: threading.Lock() for x in self._service_cls}
+        self._logged_in = False
+        self._timeouts = timeouts or {}
+        self.set_catalog(catalog)
 
     def service_id(self, program: Program) -> str:
         return self.get_service_from_program(program).service_id()
@@ -37,26 +92,226 @@ class Jadio(Service):
     def link_url(self, program: Program) -> str:
         return self.get_service_from_program(program).link_url()
 
+    def _get_service(self, service_id: str) -> Service:
+        if service_id not in self._service_cls:
+            raise ValueError(f"{service_id} is not available")
+        with self._service_locks[service_id]:
+            service = self._services.get(service_id, None)
+            if service is not None:
+                return service
+            service = self._service_cls[service_id](**self._configs.get(service_id, {}))
+            service.set_catalog(self._catalog)
+            with self._lock:
+                logged_in = self._logged_in
+            if logged_in:
+                service.login()
+            # A service that fails to log in is constructed again next time.
+            with self._lock:
+                self._services[service_id] = service
+                missed_login = self._logged_in and not logged_in
+            if missed_login:
+                # `login` was called while the service was being constructed.
+                service.login()
+            return service
+
     def login(self) -> None:
-        for service in self._services.values():
+        # Services constructed later log in on construction.
+        with self._lock:
+            self._logged_in = True
+            services = list(self._services.values())
+        for service in services:
             service.login()
 
     def close(self) -> None:
-        for service in self._services.values():
+        with self._lock:
+            self._logged_in = False
+            services = list(self._services.values())
+        for service in services:
             service.close()
 
+    async def alogin(self) -> None:
+        with self._lock:
+            self._logged_in = True
+            services = list(self._services.values())
+        await asyncio.gather(*(service.alogin() for service in services))
+
+    async def aclose(self) -> None:
+        with self._lock:
+            self._logged_in = False
+            services = list(self._services.values())
+        await asyncio.gather(*(service.aclose() for service in services))
+
+    def set_catalog(self, catalog: Optional[Catalog]) -> None:
+        super().set_catalog(catalog)
+        for service in list(self._services.values()):
+            service.set_catalog(catalog)
+
     def get_service_from_program(self, program: Program) -> Service:
-        return self._services[program.service_id]
+        return self._get_service(program.service_id)
+
+    def get_station_from_program(self, program: Program) -> Station:
+        return self.get_service_from_program(program).get_station_from_program(program)
+
+    def clear_station_cache(self) -> None:
+        super().clear_station_cache()
+        for service in list(self._services.values()):
+            service.clear_station_cache()
+
+    def _call_services(
+        self, method_name: str, get_kwargs: Callable[[str], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Call the method of all services concurrently.
+
+        Args:
+            method_name (str): Name of the method.
+            get_kwargs (callable): Function to get the arguments of the method
+                from `service_id`.
+
+        Returns:
+            dict: Results of the services that succeeded in time, in the order
+                of the services. key is `service_id`.
+        """
+        start = time.monotonic()
+
+        def call(service_id: str, kwargs: Dict[str, Any]) -> Any:
+            # Constructing a service and logging in are bounded by its timeout
+            # and do not affect the other services.
+            service = self._get_service(service_id)
+            return getattr(service, method_name)(**kwargs)
+
+        futures = {
+            service_id: submit_daemon(call, service_id, get_kwargs(service_id))
+            for service_id in self._service_cls
+        }
+        results = {}
+        for service_id, future in futures.items():
+            timeout = self._timeouts.get(service_id, None)
+            if timeout is not None:
+                timeout = max(start + timeout - time.monotonic(), 0)
+            try:
+                results[service_id] = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.warning(f"{method_name} of {service_id} timed out, skipped")
+            except Exception as e:
+                logger.warning(f"{method_name} of {service_id} failed, skipped: {e}")
+        return results
+
+    def _gather(self, method_name: str, **kwargs) -> List[Any]:
+        """Call the method of all services concurrently and concatenate the
+        results in the order of the services.
+        """
+        results = self._call_services(method_name, lambda _: kwargs)
+        return list(itertools.chain.from_iterable(results.values()))
+
+    async def _agather(self, method_name: str, **kwargs) -> List[Any]:
+        """asyncio counterpart of `_gather`. A service that times out is
+        cancelled.
+        """
+
+        async def call_service(service_id: str) -> List[Any]:
+            # Services constructed here log in synchronously.
+            service = await asyncio.to_thread(self._get_service, service_id)
+            return await getattr(service, method_name)(**kwargs)
+
+        async def call(service_id: str) -> List[Any]:
+            timeout = self._timeouts.get(service_id, None)
+            try:
+                return await asyncio.wait_for(call_service(service_id), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{method_name} of {service_id} timed out, skipped")
+            except Exception as e:
+                logger.warning(f"{method_name} of {service_id} failed, skipped: {e}")
+            return []
+
+        results = await asyncio.gather(*(call(x) for x in self._service_cls))
+        return list(itertools.chain.from_iterable(results))
 
     def get_stations(self, **kwargs) -> List[Station]:
-        return sum(
-            [service.get_stations(**kwargs) for service in self._services.values()], []
-        )
+        return self._gather("get_stations", **kwargs)
+
+    async def aget_stations(self, **kwargs) -> List[Station]:
+        return await self._agather("aget_stations", **kwargs)
+
+    def iter_programs(self, **kwargs) -> Iterator[Program]:
+        """Iterate over program data of all services.
+
+        All services are crawled concurrently and their programs are yielded
+        in the order they arrive, so the order is not deterministic. A service
+        that fails or exceeds its timeout is skipped from then on.
+
+        Yields:
+            `Program`: Program data provided by the services.
+        """
+        service_ids = list(self._service_cls)
+        start = time.monotonic()
+        results = queue.Queue()
+        stopped = threading.Event()
+        done = object()
+
+        def produce(service_id: str) -> None:
+            try:
+                service = self._get_service(service_id)
+                for program in service.iter_programs(**kwargs):
+                    if stopped.is_set():
+                        break
+                    results.put((service_id, program))
+            except Exception as e:
+                logger.warning(f"iter_programs of {service_id} failed, skipped: {e}")
+            finally:
+                results.put((service_id, done))
+
+        deadlines = {
+            service_id: start + self._timeouts[service_id]
+            for service_id in service_ids
+            if self._timeouts.get(service_id, None) is not None
+        }
+        active = set(service_ids)
+        for service_id in service_ids:
+            threading.Thread(target=produce, args=(service_id,), daemon=True).start()
+        try:
+            while active:
+                now = time.monotonic()
+                expired = {k for k in active & deadlines.keys() if deadlines[k] <= now}
+                for service_id in expired:
+                    logger.warning(f"iter_programs of {service_id} timed out, skipped")
+                active -= expired
+                if not active:
+                    break
+                waiting = active & deadlines.keys()
+                timeout = min(deadlines[k] for k in waiting) - now if waiting else None
+                try:
+                    service_id, program = results.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                if service_id not in active:
+                    continue
+                if program is done:
+                    active.discard(service_id)
+                else:
+                    yield program
+        finally:
+            stopped.set()
 
     def get_programs(self, **kwargs) -> List[Program]:
-        return sum(
-            [service.get_programs(**kwargs) for service in self._services.values()], []
+        return self._gather("get_programs", **kwargs)
+
+    async def aget_programs(self, **kwargs) -> List[Program]:
+        return await self._agather("aget_programs", **kwargs)
+
+    def _sync_programs(self, state: SyncState, **kwargs) -> List[Program]:
+        # Each service updates its own copy of the state, which is merged
+        # only if the service succeeds in time. A service that fails is then
+        # synchronized again from the previous state on the next call, and a
+        # service that times out cannot write to the state being encoded.
+        states = {
+            service_id: state.copy(service_id) for service_id in self._service_cls
+        }
+        results = self._call_services(
+            "_sync_programs", lambda x: {**kwargs, "state": states[x]}
         )
+        for service_id in results:
+            state.merge(states[service_id], service_id)
+        return list(itertools.chain.from_iterable(results.values()))
 
     def download(
         self,
@@ -64,14 +319,94 @@ class Jadio(Service):
         file_path: Optional[Union[str, Path]] = None,
         set_tag: bool = True,
         set_cover_image: bool = True,
+        tag_while_muxing: bool = False,
+        timeout: Optional[float] = None,
     ) -> Path:
         return self.get_service_from_program(program).download(
             program=program,
             file_path=file_path,
             set_tag=set_tag,
             set_cover_image=set_cover_image,
+            tag_while_muxing=tag_while_muxing,
+            timeout=timeout,
         )
 
+    async def adownload(
+        self,
+        program: Program,
+        file_path: Optional[Union[str, Path]] = None,
+        set_tag: bool = True,
+        set_cover_image: bool = True,
+        tag_while_muxing: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Path:
+        service = await asyncio.to_thread(self.get_service_from_program, program)
+        return await service.adownload(
+            program=program,
+            file_path=file_path,
+            set_tag=set_tag,
+            set_cover_image=set_cover_image,
+            tag_while_muxing=tag_while_muxing,
+            timeout=timeout,
+        )
+
+    def download_many(
+        self,
+        programs: Sequence[Program],
+        file_paths: Optional[Sequence[Optional[Union[str, Path]]]] = None,
+        set_tag: bool = True,
+        set_cover_image: bool = True,
+        max_workers: Optional[Dict[str, int]] = None,
+        timeout: Optional[float] = None,
+        tag_while_muxing: bool = False,
+        job_timeout: Optional[float] = None,
+    ) -> List[DownloadResult]:
+        """Download the media files of the specified programs with a worker
+        pool per service.
+
+        Args:
+            programs (list of `Program`): Program data for the media files to
+                download.
+            file_paths (list of str or `pathlib.Path`): Downloaded media file
+                path of each program. None uses the default file path.
+            set_tag (bool): Set tag information in the downloaded media files.
+            set_cover_image (bool): Set cover image in the downloaded media
+                files.
+            max_workers (dict): Maximum number of concurrent downloads per
+                service. key is `service_id`. Unspecified services use
+                `DEFAULT_DOWNLOAD_MAX_WORKERS`.
+            timeout (float): Seconds to wait for the whole batch. Running
+                downloads are reported as `TimeoutError`, and downloads that
+                have not started are cancelled and reported as
+                `concurrent.futures.CancelledError`. A running download is
+                stopped at the batch deadline only if its service supports
+                `Service.download` timeouts.
+            tag_while_muxing (bool): Write the tag while muxing the media
+                files. See `Service.download`.
+            job_timeout (float): Seconds to download each media file. See
+                `Service.download`.
+
+        Returns:
+            list of `DownloadResult`: Results in the same order as `programs`.
+        """
+        file_paths = file_paths or [None] * len(programs)
+        jobs = [
+            (self.get_service_from_program(p), p, f)
+            for p, f in zip(programs, file_paths)
+        ]
+        return _run_download_jobs(
+            jobs,
+            {**DEFAULT_DOWNLOAD_MAX_WORKERS, **(max_workers or {})},
+            set_tag=set_tag,
+            set_cover_image=set_cover_image,
+            timeout=timeout,
+            tag_while_muxing=tag_while_muxing,
+            job_timeout=job_timeout,
+        )
+
+    def compact(self, program: Program, keep_raw_data: bool = True) -> CompactProgram:
+        return self.get_service_from_program(program).compact(program, keep_raw_data)
+
     def _download_media(self, program: Program, file_path: Union[str, Path]) -> None:
         self.get_service_from_program(program)._download_media(program, file_path)
 
@@ -1,38 +1,67 @@
-import copy
+import asyncio
+import contextlib
+import itertools
 import json
 import logging
+import os
+import queue
+import re
 import subprocess
+import threading
 import time
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Union
+from urllib.parse import urljoin
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+import requests
 
+from .. import metrics
+from ..hls import HLSDownloader, UnsupportedStreamError
+from ..http_client import AsyncHTTPClient, AsyncResponse, HTTPClient
 from ..program import Program
-from ..util import to_datetime
+from ..tag import FFmpegTag
+from ..util import (
+    arun,
+    check_dict_deep,
+    get_cache_dir,
+    get_deadline,
+    get_remaining_time,
+    imap_concurrently,
+    to_datetime,
+)
 from .base import Service
 
+if TYPE_CHECKING:
+    from selenium import webdriver
+
 logger = logging.getLogger(__name__)
 
 
-def _get_webdriver() -> webdriver.Chrome:
+def _get_webdriver() -> "webdriver.Chrome":
+    # selenium and webdriver_manager are imported only when a webdriver is
+    # actually started since they are slow to import.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from webdriver_manager.chrome import ChromeDriverManager
+
     options = webdriver.ChromeOptions()
     options.add_argument("--headless=new")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-gpu")
-    service = ChromeService(executable_path=ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=options)
+    with metrics.span("browser_start", service="onsen.ag"):
+        service = ChromeService(executable_path=ChromeDriverManager().install())
+        return webdriver.Chrome(service=service, options=options)
 
 
-@lru_cache(maxsize=1024)
 def _get_description_from_program_web_site(
-    directory_name: str, driver: webdriver.Chrome
+    directory_name: str,
+    driver: "webdriver.Chrome",
+    base_url: str = "https://www.onsen.ag/",
 ) -> str:
-    driver.get(f"https://www.onsen.ag/program/{directory_name}")
+    from selenium.webdriver.common.by import By
+
+    driver.get(urljoin(base_url, f"program/{directory_name}"))
     xpath = '//*[@id="__layout"]/div/div[1]/article/div[1]/div/div/div/div[2]/div[2]/div/span'
     try:
         return driver.find_element(By.XPATH, xpath).text
@@ -40,15 +69,66 @@ def _get_description_from_program_web_site(
         return ""
 
 
+def _extract_nuxt_state(html: str) -> Dict[str, Any]:
+    """Extract `window.__NUXT__` embedded in a server-rendered page.
+
+    Only a JSON literal can be extracted. A state serialized as a JavaScript
+    function call needs a browser to evaluate it.
+    """
+    m = re.search(r"window\.__NUXT__\s*=\s*(\{.*?\})\s*;?\s*</script>", html, re.S)
+    if not m:
+        raise ValueError("window.__NUXT__ is not found as a JSON literal")
+    return json.loads(m.group(1))
+
+
+def _to_information(raw_programs: Any) -> Optional[Dict[str, Any]]:
+    """Wrap a response of the programs API like `window.__NUXT__`. None is
+    returned if the response is not a list of programs.
+    """
+    if isinstance(raw_programs, list) and all(
+        "directory_name" in x and "contents" in x for x in raw_programs
+    ):
+        return {"state": {"programs": {"programs": {"all": raw_programs}}}}
+    logger.debug("Unexpected response of the programs API of onsen.ag")
+    return None
+
+
+def _check_information(information: Dict[str, Any]) -> Dict[str, Any]:
+    if not check_dict_deep(information, ["state", "programs", "programs", "all"]):
+        raise ValueError("programs are not found in window.__NUXT__")
+    return information
+
+
+def _iter_episode_raw_data(raw_program: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield the raw data of each downloadable episode of a program.
+
+    Each raw data is a view of the program record whose `contents` has only
+    the episode. The other values are shared with the program record and
+    between the episodes instead of being copied, so they must not be
+    modified.
+    """
+    for content in raw_program["contents"]:
+        if not content.get("streaming_url", None):
+            continue
+        yield {**raw_program, "contents": [content]}
+
+
+def _get_raw_programs(information: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Get the raw data of the programs that have a downloadable episode."""
+    return [
+        raw_program
+        for raw_program in information["state"]["programs"]["programs"]["all"]
+        if any(_iter_episode_raw_data(raw_program))
+    ]
+
+
 def _convert_raw_data_to_program(
-    raw_data: Dict[str, Any], service_id: str, driver: Optional[webdriver.Chrome] = None
+    raw_data: Dict[str, Any],
+    service_id: str,
+    description: Optional[str] = None,
 ) -> Program:
     content = raw_data["contents"][0]
     directory_name = raw_data["directory_name"]
-    if driver:
-        description = _get_description_from_program_web_site(directory_name, driver)
-    else:
-        description = None
     # streaming_url:
     # https://onsen-ma3phlsvod.sslcs.cdngc.net/onsen-ma3pvod/_definst_/<yyyymm>/*.mp4/playlist.m3u
     year = content["streaming_url"].split("/")[-3][:4]
@@ -79,6 +159,90 @@ def _convert_raw_data_to_program(
     )
 
 
+class _WebDriverPool:
+    """Pool of headless browsers that are started on demand up to `size`."""
+
+    def __init__(self, size: int) -> None:
+        self._size = max(size, 1)
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator["webdriver.Chrome"]:
+        with self._lock:
+            start = self._idle.empty() and len(self._drivers) < self._size
+            if start:
+                # Reserve a slot so that the browser can start without the lock.
+                self._drivers.append(None)
+        if start:
+            try:
+                driver = _get_webdriver()
+            except BaseException:
+                with self._lock:
+                    self._drivers.remove(None)
+                raise
+            with self._lock:
+                self._drivers[self._drivers.index(None)] = driver
+        else:
+            driver = self._idle.get()
+        try:
+            yield driver
+        finally:
+            self._idle.put(driver)
+
+    def close(self) -> None:
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+            self._idle = queue.Queue()
+        for driver in drivers:
+            if driver is not None:
+                driver.quit()
+
+
+class _DescriptionCache:
+    """Persistent cache of program descriptions keyed by `directory_name`."""
+
+    def __init__(self, path: Path, ttl: Union[int, float]) -> None:
+        self._path = path
+        self._ttl = ttl
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            try:
+                with open(self._path, "r") as fh:
+                    self._data = json.load(fh)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, directory_name: str) -> Optional[str]:
+        with self._lock:
+            entry = self._load().get(directory_name, None)
+        if entry is None or time.time() - entry["fetched_at"] >= self._ttl:
+            return None
+        return entry["description"]
+
+    def set(self, directory_name: str, description: str) -> None:
+        with self._lock:
+            self._load()[directory_name] = {
+                "description": description,
+                "fetched_at": time.time(),
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            if self._data is None:
+                return
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}")
+            with open(tmp_path, "w") as fh:
+                json.dump(self._data, fh, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+
+
 class Onsen(Service):
     """onsen.ag service class.
 
@@ -87,15 +251,59 @@ class Onsen(Service):
             Setting this up allows you to download special programs.
         password (str): Premium member's password. `mail` must also be set up.
             Setting this up allows you to download special programs.
+        native_hls (bool): Download HLS streams with the in-process
+            `jadio.hls.HLSDownloader` instead of ffmpeg. ffmpeg is then used
+            only to remux the fetched stream into a MP4 container.
+        timeout (int or float): Timeout [seconds] of HTTP requests.
+        max_drivers (int): Number of headless browsers that scrape program
+            pages concurrently for `more_data`.
+        description_ttl (int or float): Seconds to reuse a scraped
+            description. Descriptions are stored in
+            `${HOME}/.cache/jadio/onsen_descriptions.json`.
+        base_url (str): Base URL of the web site. It can point to a local
+            stand-in such as `jadio.testing.server.FakeServer`.
+        pool_maxsize (int): Maximum number of HTTP connections kept per host.
+            It is 10 by default.
+        host_timeouts (dict): Timeout [seconds] of HTTP requests per host.
+            key is a host name, which also matches its subdomains. It takes
+            precedence over `timeout`.
     """
 
+    _supports_tag_while_muxing = True
+    _supports_download_timeout = True
+
     def __init__(
-        self, mail: Optional[str] = None, password: Optional[str] = None
+        self,
+        mail: Optional[str] = None,
+        password: Optional[str] = None,
+        native_hls: bool = False,
+        timeout: Union[int, float] = 10,
+        max_drivers: int = 1,
+        description_ttl: Union[int, float] = 24 * 60 * 60,
+        base_url: str = "https://www.onsen.ag/",
+        pool_maxsize: int = 10,
+        host_timeouts: Optional[Dict[str, Union[int, float]]] = None,
     ) -> None:
         super().__init__()
         self._mail = mail
         self._password = password
-        self._driver = _get_webdriver()
+        self._base_url = base_url
+        self._client = HTTPClient(
+            pool_maxsize=pool_maxsize, timeout=timeout, host_timeouts=host_timeouts
+        )
+        self._aclient = AsyncHTTPClient(
+            limit_per_host=pool_maxsize, timeout=timeout, host_timeouts=host_timeouts
+        )
+        # The webdriver takes seconds to start, so it is started on first use.
+        self._driver = None
+        self._driver_lock = threading.Lock()
+        self._login_requested = False
+        self._hls = HLSDownloader() if native_hls else None
+        self._max_drivers = max_drivers
+        self._driver_pool = _WebDriverPool(max_drivers)
+        self._descriptions = _DescriptionCache(
+            get_cache_dir() / "onsen_descriptions.json", description_ttl
+        )
 
     @classmethod
     def service_id(cls) -> str:
@@ -109,10 +317,28 @@ class Onsen(Service):
     def link_url(cls) -> str:
         return "https://www.onsen.ag/"
 
+    def _get_driver(self) -> "webdriver.Chrome":
+        with self._driver_lock:
+            if self._driver is None:
+                self._driver = _get_webdriver()
+                if self._login_requested:
+                    self._sign_in()
+            return self._driver
+
     def login(self) -> None:
         if not (self._mail and self._password):
             return
-        self._driver.get("https://www.onsen.ag/signin")
+        # Signing in needs the webdriver, so it is deferred until the
+        # webdriver is actually used.
+        with self._driver_lock:
+            self._login_requested = True
+            if self._driver is not None:
+                self._sign_in()
+
+    def _sign_in(self) -> None:
+        from selenium.webdriver.common.by import By
+
+        self._driver.get(urljoin(self._base_url, "signin"))
         login_xpath = (
             '//*[@id="__layout"]/div/div[1]/div/div/div[4]/div/div[1]/dl[1]/dd'
         )
@@ -127,57 +353,272 @@ class Onsen(Service):
         logger.info(f"Logged in to {self.service_id()} as {self._mail}")
 
     def close(self) -> None:
-        if self._driver:
-            self._driver.quit()
-            self._driver = None
+        with self._driver_lock:
+            if self._driver:
+                self._driver.quit()
+                self._driver = None
+            self._login_requested = False
+        self._driver_pool.close()
+        self._client.close()
+        self._aclient.close()
+        if self._hls:
+            self._hls.close()
+
+    async def aclose(self) -> None:
+        await self._aclient.aclose()
+        await super().aclose()
+
+    def _get(self, url: str) -> requests.Response:
+        response = self._client.get(url, headers={"Referer": self._base_url})
+        response.raise_for_status()
+        return response
+
+    async def _aget(self, url: str) -> AsyncResponse:
+        response = await self._aclient.get(url, headers={"Referer": self._base_url})
+        response.raise_for_status()
+        return response
+
+    def _get_information_without_browser(self) -> Dict[str, Any]:
+        try:
+            url = urljoin(self._base_url, "web_api/programs/")
+            information = _to_information(self._get(url).json())
+            if information:
+                return information
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Failed to get the programs API of onsen.ag: {e}")
+        information = _extract_nuxt_state(self._get(self._base_url).text)
+        return _check_information(information)
+
+    async def _aget_information_without_browser(self) -> Dict[str, Any]:
+        try:
+            url = urljoin(self._base_url, "web_api/programs/")
+            information = _to_information((await self._aget(url)).json())
+            if information:
+                return information
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Failed to get the programs API of onsen.ag: {e}")
+        information = _extract_nuxt_state((await self._aget(self._base_url)).text)
+        return _check_information(information)
+
+    def _get_information_with_browser(self) -> Dict[str, Any]:
+        driver = self._get_driver()
+        driver.get(self._base_url)
+        ret = driver.execute_script("return JSON.stringify(window.__NUXT__);")
+        return json.loads(ret)
 
     @lru_cache(maxsize=1)
     def _get_information(self) -> Dict[str, Any]:
-        self._driver.get("https://www.onsen.ag/")
-        ret = self._driver.execute_script("return JSON.stringify(window.__NUXT__);")
-        return json.loads(ret)
+        # Premium programs are listed only for the signed-in browser session.
+        if not (self._mail and self._password):
+            try:
+                with metrics.span("get_programs", service=self.service_id()):
+                    return self._get_information_without_browser()
+            except (requests.RequestException, ValueError) as e:
+                logger.info(f"Failed to get programs without a browser, use it: {e}")
+        with metrics.span("get_programs", service=self.service_id(), browser=True):
+            return self._get_information_with_browser()
 
-    def get_programs(self, more_data: bool = False, **kwargs) -> List[Program]:
-        """Get all program data provided by the service.
+    def _get_description(self, directory_name: str) -> str:
+        ret = self._descriptions.get(directory_name)
+        metrics.count(
+            "description_cache",
+            service=self.service_id(),
+            result="miss" if ret is None else "hit",
+        )
+        if ret is None:
+            with self._driver_pool.acquire() as driver, metrics.span(
+                "scrape_description", service=self.service_id()
+            ):
+                ret = _get_description_from_program_web_site(
+                    directory_name, driver, self._base_url
+                )
+            # An empty description may be a scraping failure, so it is
+            # scraped again next time.
+            if ret:
+                self._descriptions.set(directory_name, ret)
+        return ret
+
+    def iter_programs(
+        self, more_data: bool = False, use_cache: bool = False, **kwargs
+    ) -> Iterator[Program]:
+        """Iterate over all program data provided by the service.
+
+        Programs are converted lazily, so the first ones can be used before
+        the rest, which is useful with `more_data`.
 
         Args:
             more_data (bool): Whether to get more data, here a `description`.
                 By enabling this, a more program data can be gotten, but the
-                run time will be longer.
+                run time will be longer. The description is scraped once per
+                program, not per episode, with `max_drivers` browsers in
+                parallel, and is reused across runs for `description_ttl`.
+            use_cache (bool): Answer from the catalog set by `set_catalog` if
+                its data is still fresh. It is ignored if `more_data` is
+                enabled, since the catalog may lack `description`.
+
+        Yields:
+            `Program`: Program data provided by the service.
+        """
+        cached = self._load_cached_programs("programs", use_cache and not more_data)
+        if cached is not None:
+            yield from cached
+            return
+        raw_programs = _get_raw_programs(self._get_information())
+        descriptions = None
+        if more_data:
+            descriptions = imap_concurrently(
+                lambda x: self._get_description(x["directory_name"]),
+                raw_programs,
+                max_workers=self._max_drivers,
+            )
+        try:
+            yield from self._iter_and_store_programs(
+                "programs", self._iter_converted_programs(raw_programs, descriptions)
+            )
+        finally:
+            if more_data:
+                self._descriptions.save()
+
+    def _iter_converted_programs(
+        self,
+        raw_programs: List[Dict[str, Any]],
+        descriptions: Optional[Iterable[str]] = None,
+    ) -> Iterator[Program]:
+        if descriptions is None:
+            descriptions = itertools.repeat(None)
+        for raw_program, description in zip(raw_programs, descriptions):
+            for raw_data in _iter_episode_raw_data(raw_program):
+                yield _convert_raw_data_to_program(
+                    raw_data, self.service_id(), description
+                )
+
+    def get_programs(
+        self, more_data: bool = False, use_cache: bool = False, **kwargs
+    ) -> List[Program]:
+        """Get all program data provided by the service.
+
+        See `iter_programs` for the arguments.
 
         Returns:
             list of `Program`: All program data provided by the service.
         """
-        information = self._get_information()
-        ret = []
-        for raw_program in information["state"]["programs"]["programs"]["all"]:
-            for content in raw_program["contents"]:
-                if not content.get("streaming_url", None):
-                    continue
-                raw_data = copy.deepcopy(raw_program)
-                raw_data["contents"] = [content]
-                ret.append(
-                    _convert_raw_data_to_program(
-                        raw_data, self.service_id(), self._driver if more_data else None
+        ret = list(self.iter_programs(more_data, use_cache, **kwargs))
+        logger.info(f"Get {len(ret)} program(s) from {self.service_id()}")
+        return ret
+
+    async def aget_programs(
+        self, more_data: bool = False, use_cache: bool = False, **kwargs
+    ) -> List[Program]:
+        """asyncio counterpart of `get_programs`.
+
+        The browser, which is needed for `more_data` and for a signed-in
+        session, is driven in a worker thread.
+        """
+        if more_data or (self._mail and self._password):
+            return await super().aget_programs(
+                more_data=more_data, use_cache=use_cache, **kwargs
+            )
+        ret = self._load_cached_programs("programs", use_cache)
+        if ret is None:
+            try:
+                with metrics.span("get_programs", service=self.service_id()):
+                    information = await self._aget_information_without_browser()
+            except (requests.RequestException, ValueError) as e:
+                logger.info(f"Failed to get programs without a browser, use it: {e}")
+                with metrics.span(
+                    "get_programs", service=self.service_id(), browser=True
+                ):
+                    information = await asyncio.to_thread(
+                        self._get_information_with_browser
                     )
+            ret = list(
+                self._iter_and_store_programs(
+                    "programs",
+                    self._iter_converted_programs(_get_raw_programs(information)),
                 )
+            )
         logger.info(f"Get {len(ret)} program(s) from {self.service_id()}")
         return ret
 
-    def _download_media(self, program: Program, file_path: Union[str, Path]) -> None:
+    def _get_minimal_raw_data(self, program: Program) -> Dict[str, Any]:
+        url = program.raw_data["contents"][0]["streaming_url"]
+        return {"contents": [{"streaming_url": url}]}
+
+    def _get_streaming_url(self, program: Program) -> str:
         # check required fields of program
         required_fields = ["raw_data"]
         for field in required_fields:
             if getattr(program, field) is None:
                 raise ValueError(f"{field} field is required")
+        return program.raw_data["contents"][0]["streaming_url"]
+
+    def _download_media(
+        self,
+        program: Program,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        deadline = get_deadline(timeout)
+        url = self._get_streaming_url(program)
+        if self._hls:
+            headers = {"Referer": self._base_url}
+            try:
+                self._hls.download(
+                    url,
+                    file_path,
+                    headers=headers,
+                    tag=tag,
+                    timeout=get_remaining_time(deadline),
+                )
+                return
+            except UnsupportedStreamError as e:
+                logger.info(f"{e}, fall back to ffmpeg")
+        cmd = self._get_ffmpeg_command(url, file_path, tag)
+        with metrics.span("ffmpeg", command="download", service=self.service_id()):
+            subprocess.run(cmd, check=True, timeout=get_remaining_time(deadline))
+
+    async def _adownload_media(
+        self,
+        program: Program,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        url = self._get_streaming_url(program)
+        if self._hls:
+            headers = {"Referer": self._base_url}
+            try:
+                # The native downloader fetches segments with its own threads.
+                await asyncio.to_thread(
+                    self._hls.download,
+                    url,
+                    file_path,
+                    headers=headers,
+                    tag=tag,
+                    timeout=timeout,
+                )
+                return
+            except UnsupportedStreamError as e:
+                logger.info(f"{e}, fall back to ffmpeg")
+        cmd = self._get_ffmpeg_command(url, file_path, tag)
+        with metrics.span("ffmpeg", command="download", service=self.service_id()):
+            await arun(cmd)
 
+    def _get_ffmpeg_command(
+        self, url: str, file_path: Union[str, Path], tag: Optional[FFmpegTag] = None
+    ) -> List[str]:
         cmd = ["ffmpeg", "-y", "-loglevel", "quiet"]
-        cmd += ["-headers", "Referer: https://www.onsen.ag/"]
-        cmd += ["-i", program.raw_data["contents"][0]["streaming_url"]]
+        cmd += ["-headers", f"Referer: {self._base_url}"]
+        cmd += ["-i", url]
+        if tag:
+            cmd += tag.get_input_args()
         cmd += ["-vcodec", "copy", "-acodec", "copy"]
         cmd += ["-bsf:a", "aac_adtstoasc"]
+        if tag:
+            cmd += tag.get_output_args()
         cmd += [str(file_path)]
-        subprocess.run(cmd)
+        return cmd
 
     def _get_default_file_path(self, program: Program) -> Path:
         ext = "mp4" if program.is_video else "m4a"
@@ -1,24 +1,51 @@
+import asyncio
 import base64
 import datetime
+import io
+import itertools
 import logging
+import os
 import re
 import subprocess
-from functools import lru_cache
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urljoin
 from xml.etree import ElementTree
 
 import requests
 
+from .. import metrics
+from ..hls import HLSDownloader, _load_progress, _save_progress, concat
+from ..http_client import AsyncHTTPClient, HTTPClient
 from ..program import Program
 from ..station import Station
-from ..util import get_content, to_datetime
+from ..sync import SyncState, get_content_digest
+from ..tag import FFmpegTag
+from ..util import (
+    arun,
+    get_content,
+    get_deadline,
+    get_remaining_time,
+    get_temp_file_path,
+    imap_concurrently,
+    map_concurrently,
+    to_datetime,
+)
 from .base import Service
 
 logger = logging.getLogger(__name__)
 
 RADIKO_COPYRIGHTS = "Copyright \xa9 radiko co., Ltd. All rights reserved"
 
+_COMMON_HEADERS = {
+    "X-Radiko-App": "pc_html5",
+    "X-Radiko-App-Version": "0.0.1",
+    "X-Radiko-User": "dummy_user",
+    "X-Radiko-Device": "pc",
+}
+_AUTH1_HEADERS = {"User-Agent": "curl/7.56.1", "Accept": "*/*", **_COMMON_HEADERS}
+
 
 def _get_partialkey(offset: int, length: int) -> bytes:
     """Get partialkey for HLS protocol.
@@ -30,6 +57,24 @@ def _get_partialkey(offset: int, length: int) -> bytes:
     return base64.b64encode(ret.encode())
 
 
+def _get_auth2_headers(auth1_headers: Dict[str, str]) -> Dict[str, str]:
+    """Get the headers of the second authentication from the response
+    headers of the first one.
+    """
+    info = {k.lower(): v for k, v in auth1_headers.items()}
+    keylength = int(info["x-radiko-keylength"])
+    keyoffset = int(info["x-radiko-keyoffset"])
+    return {
+        "X-Radiko-Authtoken": info["x-radiko-authtoken"],
+        "X-Radiko-Partialkey": _get_partialkey(keyoffset, keylength).decode(),
+        **_COMMON_HEADERS,
+    }
+
+
+def _to_timestamp(x: datetime.datetime) -> str:
+    return x.strftime("%Y%m%d%H%M%S")
+
+
 def _parse_stations_tree(tree: ElementTree.Element) -> Dict[str, Any]:
     ret = []
     for station in tree.findall(".//station"):
@@ -60,32 +105,33 @@ def _parse_stations_tree(tree: ElementTree.Element) -> Dict[str, Any]:
     return ret
 
 
+PROG_ATTR_KEYS = ["id", "master_id", "ft", "to", "ftl", "tol", "dur"]
+PROG_DATA_KEYS = [
+    "title",
+    "url",
+    "failed_record",
+    "ts_in_ng",
+    "ts_out_ng",
+    "desc",
+    "info",
+    "pfm",
+    "img",
+    "metas",
+]
+
+
+def _parse_prog_attr(prog: ElementTree.Element) -> Dict[str, Optional[int]]:
+    return {k: None if prog.get(k) == "" else int(prog.get(k)) for k in PROG_ATTR_KEYS}
+
+
 def _parse_programs_tree(tree: ElementTree.Element) -> Dict[str, Any]:
     stations = []
     for station in tree.findall(".//station"):
         progs = []
         for prog in station.findall(".//prog"):
             try:
-                attr_key = ["id", "master_id", "ft", "to", "ftl", "tol", "dur"]
-                data_key = [
-                    "title",
-                    "url",
-                    "failed_record",
-                    "ts_in_ng",
-                    "ts_out_ng",
-                    "desc",
-                    "info",
-                    "pfm",
-                    "img",
-                    "metas",
-                ]
-                data = {
-                    "attr": {
-                        k: None if prog.get(k) == "" else int(prog.get(k))
-                        for k in attr_key
-                    }
-                }
-                for key in data_key:
+                data = {"attr": _parse_prog_attr(prog)}
+                for key in PROG_DATA_KEYS:
                     data[key] = prog.findtext(".//{}".format(key))
                 progs.append(data)
             except ValueError:
@@ -107,6 +153,66 @@ def _parse_programs_tree(tree: ElementTree.Element) -> Dict[str, Any]:
     }
 
 
+def _split_time_window(
+    ft: datetime.datetime, duration: int, n: int, unit: int = 5
+) -> List[Tuple[datetime.datetime, int]]:
+    """Split a time-shift window into at most `n` sub-windows.
+
+    The length of each sub-window except the last one is a multiple of
+    `unit` seconds, the length of HLS segments of radiko.jp, so that the
+    sub-windows can be joined without gaps or overlaps.
+
+    Returns:
+        list of tuple: `(ft, duration)` of each sub-window.
+    """
+    length = -(-duration // max(n, 1))  # ceil
+    length = -(-length // unit) * unit
+    ret = []
+    offset = 0
+    while offset < duration:
+        ret.append(
+            (ft + datetime.timedelta(seconds=offset), min(length, duration - offset))
+        )
+        offset += length
+    return ret or [(ft, duration)]
+
+
+def _get_playlist_params(
+    station_id: str, ft: datetime.datetime, duration: int
+) -> Dict[str, Any]:
+    """Get the query of the time-shift playlist from `ft` for `duration`
+    seconds.
+    """
+    to = ft + datetime.timedelta(seconds=duration)
+    return {
+        "station_id": station_id,
+        "l": 15,
+        "ft": _to_timestamp(ft),
+        "to": _to_timestamp(to),
+    }
+
+
+def _get_chunk_paths(file_path: Path, n_chunks: int) -> List[Path]:
+    return [
+        file_path.with_name(f"{file_path.stem}.part{i}{file_path.suffix}")
+        for i in range(n_chunks)
+    ]
+
+
+def _get_chunks_progress_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + ".chunks.json")
+
+
+def _remove_chunks(file_path: Path, chunk_paths: List[Path]) -> None:
+    for path in chunk_paths:
+        path.unlink()
+    _get_chunks_progress_path(file_path).unlink()
+
+
+def _find_stream_url(playlist: str) -> str:
+    return re.findall("^https?://.+m3u8$", playlist, flags=(re.MULTILINE))[0]
+
+
 def _get_program_id(station_id: str, ft: datetime.datetime) -> str:
     dow = ft.strftime("%a").lower()
     time = ft.strftime("%H%M")
@@ -139,6 +245,20 @@ def _get_performers(pfm: Union[str, None]) -> Union[str, List[str], None]:
     return pfm
 
 
+# `ttl` and `srvtime` of weekly program XML change on every response.
+_VOLATILE_HEADER_PATTERN = re.compile(rb"<(ttl|srvtime)>[^<]*</\1>")
+
+
+def _get_weekly_digest(content: bytes) -> str:
+    """Get a digest of weekly program XML that ignores `ttl` and `srvtime`."""
+    return get_content_digest(_VOLATILE_HEADER_PATTERN.sub(b"", content))
+
+
+def _get_end_datetime(program: Program) -> datetime.datetime:
+    """Get the broadcast end date and time from progs.*.attr.to."""
+    return to_datetime(program.raw_data["progs"][0]["attr"]["to"])
+
+
 def _convert_raw_data_to_program(raw_data: Dict[str, Any], service_id: str) -> Program:
     raw_prog = raw_data["progs"][0]
     station_id = raw_data["attr"]["id"]
@@ -165,6 +285,64 @@ def _convert_raw_data_to_program(raw_data: Dict[str, Any], service_id: str) -> P
     )
 
 
+def _iterparse_programs(
+    content: bytes, service_id: str, header: Optional[Dict[str, int]] = None
+) -> Iterator[Program]:
+    """Parse weekly program XML incrementally and yield `Program` objects.
+
+    It gives the same programs as `_parse_programs_tree` followed by
+    `_convert_raw_data_to_program`, but never builds the whole tree: each
+    `<prog>` element is converted as soon as it is closed and then cleared.
+
+    Args:
+        content (bytes): Raw XML of `v3/program/station/weekly/*.xml`.
+        service_id (str): ID of the service.
+        header (dict): If specified, `ttl` and `srvtime` are stored in it.
+
+    Yields:
+        `Program`: Program data in document order.
+    """
+    header = {} if header is None else header
+    raw_station = None
+    fields = None  # fields of the <prog> being parsed
+    for event, elem in ElementTree.iterparse(
+        io.BytesIO(content), events=("start", "end")
+    ):
+        tag = elem.tag
+        if event == "start":
+            if tag == "station":
+                raw_station = {
+                    "attr": {"id": elem.get("id")},
+                    "name": None,
+                    "date": None,
+                }
+            elif tag == "prog":
+                fields = {key: None for key in PROG_DATA_KEYS}
+            continue
+
+        if fields is not None:
+            if tag == "prog":
+                try:
+                    attr = _parse_prog_attr(elem)
+                except ValueError:
+                    attr = None
+                if attr is not None:
+                    raw_data = {**raw_station, "progs": [{"attr": attr, **fields}]}
+                    yield _convert_raw_data_to_program(raw_data, service_id)
+                fields = None
+                elem.clear()
+            elif tag in fields and fields[tag] is None:
+                # Same as findtext: the first match in the element.
+                fields[tag] = elem.text or ""
+        elif tag in ["name", "date"] and raw_station and raw_station[tag] is None:
+            raw_station[tag] = elem.text or ""
+        elif tag in ["ttl", "srvtime"]:
+            header[tag] = int(elem.text)
+        elif tag == "station":
+            raw_station = None
+            elem.clear()
+
+
 class Radiko(Service):
     """radiko.jp service class.
 
@@ -174,23 +352,63 @@ class Radiko(Service):
         password (str): Premium member's password. `mail` must also be set up.
             Setting this up allows you to download programs area-free.
         timeout (int): Session timeout with the service.
+        max_workers (int): Maximum number of stations whose weekly program
+            data is fetched concurrently in `get_programs`. If it is 1, the
+            stations are fetched one by one.
+        native_hls (bool): Download HLS streams with the in-process
+            `jadio.hls.HLSDownloader` instead of ffmpeg. ffmpeg is then used
+            only to remux the fetched stream into a MP4 container.
+        download_chunks (int): Number of sub-windows that a program is split
+            into and downloaded concurrently. Each sub-window is requested by
+            its own playlist and the pieces are joined losslessly. If it is 1,
+            a program is downloaded in one piece. An interrupted download
+            resumes from the completed sub-windows, and with `native_hls`
+            also from the fetched segments. A program downloaded in one
+            piece with ffmpeg starts over, since ffmpeg cannot resume.
+        base_url (str): Base URL of the service. It can point to a local
+            stand-in such as `jadio.testing.server.FakeServer`.
+        pool_maxsize (int): Maximum number of HTTP connections kept per host.
+            It is the larger of 10 and `max_workers` by default.
+        host_timeouts (dict): Timeout [seconds] of HTTP requests per host.
+            key is a host name, which also matches its subdomains. It takes
+            precedence over `timeout`.
     """
 
+    _supports_tag_while_muxing = True
+    _supports_download_timeout = True
+
     def __init__(
         self,
         mail: Optional[str] = None,
         password: Optional[str] = None,
         timeout: int = 3,
+        max_workers: int = 1,
+        native_hls: bool = False,
+        download_chunks: int = 1,
+        base_url: str = "https://radiko.jp/",
+        pool_maxsize: Optional[int] = None,
+        host_timeouts: Optional[Dict[str, Union[int, float]]] = None,
     ) -> None:
         super().__init__()
         self._mail = mail
         self._password = password
-        self._timeout = timeout
-        self._session = requests.session()
+        self._max_workers = max_workers
+        # Keep a connection per worker if there are more than the default 10.
+        pool_maxsize = pool_maxsize or max(max_workers, 10)
+        self._client = HTTPClient(
+            pool_maxsize=pool_maxsize, timeout=timeout, host_timeouts=host_timeouts
+        )
+        self._aclient = AsyncHTTPClient(
+            limit_per_host=pool_maxsize, timeout=timeout, host_timeouts=host_timeouts
+        )
+        self._hls = HLSDownloader() if native_hls else None
+        self._download_chunks = download_chunks
+        self._base_url = base_url
 
         self._user_info = None
         self._authtoken = None
         self._area_info = None
+        self._stations = None
 
     @classmethod
     def service_id(cls) -> str:
@@ -205,85 +423,131 @@ class Radiko(Service):
         return "https://radiko.jp/"
 
     def _get(self, href: str, content_type: str, **kwargs) -> Any:
-        url = f"https://radiko.jp/{href}"
-        response = self._session.get(url, timeout=self._timeout, **kwargs)
+        url = urljoin(self._base_url, href)
+        response = self._client.get(url, **kwargs)
         response.raise_for_status()
         return get_content(response, content_type=content_type)
 
     def _post(self, href: str, content_type: str, **kwargs) -> Any:
-        url = f"https://radiko.jp/{href}"
-        response = self._session.post(url, timeout=self._timeout, **kwargs)
+        url = urljoin(self._base_url, href)
+        response = self._client.post(url, **kwargs)
         response.raise_for_status()
         return get_content(response, content_type=content_type)
 
-    def login(self) -> None:
-        if self._mail and self._password:
-            self._user_info = self._post(
-                "ap/member/webapi/member/login",
-                "json",
-                data={"mail": self._mail, "pass": self._password},
-            )
-            logger.info(f"Logged in to {self.service_id()} as {self._mail}")
-
-        common_headers = {
-            "X-Radiko-App": "pc_html5",
-            "X-Radiko-App-Version": "0.0.1",
-            "X-Radiko-User": "dummy_user",
-            "X-Radiko-Device": "pc",
-        }
-
-        # first authentication
-        info = self._get(
-            "v2/api/auth1",
-            "headers",
-            headers={
-                "User-Agent": "curl/7.56.1",
-                "Accept": "*/*",
-                **common_headers,
-            },
-        )
-        info = {k.lower(): v for k, v in info.items()}
-        authtoken = info["x-radiko-authtoken"]
-        keylength = int(info["x-radiko-keylength"])
-        keyoffset = int(info["x-radiko-keyoffset"])
-        partialkey = _get_partialkey(keyoffset, keylength)
-
-        # second authentication
-        area_info = self._get(
-            "v2/api/auth2",
-            "text",
-            headers={
-                "X-Radiko-Authtoken": authtoken,
-                "X-Radiko-Partialkey": partialkey,
-                **common_headers,
-            },
-        )
+    async def _aget(self, href: str, content_type: str, **kwargs) -> Any:
+        url = urljoin(self._base_url, href)
+        response = await self._aclient.get(url, **kwargs)
+        response.raise_for_status()
+        return get_content(response, content_type=content_type)
 
+    async def _apost(self, href: str, content_type: str, **kwargs) -> Any:
+        url = urljoin(self._base_url, href)
+        response = await self._aclient.post(url, **kwargs)
+        response.raise_for_status()
+        return get_content(response, content_type=content_type)
+
+    def login(self) -> None:
+        with metrics.span("auth", service=self.service_id()):
+            if self._mail and self._password:
+                self._user_info = self._post(
+                    "ap/member/webapi/member/login",
+                    "json",
+                    data={"mail": self._mail, "pass": self._password},
+                )
+                logger.info(f"Logged in to {self.service_id()} as {self._mail}")
+            # first authentication
+            info = self._get("v2/api/auth1", "headers", headers=_AUTH1_HEADERS)
+            # second authentication
+            headers = _get_auth2_headers(info)
+            area_info = self._get("v2/api/auth2", "text", headers=headers)
+        self._set_auth(headers["X-Radiko-Authtoken"], area_info)
+
+    async def alogin(self) -> None:
+        with metrics.span("auth", service=self.service_id()):
+            if self._mail and self._password:
+                self._user_info = await self._apost(
+                    "ap/member/webapi/member/login",
+                    "json",
+                    data={"mail": self._mail, "pass": self._password},
+                )
+                logger.info(f"Logged in to {self.service_id()} as {self._mail}")
+            info = await self._aget("v2/api/auth1", "headers", headers=_AUTH1_HEADERS)
+            headers = _get_auth2_headers(info)
+            area_info = await self._aget("v2/api/auth2", "text", headers=headers)
+        self._set_auth(headers["X-Radiko-Authtoken"], area_info)
+
+    def _set_auth(self, authtoken: str, area_info: str) -> None:
         self._authtoken = authtoken
         self._area_info = area_info.strip().split(",")
+        # The available stations depend on the membership and the area.
+        self.clear_station_cache()
 
     def close(self) -> None:
         if self._user_info:
             self._post("ap/member/webapi/member/logout", "text")
-        self._session.close()
+        self._client.close()
+        self._aclient.close()
+        if self._hls:
+            self._hls.close()
+
+    async def aclose(self) -> None:
+        await self._aclient.aclose()
+        await super().aclose()
 
-    @lru_cache(maxsize=1)
     def _get_station_region_full(self) -> Dict[str, str]:
-        return _parse_stations_tree(self._get("v3/station/region/full.xml", "tree"))
+        with metrics.span("get_stations", service=self.service_id()):
+            tree = self._get("v3/station/region/full.xml", "tree")
+        return _parse_stations_tree(tree)
 
-    @lru_cache(maxsize=32)
     def _get_station_list_area(self) -> Dict[str, str]:
         area_id = self._area_info[0]
-        return _parse_stations_tree(self._get(f"v2/station/list/{area_id}.xml", "tree"))
+        with metrics.span("get_stations", service=self.service_id()):
+            tree = self._get(f"v2/station/list/{area_id}.xml", "tree")
+        return _parse_stations_tree(tree)
 
-    @lru_cache(maxsize=1)
-    def get_stations(self, **kwargs) -> List[Station]:
-        ret = []
+    def get_stations(self, use_cache: bool = False, **kwargs) -> List[Station]:
+        """Get broadcast station data hosted by the service.
+
+        Args:
+            use_cache (bool): Answer from the catalog set by `set_catalog` if
+                its data is still fresh.
+
+        Returns:
+            list of `Station`: All station data hosted by the service.
+        """
+        ret = self._load_cached_stations(use_cache)
+        if ret is not None:
+            return ret
+        # The stations are kept in `_stations` until `clear_station_cache`.
         get_station_fn = self._get_station_list_area
         if self._user_info:
             # For premium members, area-free downloading is available.
             get_station_fn = self._get_station_region_full
-        for raw_station in get_station_fn():
+        return self._set_stations(get_station_fn())
+
+    async def aget_stations(self, use_cache: bool = False, **kwargs) -> List[Station]:
+        ret = self._load_cached_stations(use_cache)
+        if ret is not None:
+            return ret
+        href = f"v2/station/list/{self._area_info[0]}.xml"
+        if self._user_info:
+            href = "v3/station/region/full.xml"
+        with metrics.span("get_stations", service=self.service_id()):
+            tree = await self._aget(href, "tree")
+        return self._set_stations(_parse_stations_tree(tree))
+
+    def _load_cached_stations(self, use_cache: bool) -> Optional[List[Station]]:
+        if (
+            use_cache
+            and self._catalog
+            and self._catalog.is_fresh(self.service_id(), "stations")
+        ):
+            return self._catalog.get_stations(self.service_id())
+        return self._stations
+
+    def _set_stations(self, raw_stations: List[Dict[str, Any]]) -> List[Station]:
+        ret = []
+        for raw_station in raw_stations:
             image_url = None
             if len(raw_station["logos"]) > 0:
                 image_url = raw_station["logos"][0]["href"]
@@ -296,84 +560,432 @@ class Radiko(Service):
                 image_url=image_url,
             )
             ret.append(station)
+        if self._catalog:
+            self._catalog.put_stations(self.service_id(), ret)
+        self._stations = ret
         return ret
 
+    def clear_station_cache(self) -> None:
+        super().clear_station_cache()
+        self._stations = None
+
+    def _get_program_station_weekly_content(self, station_id: str) -> Optional[bytes]:
+        try:
+            with metrics.span("get_programs", service=self.service_id()):
+                return self._get(f"v3/program/station/weekly/{station_id}.xml", "byte")
+        except (requests.exceptions.HTTPError, requests.exceptions.Timeout) as e:
+            # Transient failures have already been retried by the client.
+            logger.warning(f"Failed to get weekly programs of {station_id}: {e}")
+            return None
+
+    async def _aget_program_station_weekly_content(
+        self, station_id: str
+    ) -> Optional[bytes]:
+        try:
+            with metrics.span("get_programs", service=self.service_id()):
+                href = f"v3/program/station/weekly/{station_id}.xml"
+                return await self._aget(href, "byte")
+        except (requests.exceptions.HTTPError, requests.exceptions.Timeout) as e:
+            logger.warning(f"Failed to get weekly programs of {station_id}: {e}")
+            return None
+
     @lru_cache(maxsize=256)
     def _get_program_station_weekly(self, station_id: str) -> Dict[str, str]:
-        try:
-            ret = self._get(f"v3/program/station/weekly/{station_id}.xml", "tree")
-        except requests.exceptions.HTTPError:
-            return {}
-        except requests.exceptions.ReadTimeout:
+        content = self._get_program_station_weekly_content(station_id)
+        if content is None:
             return {}
-        return _parse_programs_tree(ret)
+        with metrics.span("parse_programs", service=self.service_id()):
+            return _parse_programs_tree(ElementTree.fromstring(content))
 
-    def get_programs(self, only_downloadable: bool = False, **kwargs) -> List[Program]:
-        """Get all program data provided by the service.
+    def _parse_station_programs(
+        self, content: bytes, header: Optional[Dict[str, int]] = None
+    ) -> List[Program]:
+        with metrics.span("parse_programs", service=self.service_id()):
+            return list(_iterparse_programs(content, self.service_id(), header))
+
+    @lru_cache(maxsize=256)
+    def _get_station_programs(self, station_id: str, use_cache: bool) -> List[Program]:
+        scope = f"weekly/{station_id}"
+        ret = self._load_cached_programs(scope, use_cache)
+        if ret is not None:
+            return ret
+        content = self._get_program_station_weekly_content(station_id)
+        if content is None:
+            return []
+        return self._store_station_programs(station_id, content)
+
+    async def _aget_station_programs(
+        self, station_id: str, use_cache: bool
+    ) -> List[Program]:
+        ret = self._load_cached_programs(f"weekly/{station_id}", use_cache)
+        if ret is not None:
+            return ret
+        content = await self._aget_program_station_weekly_content(station_id)
+        if content is None:
+            return []
+        return self._store_station_programs(station_id, content)
+
+    def _store_station_programs(self, station_id: str, content: bytes) -> List[Program]:
+        header = {}
+        ret = self._parse_station_programs(content, header)
+        # radiko.jp reports how long the data is valid for as ttl [seconds]
+        # from the server time srvtime [UNIX time].
+        expires_at = header["srvtime"] + header["ttl"]
+        self._store_cached_programs(f"weekly/{station_id}", ret, expires_at)
+        return ret
+
+    def iter_programs(
+        self, only_downloadable: bool = False, use_cache: bool = False, **kwargs
+    ) -> Iterator[Program]:
+        """Iterate over all program data provided by the service.
+
+        Programs are yielded station by station as soon as the weekly program
+        data of each station is fetched.
 
         Args:
             only_downloadable (bool): Whether to get program data that cannot
                 be downloaded, i.e., programs that have not yet finished
                 broadcast.
+            use_cache (bool): Answer from the catalog set by `set_catalog` for
+                stations whose data is still fresh.
 
-        Returns:
-            list of `Program`: All program data provided by the service.
+        Yields:
+            `Program`: Program data provided by the service.
         """
-        ret = []
         now = datetime.datetime.now()
-        for station in self.get_stations():
-            raw_programs = self._get_program_station_weekly(station.station_id)
-            if not raw_programs:
-                continue
-            raw_programs = raw_programs["stations"][0]  # len(raw_programs) == 1
-            for raw_program in raw_programs["progs"]:
-                if only_downloadable and to_datetime(raw_program["attr"]["to"]) > now:
+        station_ids = [
+            station.station_id for station in self.get_stations(use_cache=use_cache)
+        ]
+        all_programs = imap_concurrently(
+            partial(self._get_station_programs, use_cache=use_cache),
+            station_ids,
+            self._max_workers,
+        )
+        for programs in all_programs:
+            for program in programs:
+                if only_downloadable and _get_end_datetime(program) > now:
                     # Programs that have not yet finished cannot be downloaded.
-                    # attr.to represents the broadcast end date and time.
                     continue
-                raw_data = {
-                    "attr": raw_programs["attr"],
-                    "name": raw_programs["name"],
-                    "date": raw_programs["date"],
-                    "progs": [raw_program],
-                }
-                ret.append(_convert_raw_data_to_program(raw_data, self.service_id()))
+                yield program
+
+    def get_programs(
+        self, only_downloadable: bool = False, use_cache: bool = False, **kwargs
+    ) -> List[Program]:
+        """Get all program data provided by the service.
+
+        See `iter_programs` for the arguments.
+
+        Returns:
+            list of `Program`: All program data provided by the service.
+        """
+        ret = list(self.iter_programs(only_downloadable, use_cache, **kwargs))
         logger.info(f"Get {len(ret)} program(s) from {self.service_id()}")
         return ret
 
-    def _download_media(self, program: Program, file_path: Union[str, Path]) -> None:
-        """Support only time-shift download"""
+    async def aget_programs(
+        self, only_downloadable: bool = False, use_cache: bool = False, **kwargs
+    ) -> List[Program]:
+        """asyncio counterpart of `get_programs`. The weekly program data of
+        up to `max_workers` stations is fetched concurrently.
+        """
+        now = datetime.datetime.now()
+        stations = await self.aget_stations(use_cache=use_cache)
+        semaphore = asyncio.Semaphore(max(self._max_workers, 1))
 
-        # check required fields of program
-        required_fields = ["station_id", "pub_date", "duration"]
-        for field in required_fields:
-            if getattr(program, field) is None:
-                raise ValueError(f"{field} field is required")
+        async def get_station_programs(station_id: str) -> List[Program]:
+            async with semaphore:
+                return await self._aget_station_programs(station_id, use_cache)
 
-        def to_timestamp(x: datetime.datetime) -> str:
-            return x.strftime("%Y%m%d%H%M%S")
+        all_programs = await asyncio.gather(
+            *(get_station_programs(station.station_id) for station in stations)
+        )
+        ret = [
+            program
+            for programs in all_programs
+            for program in programs
+            if not (only_downloadable and _get_end_datetime(program) > now)
+        ]
+        logger.info(f"Get {len(ret)} program(s) from {self.service_id()}")
+        return ret
+
+    def _sync_programs(
+        self,
+        state: SyncState,
+        only_downloadable: bool = False,
+        use_cache: bool = False,
+        **kwargs,
+    ) -> List[Program]:
+        now = datetime.datetime.now()
+        station_ids = [
+            station.station_id for station in self.get_stations(use_cache=use_cache)
+        ]
 
-        ft = program.pub_date
-        to = ft + datetime.timedelta(seconds=program.duration)
-        ft, to = to_timestamp(ft), to_timestamp(to)
+        def sync_station(station_id: str) -> List[Program]:
+            scope = f"weekly/{station_id}"
+            content = self._get_program_station_weekly_content(station_id)
+            if content is None:
+                return []
+            # The recorded source is [digest of the response, UNIX time when
+            # the first program excluded by only_downloadable finishes].
+            digest = _get_weekly_digest(content)
+            source = state.get_source(self.service_id(), scope)
+            if source and source[0] == digest:
+                if source[1] is None or source[1] > now.timestamp():
+                    # Neither the response nor the downloadable programs have
+                    # changed, so there is no need to parse it.
+                    return []
+            programs = self._parse_station_programs(content)
+            due = None
+            if only_downloadable:
+                unfinished = [p for p in programs if _get_end_datetime(p) > now]
+                programs = [p for p in programs if _get_end_datetime(p) <= now]
+                if unfinished:
+                    due = min(_get_end_datetime(p) for p in unfinished).timestamp()
+            state.set_source(self.service_id(), scope, [digest, due])
+            return state.update(self.service_id(), scope, programs)
+
+        all_programs = map_concurrently(sync_station, station_ids, self._max_workers)
+        ret = list(itertools.chain.from_iterable(all_programs))
+        logger.info(f"Get {len(ret)} new program(s) from {self.service_id()}")
+        return ret
 
+    def _download_window(
+        self,
+        station_id: str,
+        ft: datetime.datetime,
+        duration: int,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Download the time-shift stream from `ft` for `duration` seconds."""
+        deadline = get_deadline(timeout)
+        params = _get_playlist_params(station_id, ft, duration)
+        headers = {"X-Radiko-Authtoken": self._authtoken}
         playlist = self._get(
-            "v2/api/ts/playlist.m3u8",
-            "text",
-            params={"station_id": program.station_id, "l": 15, "ft": ft, "to": to},
-            headers={"X-Radiko-Authtoken": self._authtoken},
+            "v2/api/ts/playlist.m3u8", "text", params=params, headers=headers
         )
+        url = _find_stream_url(playlist)
+        if self._hls:
+            self._hls.download(
+                url,
+                file_path,
+                headers=headers,
+                duration=duration,
+                # The stream URL differs between sessions.
+                key=f"{station_id}/{params['ft']}/{params['to']}",
+                tag=tag,
+                timeout=get_remaining_time(deadline),
+            )
+            return
+        with metrics.span("ffmpeg", command="download", service=self.service_id()):
+            subprocess.run(
+                self._get_ffmpeg_command(url, duration, file_path, tag),
+                check=True,
+                timeout=get_remaining_time(deadline),
+            )
 
-        url = re.findall("^https?://.+m3u8$", playlist, flags=(re.MULTILINE))[0]
+    async def _adownload_window(
+        self,
+        station_id: str,
+        ft: datetime.datetime,
+        duration: int,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        deadline = get_deadline(timeout)
+        params = _get_playlist_params(station_id, ft, duration)
+        headers = {"X-Radiko-Authtoken": self._authtoken}
+        playlist = await self._aget(
+            "v2/api/ts/playlist.m3u8", "text", params=params, headers=headers
+        )
+        url = _find_stream_url(playlist)
+        if self._hls:
+            # The native downloader fetches segments with its own threads.
+            await asyncio.to_thread(
+                self._hls.download,
+                url,
+                file_path,
+                headers=headers,
+                duration=duration,
+                key=f"{station_id}/{params['ft']}/{params['to']}",
+                tag=tag,
+                timeout=get_remaining_time(deadline),
+            )
+            return
+        with metrics.span("ffmpeg", command="download", service=self.service_id()):
+            await arun(self._get_ffmpeg_command(url, duration, file_path, tag))
+
+    def _get_ffmpeg_command(
+        self,
+        url: str,
+        duration: int,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+    ) -> List[str]:
         cmd = ["ffmpeg", "-y", "-loglevel", "quiet"]
         cmd += ["-headers", f'"X-Radiko-Authtoken:{self._authtoken}"\r\n']
         cmd += ["-i", url]
-        cmd += ["-vn", "-acodec", "copy"]
+        if tag:
+            cmd += tag.get_input_args()
+        if not (tag and tag.has_cover):
+            # The audio and the cover image are mapped by the tag otherwise.
+            cmd += ["-vn"]
+        cmd += ["-acodec", "copy"]
         cmd += ["-bsf:a", "aac_adtstoasc"]
         cmd += ["-timeout", str(120)]
-        cmd += ["-t", str(program.duration)]
+        cmd += ["-t", str(duration)]
+        if tag:
+            cmd += tag.get_output_args()
         cmd += [str(file_path)]
-        subprocess.run(cmd)
+        return cmd
+
+    def _get_windows(self, program: Program) -> List[Tuple[datetime.datetime, int]]:
+        # check required fields of program
+        required_fields = ["station_id", "pub_date", "duration"]
+        for field in required_fields:
+            if getattr(program, field) is None:
+                raise ValueError(f"{field} field is required")
+        return _split_time_window(
+            program.pub_date, program.duration, self._download_chunks
+        )
+
+    def _get_chunk_jobs(
+        self,
+        program: Program,
+        file_path: Path,
+        windows: List[Tuple[datetime.datetime, int]],
+    ) -> Tuple[List[Path], List[Tuple[datetime.datetime, int, Path]]]:
+        """Get the chunk file paths of the windows and the windows that have
+        not been downloaded yet with their chunk file paths.
+
+        The program and the window of each chunk are recorded in
+        `<file_path>.chunks.json`. Chunks completed by an interrupted
+        download are reused only if they were downloaded for the same
+        program and window, and the other ones are deleted.
+        """
+        chunk_paths = _get_chunk_paths(file_path, len(windows))
+        progress_path = _get_chunks_progress_path(file_path)
+        params = _get_playlist_params(
+            program.station_id, program.pub_date, program.duration
+        )
+        key = f"{program.station_id}/{params['ft']}/{params['to']}"
+        progress = _load_progress(progress_path, key)
+        recorded = progress["windows"] if progress else []
+        current = [[_to_timestamp(ft), duration] for ft, duration in windows]
+        # Chunks beyond the current windows were split differently.
+        for path in _get_chunk_paths(file_path, len(recorded))[len(windows) :]:
+            if path.exists():
+                path.unlink()
+        jobs = []
+        for i, ((ft, duration), path) in enumerate(zip(windows, chunk_paths)):
+            if path.exists():
+                if i < len(recorded) and recorded[i] == current[i]:
+                    continue
+                logger.debug(f"Delete the stale chunk {path}")
+                path.unlink()
+            jobs.append((ft, duration, path))
+        if len(jobs) < len(windows):
+            logger.info(f"Resume {file_path} from {len(windows) - len(jobs)} chunk(s)")
+        # A chunk file exists only once it is complete, so the windows are
+        # recorded before any of them is downloaded.
+        _save_progress(progress_path, {"key": key, "windows": current})
+        return chunk_paths, jobs
+
+    def _download_media(
+        self,
+        program: Program,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Support only time-shift download"""
+        windows = self._get_windows(program)
+        if len(windows) == 1:
+            self._download_window(
+                program.station_id,
+                program.pub_date,
+                program.duration,
+                file_path,
+                tag,
+                timeout,
+            )
+            return
+        deadline = get_deadline(timeout)
+
+        file_path = Path(file_path)
+        chunk_paths, jobs = self._get_chunk_jobs(program, file_path, windows)
+
+        def download_chunk(ft: datetime.datetime, duration: int, path: Path) -> None:
+            # A chunk file exists only once it is complete.
+            tmp_path = get_temp_file_path(path)
+            self._download_window(
+                program.station_id,
+                ft,
+                duration,
+                tmp_path,
+                timeout=get_remaining_time(deadline),
+            )
+            os.replace(tmp_path, path)
+
+        map_concurrently(lambda x: download_chunk(*x), jobs, len(windows))
+        # Chunks are left untagged and the tag is written while joining them.
+        concat(
+            chunk_paths,
+            file_path,
+            duration=program.duration,
+            tag=tag,
+            timeout=get_remaining_time(deadline),
+        )
+        _remove_chunks(file_path, chunk_paths)
+
+    async def _adownload_media(
+        self,
+        program: Program,
+        file_path: Union[str, Path],
+        tag: Optional[FFmpegTag] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        windows = self._get_windows(program)
+        if len(windows) == 1:
+            await self._adownload_window(
+                program.station_id,
+                program.pub_date,
+                program.duration,
+                file_path,
+                tag,
+                timeout,
+            )
+            return
+        deadline = get_deadline(timeout)
+
+        file_path = Path(file_path)
+        chunk_paths, jobs = self._get_chunk_jobs(program, file_path, windows)
+
+        async def download_chunk(
+            ft: datetime.datetime, duration: int, path: Path
+        ) -> None:
+            tmp_path = get_temp_file_path(path)
+            await self._adownload_window(
+                program.station_id,
+                ft,
+                duration,
+                tmp_path,
+                timeout=get_remaining_time(deadline),
+            )
+            os.replace(tmp_path, path)
+
+        await asyncio.gather(*(download_chunk(*x) for x in jobs))
+        await asyncio.to_thread(
+            concat,
+            chunk_paths,
+            file_path,
+            duration=program.duration,
+            tag=tag,
+            timeout=get_remaining_time(deadline),
+        )
+        _remove_chunks(file_path, chunk_paths)
 
     def _get_default_file_path(self, program: Program) -> Path:
         dt = program.pub_date.strftime("%Y-%m-%d-%H-%M")
@@ -0,0 +1,116 @@
+import base64
+import copy
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+
+from .program import Program
+
+_VERSION = 1
+
+
+def get_program_digest(program: Program) -> str:
+    """Get a digest of the fields of a program except `raw_data`.
+
+    It changes when any metadata visible to users, such as the title or the
+    description, is changed by the service.
+    """
+    data = program.to_dict(encode_json=False)
+    data.pop("raw_data", None)
+    text = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def get_content_digest(content: bytes) -> str:
+    """Get a digest of a raw response."""
+    return hashlib.sha1(content).hexdigest()
+
+
+class SyncState:
+    """State of `Service.get_new_programs`.
+
+    It remembers the digest of every episode seen so far, grouped by service
+    and scope (a unit of data fetched from a service at once, e.g. the
+    weekly programs of a radiko.jp station). It can also remember the digest
+    of the raw response of a scope so that an unchanged response does not
+    need to be parsed again.
+
+    Use `encode` and `decode` to carry it between runs as an opaque token.
+    """
+
+    def __init__(
+        self,
+        episodes: Optional[Dict[str, Dict[str, Dict[str, str]]]] = None,
+        sources: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        self._episodes = episodes or {}
+        self._sources = sources or {}
+
+    @classmethod
+    def decode(cls, token: Optional[str]) -> "SyncState":
+        """Restore a state from a token. None gives an empty state."""
+        if not token:
+            return cls()
+        data = json.loads(zlib.decompress(base64.urlsafe_b64decode(token)))
+        if data.get("version") != _VERSION:
+            raise ValueError(f"unsupported sync state version: {data.get('version')}")
+        return cls(data["episodes"], data["sources"])
+
+    def encode(self) -> str:
+        """Serialize the state into an opaque token."""
+        data = {
+            "version": _VERSION,
+            "episodes": self._episodes,
+            "sources": self._sources,
+        }
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        return base64.urlsafe_b64encode(zlib.compress(text.encode("utf-8"))).decode()
+
+    def copy(self, service_id: str) -> "SyncState":
+        """Get an independent copy of the part of the state of a service."""
+        return SyncState(
+            {service_id: copy.deepcopy(self._episodes.get(service_id, {}))},
+            {service_id: copy.deepcopy(self._sources.get(service_id, {}))},
+        )
+
+    def merge(self, other: "SyncState", service_id: str) -> None:
+        """Replace the part of the state of a service with that of `other`."""
+        self._episodes[service_id] = other._episodes.get(service_id, {})
+        self._sources[service_id] = other._sources.get(service_id, {})
+
+    def get_source(self, service_id: str, scope: str) -> Optional[Any]:
+        """Get the value recorded by `set_source` for the scope."""
+        return self._sources.get(service_id, {}).get(scope, None)
+
+    def set_source(self, service_id: str, scope: str, value: Any) -> None:
+        """Record a JSON serializable value, typically a digest of the raw
+        response, for the scope.
+        """
+        self._sources.setdefault(service_id, {})[scope] = value
+
+    def update(
+        self, service_id: str, scope: str, programs: List[Program]
+    ) -> List[Program]:
+        """Replace the episodes of the scope and return the added or changed
+        ones.
+
+        Args:
+            service_id (str): ID of the service.
+            scope (str): Scope of the programs.
+            programs (list of `Program`): Program data currently provided for
+                the scope.
+
+        Returns:
+            list of `Program`: Programs that are new or whose digest changed.
+        """
+        old = self._episodes.get(service_id, {}).get(scope, {})
+        new = {}
+        ret = []
+        for program in programs:
+            key = f"{program.program_id}/{program.episode_id}"
+            new[key] = get_program_digest(program)
+            if old.get(key, None) != new[key]:
+                ret.append(program)
+        self._episodes.setdefault(service_id, {})[scope] = new
+        return ret
@@ -1,10 +1,9 @@
 from pathlib import Path
-from typing import Any, Dict, Union
-
-from mutagen import mp4
+from typing import Any, Dict, List, Optional, Union
 
+from . import metrics
+from .cover import get_cover_cache
 from .program import Program
-from .util import get_image
 
 
 def get_mp4_tag(
@@ -42,15 +41,112 @@ def get_mp4_tag(
         "tven": str(program.episode_id),
     }
     if program.image_url and set_cover_image:
-        covr = get_image(program.image_url)
+        covr = get_cover_cache().get(program.image_url)
         if covr:
             ret["covr"] = [covr]
     return ret
 
 
 def set_mp4_tag(file_path: Union[str, Path], tag: Dict[str, Any]) -> None:
+    from mutagen import mp4
+
     media = mp4.MP4(str(file_path))
     for key, value in tag.items():
         if value is not None:
             media[key] = value
-    media.save()
+    with metrics.span("mp4_tag_save"):
+        media.save()
+
+
+# ffmpeg metadata keys that the MP4 muxer of ffmpeg writes as the iTunes
+# atoms. The other atoms set by `get_mp4_tag`, such as performers `\xa9con`
+# and url `\xa9url`, cannot be written by ffmpeg.
+_FFMPEG_METADATA_KEYS = {
+    "\xa9ART": "artist",
+    "\xa9alb": "album",
+    "\xa9nam": "title",
+    "\xa9day": "date",
+    "desc": "description",
+    "\xa9cmt": "comment",
+    "\xa9gen": "genre",
+    "cprt": "copyright",
+    "tven": "episode_id",
+}
+
+
+class FFmpegTag:
+    """ffmpeg options to write a MP4 tag while muxing, so that the media
+    file is not rewritten by `set_mp4_tag` afterwards.
+
+    The cover image is passed to ffmpeg as an attached picture from a
+    temporary file next to the output, which is removed by `close`. It is
+    attached only to audio files. Attaching it to a video file would need
+    every video stream to be mapped explicitly, which would keep all the
+    variants of a HLS master playlist instead of the one that ffmpeg
+    selects.
+
+    The rest of the tag, which must be set by `set_mp4_tag` afterwards, is
+    given by `get_rest`: performers `\xa9con` and url `\xa9url`, which
+    ffmpeg cannot write, and the cover image of video files. ffmpeg writes
+    the moov atom after the media data, so setting them rewrites only the
+    end of the file.
+
+    Args:
+        tag (dict): Tag made by `get_mp4_tag`.
+        file_path (str or `pathlib.Path`): Output media file path.
+        attach_cover (bool): Attach the cover image. Specify False for video
+            files.
+    """
+
+    def __init__(
+        self, tag: Dict[str, Any], file_path: Union[str, Path], attach_cover: bool
+    ) -> None:
+        self._tag = tag
+        self._cover_path: Optional[Path] = None
+        covr = tag.get("covr", None)
+        if attach_cover and covr:
+            data = bytes(covr[0])
+            ext = ".png" if data.startswith(b"\x89PNG") else ".jpg"
+            file_path = Path(file_path)
+            self._cover_path = file_path.with_name(f"{file_path.name}.cover{ext}")
+            self._cover_path.write_bytes(data)
+
+    def close(self) -> None:
+        if self._cover_path and self._cover_path.exists():
+            self._cover_path.unlink()
+
+    def __enter__(self) -> "FFmpegTag":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def has_cover(self) -> bool:
+        return self._cover_path is not None
+
+    def get_input_args(self) -> List[str]:
+        """Get the input options, which follow the input of the media."""
+        return ["-i", str(self._cover_path)] if self._cover_path else []
+
+    def get_output_args(self) -> List[str]:
+        """Get the output options, which precede the output file path."""
+        ret = []
+        if self._cover_path:
+            ret += ["-map", "0:a", "-map", "1:v", "-c:v", "copy"]
+            ret += ["-disposition:v:0", "attached_pic"]
+        for key, name in _FFMPEG_METADATA_KEYS.items():
+            value = self._tag.get(key, None)
+            if value is not None:
+                ret += ["-metadata", f"{name}={value}"]
+        return ret
+
+    def get_rest(self) -> Dict[str, Any]:
+        """Get the part of the tag that is not written by ffmpeg."""
+        return {
+            key: value
+            for key, value in self._tag.items()
+            if value is not None
+            and key not in _FFMPEG_METADATA_KEYS
+            and not (key == "covr" and self._cover_path)
+        }
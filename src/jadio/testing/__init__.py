@@ -0,0 +1 @@
+"""Offline stand-ins of the radio services for benchmarks and load tests."""
@@ -0,0 +1,277 @@
+import datetime
+import random
+import struct
+import zlib
+from typing import Any, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+# Generators of responses in the formats of the services. The data is
+# synthetic but deterministic, and its size follows the real responses, e.g.
+# about 100 stations in radiko.jp `region/full.xml`.
+
+_WORDS = [
+    "ラジオ",
+    "ニュース",
+    "音楽",
+    "深夜",
+    "週末",
+    "スポーツ",
+    "トーク",
+    "アニメ",
+    "ゲーム",
+    "情報",
+    "ワイド",
+    "スペシャル",
+]
+_NAMES = ["佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤"]
+
+
+def _get_title(rng: random.Random, n: int = 3) -> str:
+    return "".join(rng.choice(_WORDS) for _ in range(n))
+
+
+def _get_persons(rng: random.Random, n: int) -> List[str]:
+    return [f"{rng.choice(_NAMES)}{rng.choice(_NAMES)}" for _ in range(n)]
+
+
+def radiko_station_ids(n_stations: int = 100) -> List[str]:
+    return [f"ST{i:03}" for i in range(n_stations)]
+
+
+def radiko_region_full_xml(n_stations: int = 100, n_regions: int = 8) -> bytes:
+    """radiko.jp `v3/station/region/full.xml`."""
+    station_ids = radiko_station_ids(n_stations)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', "<region>"]
+    per_region = -(-n_stations // n_regions)
+    for r in range(n_regions):
+        lines.append(
+            f'  <stations ascii_name="REGION{r}" region_id="region{r}"'
+            f' region_name="地域{r}">'
+        )
+        for station_id in station_ids[r * per_region : (r + 1) * per_region]:
+            lines += [
+                "    <station>",
+                f"      <id>{station_id}</id>",
+                f"      <name>{station_id}ラジオ</name>",
+                f"      <ascii_name>{station_id} RADIO</ascii_name>",
+                "      <areafree>1</areafree>",
+                "      <timefree>1</timefree>",
+            ]
+            for width, height in [(124, 40), (344, 80), (688, 160), (224, 100)]:
+                lines.append(
+                    f'      <logo width="{width}" height="{height}" align="center">'
+                    f"https://radiko.jp/v2/static/station/logo/{station_id}/"
+                    f"{width}x{height}.png</logo>"
+                )
+            lines += [
+                f"      <banner>https://radiko.jp/res/banner/{station_id}/banner.png"
+                "</banner>",
+                f"      <area_id>JP{r + 1}</area_id>",
+                f"      <href>https://example.com/{station_id.lower()}/</href>",
+                "    </station>",
+            ]
+        lines.append("  </stations>")
+    lines.append("</region>")
+    return "\n".join(lines).encode("utf-8")
+
+
+def radiko_weekly_xml(
+    station_id: str,
+    start: Optional[datetime.date] = None,
+    days: int = 7,
+    progs_per_day: int = 40,
+    ttl: int = 1800,
+    srvtime: Optional[int] = None,
+) -> bytes:
+    """radiko.jp `v3/program/station/weekly/{station_id}.xml`.
+
+    A broadcast day starts at 5:00 and is filled with programs of equal
+    length.
+    """
+    rng = random.Random(station_id)
+    start = start or datetime.date(2024, 6, 3)
+    srvtime = srvtime or int(
+        datetime.datetime.combine(start, datetime.time(5)).timestamp()
+    )
+    dur = 24 * 60 * 60 // progs_per_day
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<radiko>",
+        f"  <ttl>{ttl}</ttl>",
+        f"  <srvtime>{srvtime}</srvtime>",
+        "  <stations>",
+        f'    <station id="{station_id}">',
+        f"      <name>{station_id}ラジオ</name>",
+    ]
+    prog_id = zlib.crc32(station_id.encode()) % 1000 * 100000
+    for d in range(days):
+        day = start + datetime.timedelta(days=d)
+        ft = datetime.datetime.combine(day, datetime.time(5))
+        lines += ["      <progs>", f"        <date>{day:%Y%m%d}</date>"]
+        for _ in range(progs_per_day):
+            to = ft + datetime.timedelta(seconds=dur)
+            prog_id += 1
+            title = escape(_get_title(rng))
+            performers = "、".join(_get_persons(rng, rng.randint(1, 3)))
+            lines += [
+                f'        <prog id="{prog_id}" master_id="" ft="{ft:%Y%m%d%H%M%S}"'
+                f' to="{to:%Y%m%d%H%M%S}" ftl="{ft:%H%M}" tol="{to:%H%M}"'
+                f' dur="{dur}">',
+                f"          <title>{title}</title>",
+                f"          <url>https://example.com/{station_id.lower()}/{prog_id}</url>",
+                "          <failed_record>0</failed_record>",
+                "          <ts_in_ng>0</ts_in_ng>",
+                "          <ts_out_ng>0</ts_out_ng>",
+                f"          <desc>{escape(_get_title(rng, 20))}</desc>",
+                "          <info>"
+                + escape(f'<a href="https://example.com/">{_get_title(rng, 10)}</a>')
+                + "</info>",
+                f"          <pfm>{escape(performers)}</pfm>",
+                f"          <img>https://program-static.cf.radiko.jp/{prog_id}.jpg</img>",
+                "          <tag><item><name>"
+                + escape(rng.choice(_WORDS))
+                + "</name></item></tag>",
+                '          <genre><program id="P001"><name>音楽</name></program></genre>',
+                f'          <metas><meta name="twitter" value="#{station_id.lower()}" />'
+                "</metas>",
+                "        </prog>",
+            ]
+            ft = to
+        lines.append("      </progs>")
+    lines += ["    </station>", "  </stations>", "</radiko>"]
+    return "\n".join(lines).encode("utf-8")
+
+
+def onsen_nuxt_state(n_programs: int = 200, n_episodes: int = 3) -> Dict[str, Any]:
+    """`window.__NUXT__` of the top page of onsen.ag."""
+    rng = random.Random("onsen.ag")
+    programs = []
+    for i in range(n_programs):
+        directory_name = f"program{i:03}"
+        contents = []
+        for j in range(n_episodes):
+            episode_id = i * 100 + j
+            contents.append(
+                {
+                    "id": episode_id,
+                    "title": f"第{n_episodes - j}回",
+                    "latest": j == 0,
+                    "media_type": "sound",
+                    "program_id": i,
+                    "delivery_date": f"6/{j + 1}",
+                    "movie": j % 5 == 4,
+                    "premium": j > 0,
+                    "guests": _get_persons(rng, rng.randint(0, 2)),
+                    "expiring": False,
+                    # Premium episodes are not streamed without a login.
+                    "streaming_url": None
+                    if j > 0 and i % 2
+                    else "https://onsen-ma3phlsvod.sslcs.cdngc.net/onsen-ma3pvod/"
+                    f"_definst_/202406/{directory_name}_{episode_id}.mp4/playlist.m3u8",
+                    "tag_image": None,
+                }
+            )
+        programs.append(
+            {
+                "id": i,
+                "directory_name": directory_name,
+                "display": True,
+                "title": _get_title(rng),
+                "image": {"url": f"https://example.com/onsen/{directory_name}.jpg"},
+                "new": False,
+                "list": True,
+                "delivery_interval": "毎週火曜日配信",
+                "category_list": ["アニメ"],
+                "copyright": f"©{directory_name}",
+                "sponsor_name": None,
+                "related_links": [],
+                "performers": [
+                    {"id": rng.randint(1, 9999), "name": name}
+                    for name in _get_persons(rng, rng.randint(1, 3))
+                ],
+                "contents": contents,
+            }
+        )
+    return {"state": {"programs": {"programs": {"all": programs}}}}
+
+
+def hibiki_programs(n_programs: int = 150) -> List[Dict[str, Any]]:
+    """hibiki-radio.jp `api/v1/programs`."""
+    rng = random.Random("hibiki-radio.jp")
+    ret = []
+    for i in range(n_programs):
+        access_id = f"program{i:03}"
+        updated_at = datetime.datetime(2024, 6, 3, 12) + datetime.timedelta(hours=i)
+        ret.append(
+            {
+                "id": i,
+                "access_id": access_id,
+                "name": _get_title(rng),
+                "description": _get_title(rng, 30),
+                "pc_image_url": f"https://example.com/hibiki/{access_id}.jpg",
+                "sp_image_url": f"https://example.com/hibiki/{access_id}_sp.jpg",
+                "onair_information": "毎週月曜日更新",
+                "email": f"{access_id}@example.com",
+                "copyright": f"©{access_id}",
+                "share_url": f"https://hibiki-radio.jp/description/{access_id}/detail",
+                "cast": ", ".join(_get_persons(rng, rng.randint(1, 3))),
+                "episode_updated_at": updated_at.strftime("%Y/%m/%d %H:%M:%S"),
+                "episode": {
+                    "id": i * 10,
+                    "name": f"第{i + 1}回",
+                    "media_type": 1,
+                    "updated_at": updated_at.strftime("%Y/%m/%d %H:%M:%S"),
+                    "video": {"id": i * 10 + 1, "duration": 1800.5},
+                },
+            }
+        )
+    return ret
+
+
+def _atom(name: bytes, data: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(data), name) + data
+
+
+def empty_mp4() -> bytes:
+    """Smallest MP4 file that can be tagged by mutagen. It has no tracks."""
+    mvhd = _atom(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, 0) + bytes(80))
+    return (
+        _atom(b"ftyp", b"M4A \x00\x00\x02\x00M4A mp42isom")
+        + _atom(b"moov", mvhd)
+        + _atom(b"mdat")
+    )
+
+
+# Sampling frequency index of ADTS headers.
+_ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050]
+
+# Raw data block of a silent AAC-LC stereo frame: a channel pair element
+# followed by the end element.
+_SILENT_CPE = bytes.fromhex("211004608c1c")
+
+
+def adts_frames(
+    duration: float, bitrate: int = 48000, sample_rate: int = 48000
+) -> bytes:
+    """AAC-LC stereo stream in ADTS of `duration` seconds.
+
+    Each frame is silence padded with zeros to the bitrate, which ffmpeg can
+    probe, remux with `-acodec copy` and decode.
+    """
+    n_frames = round(duration * sample_rate / 1024)
+    frame_len = max(bitrate * 1024 // sample_rate // 8, 7 + len(_SILENT_CPE))
+    sf_index = _ADTS_SAMPLE_RATES.index(sample_rate)
+    channels = 2
+    header = bytes(
+        [
+            0xFF,
+            0xF1,  # MPEG-4, no CRC
+            (1 << 6) | (sf_index << 2) | (channels >> 2),  # AAC-LC
+            ((channels & 3) << 6) | (frame_len >> 11),
+            (frame_len >> 3) & 0xFF,
+            ((frame_len & 7) << 5) | 0x1F,
+            0xFC,
+        ]
+    )
+    payload = _SILENT_CPE + bytes(frame_len - 7 - len(_SILENT_CPE))
+    return (header + payload) * n_frames
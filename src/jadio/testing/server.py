@@ -0,0 +1,398 @@
+import collections
+import datetime
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+from . import data
+
+logger = logging.getLogger(__name__)
+
+
+class FakeServer:
+    """Local stand-in of radiko.jp, onsen.ag and hibiki-radio.jp.
+
+    It serves the endpoints used by the services with the synthetic data of
+    `jadio.testing.data`, under `/radiko/`, `/onsen/` and `/hibiki/`, and
+    serves all HLS streams under `/stream/`. Pass `get_configs()` to
+    `jadio.Jadio`, or `base_url` to each service, to use it:
+
+        with FakeServer(latency=0.05, error_rate=0.01) as server:
+            with Jadio(server.get_configs()) as jadio:
+                programs = jadio.get_programs()
+
+    Latency, bandwidth and error injection apply to every request, so the
+    effects of concurrency, retries and download throughput can be measured
+    end to end on one machine. Member login of radiko.jp and the program
+    pages of onsen.ag, which are scraped by a browser, are not served.
+
+    Args:
+        host (str): Host to listen on.
+        port (int): Port to listen on. If it is 0, a free port is used.
+        latency (float): Seconds to wait before each response.
+        bandwidth (int): Bytes per second of each response body. If it is
+            not specified, the bandwidth is not limited.
+        error_rate (float): Probability that a request fails with
+            `error_status`.
+        error_status (int): Status code of injected errors.
+        segment_duration (int): Duration [seconds] of HLS segments.
+        bitrate (int): Bitrate [bits per second] of HLS streams.
+        n_stations (int): Number of radiko.jp stations.
+        n_onsen_programs (int): Number of onsen.ag programs.
+        n_hibiki_programs (int): Number of hibiki-radio.jp programs.
+        seed (int): Seed of error injection.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        bandwidth: Optional[int] = None,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        segment_duration: int = 5,
+        bitrate: int = 48000,
+        n_stations: int = 100,
+        n_onsen_programs: int = 200,
+        n_hibiki_programs: int = 150,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._segment_duration = segment_duration
+        self._bitrate = bitrate
+        self._n_stations = n_stations
+        self._n_onsen_programs = n_onsen_programs
+        self._n_hibiki_programs = n_hibiki_programs
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+        self._routes = [
+            (re.compile(pattern), fn)
+            for pattern, fn in [
+                (r"/radiko/v2/api/auth1", self._radiko_auth1),
+                (r"/radiko/v2/api/auth2", self._radiko_auth2),
+                (r"/radiko/v2/station/list/\w+\.xml", self._radiko_stations),
+                (r"/radiko/v3/station/region/full\.xml", self._radiko_stations),
+                (
+                    r"/radiko/v3/program/station/weekly/(\w+)\.xml",
+                    self._radiko_weekly,
+                ),
+                (r"/radiko/v2/api/ts/playlist\.m3u8", self._radiko_playlist),
+                (r"/hibiki/programs", self._hibiki_programs),
+                (r"/hibiki/videos/play_check", self._hibiki_play_check),
+                (r"/onsen/", self._onsen_top),
+                (r"/onsen/web_api/programs/", self._onsen_programs),
+                (r"/stream/([\d.]+)/([\w-]+)\.m3u8", self._stream_playlist),
+                (r"/stream/([\d.]+)/([\w-]+)/(\d+)\.aac", self._stream_segment),
+            ]
+        ]
+
+        fake = self
+
+        class Handler(_Handler):
+            server_ = fake
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+        # Responses that include URLs of the server are built once it is bound.
+        self._onsen_state = self._get_onsen_state()
+        self._hibiki_durations = {
+            str(x["episode"]["video"]["id"]): x["episode"]["video"]["duration"]
+            for x in _get_hibiki_programs(self._n_hibiki_programs)
+        }
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def radiko_url(self) -> str:
+        return urljoin(self.url, "radiko/")
+
+    @property
+    def onsen_url(self) -> str:
+        return urljoin(self.url, "onsen/")
+
+    @property
+    def hibiki_url(self) -> str:
+        return urljoin(self.url, "hibiki/")
+
+    def get_configs(self, **kwargs) -> Dict[str, Dict[str, Any]]:
+        """Get `configs` of `jadio.Jadio` to use the server.
+
+        Args:
+            kwargs: Arguments of every service class, e.g. `native_hls`.
+        """
+        return {
+            "radiko.jp": {**kwargs, "base_url": self.radiko_url},
+            "onsen.ag": {**kwargs, "base_url": self.onsen_url},
+            "hibiki-radio.jp": {**kwargs, "base_url": self.hibiki_url},
+        }
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the number of requests per endpoint, `errors` (injected or
+        not) and `bytes` sent as response bodies.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def start(self) -> "FakeServer":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, daemon=True
+            )
+            self._thread.start()
+            logger.info(f"Serve fake services at {self.url}")
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _route(
+        self, path: str
+    ) -> Tuple[Optional[Callable[..., "_Response"]], Tuple[str, ...]]:
+        for pattern, fn in self._routes:
+            m = pattern.fullmatch(path)
+            if m:
+                return fn, m.groups()
+        return None, ()
+
+    # radiko.jp
+
+    def _radiko_auth1(self, request: "_Handler") -> "_Response":
+        headers = {
+            "X-Radiko-AuthToken": "fake-authtoken",
+            "X-Radiko-KeyLength": "16",
+            "X-Radiko-KeyOffset": "0",
+        }
+        return _Response(200, b"OK", "text/plain", headers)
+
+    def _radiko_auth2(self, request: "_Handler") -> "_Response":
+        if request.headers.get("X-Radiko-Authtoken") != "fake-authtoken":
+            return _Response(401, b"", "text/plain")
+        return _Response(200, "JP13,東京都,tokyo Japan".encode(), "text/plain")
+
+    def _radiko_stations(self, request: "_Handler") -> "_Response":
+        content = _get_radiko_region_full_xml(self._n_stations)
+        return _Response(200, content, "application/xml")
+
+    def _radiko_weekly(self, request: "_Handler", station_id: str) -> "_Response":
+        if station_id not in data.radiko_station_ids(self._n_stations):
+            return _Response(404, b"", "text/plain")
+        return _Response(200, _get_radiko_weekly_xml(station_id), "application/xml")
+
+    def _radiko_playlist(self, request: "_Handler") -> "_Response":
+        query = request.query
+        if request.headers.get("X-Radiko-Authtoken") != "fake-authtoken":
+            return _Response(401, b"", "text/plain")
+        try:
+            ft, to = [
+                datetime.datetime.strptime(query[k], "%Y%m%d%H%M%S")
+                for k in ["ft", "to"]
+            ]
+            station_id = query["station_id"]
+        except (KeyError, ValueError):
+            return _Response(400, b"", "text/plain")
+        duration = (to - ft).total_seconds()
+        url = self._get_stream_url(duration, f"{station_id}-{query['ft']}")
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH={self._bitrate}",
+            url,
+        ]
+        return _Response(200, "\n".join(lines).encode(), "application/x-mpegURL")
+
+    # hibiki-radio.jp
+
+    def _hibiki_programs(self, request: "_Handler") -> "_Response":
+        content = json.dumps(_get_hibiki_programs(self._n_hibiki_programs))
+        return _Response(200, content.encode(), "application/json")
+
+    def _hibiki_play_check(self, request: "_Handler") -> "_Response":
+        video_id = request.query.get("video_id", "")
+        if video_id not in self._hibiki_durations:
+            return _Response(404, b"", "application/json")
+        duration = self._hibiki_durations[video_id]
+        url = self._get_stream_url(duration, f"hibiki-{video_id}")
+        content = json.dumps({"playlist_url": url})
+        return _Response(200, content.encode(), "application/json")
+
+    # onsen.ag
+
+    def _get_onsen_state(self) -> Dict[str, Any]:
+        state = data.onsen_nuxt_state(self._n_onsen_programs)
+        for raw_program in state["state"]["programs"]["programs"]["all"]:
+            for content in raw_program["contents"]:
+                if content["streaming_url"]:
+                    name = f"onsen-{content['id']}"
+                    content["streaming_url"] = self._get_stream_url(30 * 60, name)
+        return state
+
+    def _onsen_top(self, request: "_Handler") -> "_Response":
+        state = json.dumps(self._onsen_state)
+        html = f"<html><body><script>window.__NUXT__={state};</script></body></html>"
+        return _Response(200, html.encode(), "text/html")
+
+    def _onsen_programs(self, request: "_Handler") -> "_Response":
+        raw_programs = self._onsen_state["state"]["programs"]["programs"]["all"]
+        return _Response(200, json.dumps(raw_programs).encode(), "application/json")
+
+    # HLS streams
+
+    def _get_stream_url(self, duration: float, name: str) -> str:
+        return urljoin(self.url, f"stream/{duration:g}/{name}.m3u8")
+
+    def _stream_playlist(
+        self, request: "_Handler", duration: str, name: str
+    ) -> "_Response":
+        duration = float(duration)
+        n_segments = math.ceil(duration / self._segment_duration)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{self._segment_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for i in range(n_segments):
+            length = min(self._segment_duration, duration - i * self._segment_duration)
+            lines += [f"#EXTINF:{length:.3f},", f"{name}/{i}.aac"]
+        lines.append("#EXT-X-ENDLIST")
+        return _Response(200, "\n".join(lines).encode(), "application/x-mpegURL")
+
+    def _stream_segment(
+        self, request: "_Handler", duration: str, name: str, index: str
+    ) -> "_Response":
+        duration, index = float(duration), int(index)
+        length = min(self._segment_duration, duration - index * self._segment_duration)
+        if length <= 0:
+            return _Response(404, b"", "text/plain")
+        content = _get_adts_frames(round(length, 3), self._bitrate)
+        return _Response(200, content, "audio/aac")
+
+
+# The synthetic data is deterministic, so it is generated once per process.
+
+
+@lru_cache(maxsize=None)
+def _get_radiko_region_full_xml(n_stations: int) -> bytes:
+    return data.radiko_region_full_xml(n_stations)
+
+
+@lru_cache(maxsize=1024)
+def _get_radiko_weekly_xml(station_id: str) -> bytes:
+    return data.radiko_weekly_xml(station_id)
+
+
+@lru_cache(maxsize=None)
+def _get_hibiki_programs(n_programs: int) -> list:
+    return data.hibiki_programs(n_programs)
+
+
+@lru_cache(maxsize=64)
+def _get_adts_frames(duration: float, bitrate: int) -> bytes:
+    return data.adts_frames(duration, bitrate)
+
+
+class _Response:
+    def __init__(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections alive like the real servers.
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which would otherwise be
+    # delayed by Nagle's algorithm on kept-alive connections.
+    disable_nagle_algorithm = True
+    server_: FakeServer
+
+    @property
+    def query(self) -> Dict[str, str]:
+        query = parse_qs(urlsplit(self.path).query)
+        return {k: v[0] for k, v in query.items()}
+
+    def do_GET(self) -> None:
+        fake = self.server_
+        path = urlsplit(self.path).path
+        fn, args = fake._route(path)
+        if fake.latency > 0:
+            time.sleep(fake.latency)
+        if fn is None:
+            response = _Response(404, b"", "text/plain")
+        elif fake._inject_error():
+            response = _Response(fake.error_status, b"", "text/plain")
+        else:
+            fake._count(fn.__name__.lstrip("_"))
+            response = fn(self, *args)
+        if response.status >= 400:
+            fake._count("errors")
+        self._send(response)
+
+    def do_POST(self) -> None:
+        # The body is read off to keep the connection usable.
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def _send(self, response: _Response) -> None:
+        fake = self.server_
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        for k, v in response.headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        body = memoryview(response.body)
+        if not fake.bandwidth:
+            self.wfile.write(body)
+        else:
+            # Send the body in 100 ms slices.
+            size = max(fake.bandwidth // 10, 1)
+            for i in range(0, len(body), size):
+                self.wfile.write(body[i : i + size])
+                time.sleep(len(body[i : i + size]) / fake.bandwidth)
+        fake._count("bytes", len(response.body))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
@@ -1,11 +1,31 @@
+import asyncio
 import datetime
 import json
+import subprocess
+import threading
+import time
 import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
 from xml.etree import ElementTree
 
-import requests
+if TYPE_CHECKING:
+    import requests
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def extract_numbers(x: str) -> Optional[int]:
@@ -115,7 +135,7 @@ def _convert_content(content: bytes, content_type: str = "text") -> Dict[str, st
     return ret
 
 
-def get_content(response: requests.Response, content_type: str = "text") -> Any:
+def get_content(response: "requests.Response", content_type: str = "text") -> Any:
     ret = {
         "raw": response,
         "headers": response.headers,
@@ -134,11 +154,95 @@ def get_image(url: str) -> Optional[bytes]:
     Returns:
         bytes: downloaded image data.
     """
-    response = requests.get(url)
+    from .http_client import get_http_client
+
+    response = get_http_client().get(url)
     response.raise_for_status()
     return get_content(response, content_type="byte")
 
 
+def imap_concurrently(
+    fn: Callable[[T], R], iterable: Iterable[T], max_workers: int = 1
+) -> Iterator[R]:
+    """Lazily apply a function to every item, optionally with a thread pool.
+
+    The results are yielded in the same order as `iterable` as soon as each
+    one is available, regardless of the order in which the calls finish.
+
+    Args:
+        fn (callable): function applied to each item.
+        iterable (iterable): input items.
+        max_workers (int): maximum number of concurrent calls. If it is 1 or
+            less, the items are processed sequentially in the calling thread.
+
+    Yields:
+        result of `fn` for each item.
+    """
+    if max_workers <= 1:
+        yield from map(fn, iterable)
+        return
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        yield from executor.map(fn, iterable)
+    finally:
+        # Calls that have not started are not needed if the caller stops.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def map_concurrently(
+    fn: Callable[[T], R], iterable: Iterable[T], max_workers: int = 1
+) -> List[R]:
+    """Apply a function to every item, optionally with a thread pool.
+
+    See `imap_concurrently` for the arguments.
+
+    Returns:
+        list: results of `fn` for each item in the same order as `iterable`.
+    """
+    return list(imap_concurrently(fn, iterable, max_workers))
+
+
+def submit_daemon(fn: Callable[..., R], *args, **kwargs) -> "Future[R]":
+    """Call a function in a new daemon thread.
+
+    Unlike the threads of `ThreadPoolExecutor`, it does not keep the
+    interpreter from exiting, so use it for calls that may be abandoned
+    after a timeout.
+
+    Returns:
+        `concurrent.futures.Future`: Result of the call.
+    """
+    future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+async def arun(cmd: List[str]) -> None:
+    """Run a command like `subprocess.run(cmd, check=True)` without blocking
+    the event loop. The process is killed if the task is cancelled.
+
+    Raises:
+        subprocess.CalledProcessError: The command exited with an error.
+    """
+    process = await asyncio.create_subprocess_exec(*cmd)
+    try:
+        returncode = await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
 def check_dict_deep(x: Dict[Any, Any], keys: List[str]) -> bool:
     if len(keys) == 0:
         return True
@@ -155,6 +259,32 @@ def get_config_path() -> Path:
     return Path.home() / ".config" / "jadio" / "config.json"
 
 
+def get_cache_dir() -> Path:
+    return Path.home() / ".cache" / "jadio"
+
+
+def get_temp_file_path(file_path: Union[str, Path]) -> Path:
+    """Get the path to write a file to before it is complete.
+
+    It is in the same directory, so that it can be renamed atomically, and
+    keeps the extension, from which ffmpeg infers the output format.
+    """
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.stem}.tmp{file_path.suffix}")
+
+
+def get_deadline(timeout: Optional[float]) -> Optional[float]:
+    """Get the `time.monotonic()` time at which `timeout` seconds elapse.
+    None means no timeout.
+    """
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def get_remaining_time(deadline: Optional[float]) -> Optional[float]:
+    """Get the seconds left until a deadline given by `get_deadline`."""
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
 def load_config(path: Optional[Union[str, Path]] = None) -> Dict[str, str]:
     path = Path(path or get_config_path())
     if not path.exists():
@@ -0,0 +1,138 @@
+"""Offline benchmarks of the parsing and conversion hot paths.
+
+Run them with pytest-benchmark, e.g.
+`pytest tests/benchmarks --benchmark-only --benchmark-autosave`, and compare
+runs with `--benchmark-compare`.
+"""
+import json
+import subprocess
+import sys
+from xml.etree import ElementTree
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from jadio.services import hibiki, onsen, radiko
+from jadio.tag import get_mp4_tag, set_mp4_tag
+from jadio.testing import data
+from jadio.util import to_datetime
+
+STATION_IDS = data.radiko_station_ids(5)
+
+
+@pytest.fixture(scope="module")
+def region_full() -> bytes:
+    return data.radiko_region_full_xml()
+
+
+@pytest.fixture(scope="module")
+def weeklies() -> dict:
+    return {x: data.radiko_weekly_xml(x) for x in STATION_IDS}
+
+
+@pytest.fixture(scope="module")
+def radiko_raw_data(weeklies) -> list:
+    ret = []
+    for content in weeklies.values():
+        tree = radiko._parse_programs_tree(ElementTree.fromstring(content))
+        for station in tree["stations"]:
+            for prog in station["progs"]:
+                ret.append({**station, "progs": [prog]})
+    return ret
+
+
+@pytest.fixture(scope="module")
+def onsen_raw_data() -> list:
+    raw_programs = data.onsen_nuxt_state()["state"]["programs"]["programs"]["all"]
+    return [x for p in raw_programs for x in onsen._iter_episode_raw_data(p)]
+
+
+@pytest.fixture(scope="module")
+def programs(radiko_raw_data) -> list:
+    return [
+        radiko._convert_raw_data_to_program(x, "radiko.jp") for x in radiko_raw_data
+    ]
+
+
+def test_radiko_parse_stations_tree(benchmark, region_full):
+    ret = benchmark(
+        lambda: radiko._parse_stations_tree(ElementTree.fromstring(region_full))
+    )
+    assert len(ret) == 100
+
+
+def test_radiko_parse_programs_tree(benchmark, weeklies):
+    def run():
+        return [
+            radiko._parse_programs_tree(ElementTree.fromstring(x))
+            for x in weeklies.values()
+        ]
+
+    assert len(benchmark(run)) == len(STATION_IDS)
+
+
+def test_radiko_iterparse_programs(benchmark, weeklies):
+    def run():
+        return [
+            list(radiko._iterparse_programs(x, "radiko.jp")) for x in weeklies.values()
+        ]
+
+    assert all(len(x) == 7 * 40 for x in benchmark(run))
+
+
+def test_radiko_convert_raw_data_to_program(benchmark, radiko_raw_data):
+    convert = radiko._convert_raw_data_to_program
+    ret = benchmark(lambda: [convert(x, "radiko.jp") for x in radiko_raw_data])
+    assert len(ret) == len(radiko_raw_data)
+
+
+def test_onsen_convert_raw_data_to_program(benchmark, onsen_raw_data):
+    convert = onsen._convert_raw_data_to_program
+    ret = benchmark(lambda: [convert(x, "onsen.ag") for x in onsen_raw_data])
+    assert len(ret) == len(onsen_raw_data)
+
+
+def test_onsen_extract_nuxt_state(benchmark):
+    state = data.onsen_nuxt_state()
+    html = f"<script>window.__NUXT__={json.dumps(state)};</script>"
+    assert benchmark(onsen._extract_nuxt_state, html) == state
+
+
+def test_hibiki_convert_raw_data_to_program(benchmark):
+    raw_programs = data.hibiki_programs()
+    convert = hibiki._convert_raw_data_to_program
+    ret = benchmark(lambda: [convert(x, "hibiki-radio.jp") for x in raw_programs])
+    assert len(ret) == len(raw_programs)
+
+
+@pytest.mark.parametrize("dt", ["20240604010000", "2024/06/04 01:00:00", "6/4", "now"])
+def test_to_datetime(benchmark, dt):
+    benchmark(to_datetime, dt)
+
+
+def test_get_mp4_tag(benchmark, programs):
+    ret = benchmark(
+        lambda: [get_mp4_tag("TBS", p, set_cover_image=False) for p in programs]
+    )
+    assert len(ret) == len(programs)
+
+
+def test_set_mp4_tag(benchmark, programs, tmp_path):
+    file_path = tmp_path / "media.m4a"
+    file_path.write_bytes(data.empty_mp4())
+    tag = get_mp4_tag("TBS", programs[0], set_cover_image=False)
+    tag["covr"] = [b"\xff\xd8" + bytes(100 * 1024)]
+    benchmark(set_mp4_tag, file_path, tag)
+
+
+def test_program_to_json(benchmark, programs):
+    ret = benchmark(lambda: [p.to_json() for p in programs])
+    assert len(ret) == len(programs)
+
+
+def test_import_time(benchmark):
+    def run():
+        subprocess.run([sys.executable, "-c", "import jadio"], check=True)
+
+    benchmark.pedantic(run, rounds=5, iterations=1)
@@ -0,0 +1,99 @@
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from jadio import Jadio
+from jadio.services import Hibiki, Onsen, Radiko
+from jadio.testing.server import FakeServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeServer(n_stations=5, n_onsen_programs=10, n_hibiki_programs=10) as ret:
+        yield ret
+
+
+def test_radiko(server):
+    async def main():
+        async with Radiko(base_url=server.radiko_url, max_workers=5) as service:
+            stations = await service.aget_stations()
+            programs = await service.aget_programs(only_downloadable=True)
+        return stations, programs
+
+    stations, programs = asyncio.run(main())
+    assert len(stations) == 5
+    with Radiko(base_url=server.radiko_url) as service:
+        assert programs == service.get_programs(only_downloadable=True)
+
+
+def test_onsen(server):
+    async def main():
+        async with Onsen(base_url=server.onsen_url) as service:
+            return await service.aget_programs()
+
+    with Onsen(base_url=server.onsen_url) as service:
+        assert asyncio.run(main()) == service.get_programs()
+
+
+def test_jadio(server):
+    async def main():
+        async with Jadio(server.get_configs()) as service:
+            return await service.aget_programs()
+
+    programs = asyncio.run(main())
+    assert {p.service_id for p in programs} == {
+        "radiko.jp",
+        "onsen.ag",
+        "hibiki-radio.jp",
+    }
+
+
+def test_adownload(server, tmp_path, monkeypatch):
+    def mux(src_path, dst_path, duration=None, tag=None, timeout=None):
+        Path(dst_path).write_bytes(Path(src_path).read_bytes())
+
+    monkeypatch.setattr("jadio.hls.mux", mux)
+
+    async def main():
+        async with Hibiki(base_url=server.hibiki_url, native_hls=True) as service:
+            programs = (await service.aget_programs())[:3]
+            return await asyncio.gather(
+                *(
+                    service.adownload(p, tmp_path / f"{i}.m4a", set_tag=False)
+                    for i, p in enumerate(programs)
+                )
+            )
+
+    file_paths = asyncio.run(main())
+    assert [p.name for p in file_paths] == ["0.m4a", "1.m4a", "2.m4a"]
+    assert all(p.stat().st_size > 0 for p in file_paths)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["0.m4a", "1.m4a", "2.m4a"]
+
+
+def test_adownload_timeout(server, tmp_path, monkeypatch):
+    def mux(src_path, dst_path, duration=None, tag=None, timeout=None):
+        # ffmpeg is stuck.
+        cmd = [sys.executable, "-c", "import time; time.sleep(10)"]
+        subprocess.run(cmd, check=True, timeout=timeout)
+
+    monkeypatch.setattr("jadio.hls.mux", mux)
+
+    async def main():
+        async with Hibiki(base_url=server.hibiki_url, native_hls=True) as service:
+            program = (await service.aget_programs())[0]
+            with pytest.raises(TimeoutError):
+                await service.adownload(
+                    program, tmp_path / "0.m4a", set_tag=False, timeout=1
+                )
+
+    start = time.monotonic()
+    asyncio.run(main())
+    # The process is killed instead of being left to the worker thread.
+    assert time.monotonic() - start < 5
+    assert not (tmp_path / "0.m4a").exists()
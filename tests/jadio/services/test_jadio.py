@@ -0,0 +1,282 @@
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import CancelledError
+from pathlib import Path
+from typing import List, Union
+
+import pytest
+
+from jadio import Jadio, Program, Station
+from jadio.services.base import Service
+
+
+class _FakeService(Service):
+    def __init__(self, service_id: str, delay: float = 0.0, fail: bool = False):
+        self._service_id = service_id
+        self._delay = delay
+        self._fail = fail
+
+    def service_id(self) -> str:
+        return self._service_id
+
+    def name(self) -> str:
+        return self._service_id
+
+    def link_url(self) -> str:
+        return f"https://{self._service_id}/"
+
+    def get_programs(self, **kwargs) -> List[Program]:
+        time.sleep(self._delay)
+        if self._fail:
+            raise RuntimeError("failed")
+        return [Program(service_id=self._service_id, episode_id=i) for i in range(2)]
+
+    def _download_media(self, program: Program, file_path: Union[str, Path]) -> None:
+        time.sleep(self._delay)
+        if self._fail:
+            raise RuntimeError("failed")
+        Path(file_path).touch()
+
+    def _get_default_file_path(self, program: Program) -> Path:
+        return Path(f"{program.episode_id}.m4a")
+
+
+class _PartialSyncService(_FakeService):
+    def _sync_programs(self, state, **kwargs) -> List[Program]:
+        # Update the state of a scope before failing on the next one.
+        ret = state.update(self.service_id(), "first", self.get_programs())
+        if self._fail_sync:
+            raise RuntimeError("failed")
+        return ret
+
+
+def _get_jadio(*services: _FakeService, timeouts=None) -> Jadio:
+    jadio = Jadio.__new__(Jadio)
+    jadio._service_cls = {service.service_id(): type(service) for service in services}
+    jadio._configs = {}
+    jadio._services = {service.service_id(): service for service in services}
+    jadio._lock = threading.Lock()
+    jadio._service_locks = {x: threading.Lock() for x in jadio._service_cls}
+    jadio._logged_in = False
+    jadio._timeouts = timeouts or {}
+    return jadio
+
+
+def test_get_programs_keeps_service_order():
+    jadio = _get_jadio(_FakeService("a", delay=0.05), _FakeService("b"))
+    programs = jadio.get_programs()
+    assert [p.service_id for p in programs] == ["a", "a", "b", "b"]
+
+
+def test_get_programs_partial_results():
+    jadio = _get_jadio(
+        _FakeService("a", fail=True),
+        _FakeService("b", delay=1.0),
+        _FakeService("c"),
+        timeouts={"b": 0.1},
+    )
+    start = time.monotonic()
+    programs = jadio.get_programs()
+    assert time.monotonic() - start < 0.5
+    assert [p.service_id for p in programs] == ["c", "c"]
+
+
+class _LoginService(_FakeService):
+    def __init__(self, service_id: str, login_delay: float = 0.0):
+        super().__init__(service_id)
+        self._login_delay = login_delay
+
+    def login(self) -> None:
+        time.sleep(self._login_delay)
+        if self._service_id == "fail":
+            raise RuntimeError("login failed")
+
+
+def test_get_programs_isolates_login_of_services():
+    jadio = _get_jadio(timeouts={"slow": 0.2})
+    jadio._service_cls = {x: _LoginService for x in ["fail", "slow", "ok"]}
+    jadio._service_locks = {x: threading.Lock() for x in jadio._service_cls}
+    jadio._configs = {
+        "fail": {"service_id": "fail"},
+        "slow": {"service_id": "slow", "login_delay": 1.0},
+        "ok": {"service_id": "ok"},
+    }
+    jadio._logged_in = True
+    start = time.monotonic()
+    programs = jadio.get_programs()
+    assert time.monotonic() - start < 0.5
+    assert [p.service_id for p in programs] == ["ok", "ok"]
+    # The service that failed to log in is constructed again.
+    assert "fail" not in jadio._services
+
+
+def test_download_many_reports_failures(tmp_path):
+    jadio = _get_jadio(_FakeService("a"), _FakeService("b", fail=True))
+    programs = [Program(service_id=s, episode_id=i) for s in "ab" for i in range(2)]
+    file_paths = [tmp_path / f"{i}.m4a" for i in range(len(programs))]
+    results = jadio.download_many(programs, file_paths, set_tag=False)
+    assert [r.ok for r in results] == [True, True, False, False]
+    assert all(r.file_path == f for r, f in zip(results, file_paths))
+    assert file_paths[0].exists() and not file_paths[2].exists()
+
+
+def test_download_many_timeout(tmp_path):
+    jadio = _get_jadio(_FakeService("a"), _FakeService("b", delay=1.0))
+    programs = [Program(service_id="a"), Program(service_id="b")]
+    file_paths = [tmp_path / "a.m4a", tmp_path / "b.m4a"]
+    start = time.monotonic()
+    results = jadio.download_many(programs, file_paths, set_tag=False, timeout=0.2)
+    assert time.monotonic() - start < 0.5
+    assert results[0].ok
+    assert isinstance(results[1].error, TimeoutError)
+
+
+def test_download_many_timeout_cancels_queued_jobs(tmp_path):
+    jadio = _get_jadio(_FakeService("a", delay=1.0))
+    programs = [Program(service_id="a", episode_id=i) for i in range(2)]
+    file_paths = [tmp_path / "0.m4a", tmp_path / "1.m4a"]
+    results = jadio.download_many(programs, file_paths, set_tag=False, timeout=0.2)
+    # Only the running job timed out. The queued one never started.
+    assert isinstance(results[0].error, TimeoutError)
+    assert isinstance(results[1].error, CancelledError)
+
+
+class _ProcessService(_FakeService):
+    _supports_download_timeout = True
+
+    def __init__(self, service_id: str) -> None:
+        super().__init__(service_id)
+        self.stopped: List[int] = []
+
+    def _download_media(self, program: Program, file_path, timeout=None) -> None:
+        # The first episode is stuck.
+        seconds = 10 if program.episode_id == 0 else 0
+        cmd = [sys.executable, "-c", f"import time; time.sleep({seconds})"]
+        try:
+            subprocess.run(cmd, check=True, timeout=timeout)
+        finally:
+            self.stopped.append(program.episode_id)
+        Path(file_path).touch()
+
+
+def test_download_many_job_timeout(tmp_path):
+    jadio = _get_jadio(_ProcessService("a"))
+    programs = [Program(service_id="a", episode_id=i) for i in range(2)]
+    file_paths = [tmp_path / "0.m4a", tmp_path / "1.m4a"]
+    start = time.monotonic()
+    results = jadio.download_many(
+        programs, file_paths, set_tag=False, timeout=5, job_timeout=0.5
+    )
+    # The stuck process is killed and the queued job runs after it.
+    assert time.monotonic() - start < 3
+    assert isinstance(results[0].error, TimeoutError)
+    assert results[1].ok and file_paths[1].exists()
+
+
+def test_download_many_timeout_stops_running_jobs(tmp_path):
+    service = _ProcessService("a")
+    jadio = _get_jadio(service)
+    results = jadio.download_many(
+        [Program(service_id="a", episode_id=0)],
+        [tmp_path / "0.m4a"],
+        set_tag=False,
+        timeout=0.5,
+    )
+    assert isinstance(results[0].error, TimeoutError)
+    # The stuck process is killed at the batch deadline too.
+    deadline = time.monotonic() + 2
+    while not service.stopped and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert service.stopped == [0]
+
+
+def test_iter_programs_yields_as_services_respond():
+    jadio = _get_jadio(
+        _FakeService("a", delay=0.2),
+        _FakeService("b", fail=True),
+        _FakeService("c"),
+        _FakeService("d", delay=1.0),
+        timeouts={"d": 0.4},
+    )
+    start = time.monotonic()
+    programs = jadio.iter_programs()
+    assert next(programs).service_id == "c"
+    assert time.monotonic() - start < 0.1
+    assert [p.service_id for p in programs] == ["c", "a", "a"]
+    assert time.monotonic() - start < 0.6
+
+
+class _StationService(_FakeService):
+    def __init__(self, service_id: str):
+        super().__init__(service_id)
+        self.stations = [Station(service_id=service_id, station_id="TBS", name="TBS")]
+        self.calls = 0
+
+    def get_stations(self, **kwargs) -> List[Station]:
+        self.calls += 1
+        return self.stations
+
+
+def test_get_station_from_program_uses_index():
+    service = _StationService("a")
+    jadio = _get_jadio(service)
+    program = Program(service_id="a", station_id="TBS")
+    for _ in range(3):
+        assert jadio.get_station_from_program(program).station_id == "TBS"
+    assert service.calls == 1
+    with pytest.raises(ValueError):
+        service.get_station("QRR")
+
+    service.stations = [Station(service_id="a", station_id="QRR", name="QRR")]
+    jadio.clear_station_cache()
+    assert service.get_station("QRR").station_id == "QRR"
+    assert service.calls == 2
+
+
+def test_services_are_constructed_on_first_use(monkeypatch):
+    constructed = []
+
+    def get_service_cls(service_id):
+        class _Service(_FakeService):
+            def __init__(self, **kwargs):
+                super().__init__(service_id, **kwargs)
+                constructed.append(service_id)
+
+            @classmethod
+            def service_id(cls) -> str:
+                return service_id
+
+        return _Service
+
+    monkeypatch.setattr(
+        "jadio.services.jadio._get_all_service_cls",
+        lambda: [get_service_cls("a"), get_service_cls("b"), get_service_cls("c")],
+    )
+    jadio = Jadio({"a": {"delay": 0.01}}, service_ids=["a", "b"])
+    assert constructed == []
+    program = Program(service_id="a", episode_id=0)
+    assert jadio.service_id(program) == "a"
+    assert constructed == ["a"]
+    assert len(jadio.get_programs()) == 4
+    assert constructed == ["a", "b"]
+    with pytest.raises(ValueError):
+        jadio.get_service_from_program(Program(service_id="c"))
+    with pytest.raises(ValueError):
+        Jadio({}, service_ids=["x"])
+
+
+def test_get_new_programs_discards_state_of_failed_service():
+    service = _PartialSyncService("a")
+    service._fail_sync = True
+    jadio = _get_jadio(service, _FakeService("b"))
+    programs, state = jadio.get_new_programs()
+    assert [p.service_id for p in programs] == ["b", "b"]
+
+    # The programs of the failed service are reported on the next call.
+    service._fail_sync = False
+    programs, state = jadio.get_new_programs(state)
+    assert [p.service_id for p in programs] == ["a", "a"]
+    programs, state = jadio.get_new_programs(state)
+    assert programs == []
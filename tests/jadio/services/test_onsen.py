@@ -1,9 +1,17 @@
+import json
 import tempfile
 from pathlib import Path
 
 import pytest
+import requests
 
+import jadio.services.onsen
 from jadio import Onsen
+from jadio.services.onsen import (
+    _DescriptionCache,
+    _extract_nuxt_state,
+    _iter_episode_raw_data,
+)
 from jadio.util import check_dict_deep, get_login_info_from_config
 
 try:
@@ -15,19 +23,21 @@ except FileNotFoundError:
 def test_login_without_user_info():
     with Onsen() as service:
         service: Onsen
-        assert service._driver.name == "chrome"
+        # The webdriver is started on first use.
+        assert service._driver is None
+        assert service._get_driver().name == "chrome"
 
 
 @pytest.mark.skipif(not LOGIN_INFO, reason="config file is not found")
 def test_login_with_user_info():
     login_info = get_login_info_from_config("onsen.ag")
     with Onsen(**login_info) as service:
-        assert len(service._driver.get_cookies()) > 0
+        assert len(service._get_driver().get_cookies()) > 0
 
 
 def test_login_with_user_info_error():
     with Onsen(mail="hoge@gmail.com", password="xxx") as service:
-        assert len(service._driver.get_cookies()) > 0
+        assert len(service._get_driver().get_cookies()) > 0
 
 
 def test__get_information():
@@ -77,3 +87,121 @@ def test_download():
         file_path = Path(tmp_dir) / "media.m4a"
         service.download(program, file_path)
         assert file_path.exists()
+
+
+def test__iter_episode_raw_data():
+    raw_program = {
+        "id": 1,
+        "title": "title",
+        "performers": [{"id": 1, "name": "name"}],
+        "contents": [
+            {"id": 10, "streaming_url": "https://example.com/10.m3u8"},
+            {"id": 11, "streaming_url": None},
+            {"id": 12, "streaming_url": "https://example.com/12.m3u8"},
+        ],
+    }
+    episodes = list(_iter_episode_raw_data(raw_program))
+    assert [e["contents"][0]["id"] for e in episodes] == [10, 12]
+    assert all(len(e["contents"]) == 1 for e in episodes)
+    # Program-level data is shared instead of copied.
+    assert episodes[0]["performers"] is raw_program["performers"]
+    assert len(raw_program["contents"]) == 3
+
+
+def _get_raw_program(directory_name: str, episode_ids):
+    return {
+        "directory_name": directory_name,
+        "title": directory_name,
+        "delivery_interval": None,
+        "copyright": None,
+        "image": {"url": None},
+        "performers": [],
+        "contents": [
+            {
+                "id": i,
+                "title": str(i),
+                "streaming_url": f"https://example.com/onsen/_definst_/202406/{i}.mp4/playlist.m3u8",
+                "delivery_date": "6/4",
+                "guests": [],
+                "movie": False,
+            }
+            for i in episode_ids
+        ],
+    }
+
+
+def test_iter_programs_more_data_scrapes_once_per_program(tmp_path, monkeypatch):
+    class _Driver:
+        def quit(self):
+            pass
+
+    scraped = []
+
+    def get_description(directory_name, driver, base_url):
+        scraped.append(directory_name)
+        return f"description of {directory_name}"
+
+    monkeypatch.setattr(jadio.services.onsen, "_get_webdriver", _Driver)
+    monkeypatch.setattr(
+        jadio.services.onsen, "_get_description_from_program_web_site", get_description
+    )
+    names = ["a", "b", "c"]
+    information = {
+        "state": {
+            "programs": {
+                "programs": {
+                    "all": [
+                        _get_raw_program(x, range(3 * i, 3 * i + 3))
+                        for i, x in enumerate(names)
+                    ]
+                }
+            }
+        }
+    }
+    path = tmp_path / "descriptions.json"
+    service = Onsen(max_drivers=2)
+    service._get_information = lambda: information
+    service._descriptions = _DescriptionCache(path, 60)
+    programs = service.get_programs(more_data=True)
+    assert [p.episode_id for p in programs] == list(range(9))
+    assert [p.description for p in programs[::3]] == [
+        f"description of {x}" for x in names
+    ]
+    assert sorted(scraped) == names
+    assert len(service._driver_pool._drivers) <= 2
+    service.close()
+
+    # Descriptions are reused by another session.
+    service = Onsen()
+    service._get_information = lambda: information
+    service._descriptions = _DescriptionCache(path, 60)
+    assert service.get_programs(more_data=True) == programs
+    assert sorted(scraped) == names
+
+
+def test__extract_nuxt_state():
+    state = {"state": {"programs": {"programs": {"all": [{"id": 1}]}}}}
+    html = f"<script>window.__NUXT__={json.dumps(state)};</script>"
+    assert _extract_nuxt_state(html) == state
+    with pytest.raises(ValueError):
+        _extract_nuxt_state(
+            "<script>window.__NUXT__=(function(a){return {}}(1));</script>"
+        )
+
+
+def test__get_information_falls_back_to_browser():
+    information = {"state": {"programs": {"programs": {"all": []}}}}
+
+    def fail():
+        raise requests.ConnectionError("unreachable")
+
+    service = Onsen()
+    service._get_information_without_browser = fail
+    service._get_information_with_browser = lambda: information
+    assert service._get_information() == information
+
+    # Signed-in sessions always use the browser.
+    service = Onsen(mail="hoge@gmail.com", password="xxx")
+    service._get_information_without_browser = lambda: {}
+    service._get_information_with_browser = lambda: information
+    assert service._get_information() == information
@@ -1,11 +1,20 @@
+import datetime
 import tempfile
 from pathlib import Path
 from typing import Any, Dict, List
+from xml.etree import ElementTree
 
 import pytest
 import requests
 
 from jadio import Program, Radiko
+from jadio.services.radiko import (
+    _convert_raw_data_to_program,
+    _iterparse_programs,
+    _parse_programs_tree,
+    _split_time_window,
+)
+from jadio.testing.server import FakeServer
 from jadio.util import check_dict_deep, get_login_info_from_config
 
 try:
@@ -157,3 +166,86 @@ def test_download():
         file_path = Path(tmp_dir) / "media.m4a"
         service.download(program, file_path)
         assert file_path.exists()
+
+
+def test_clear_station_cache():
+    with FakeServer(n_stations=3) as server:
+        with Radiko(base_url=server.radiko_url) as service:
+            assert len(service.get_stations()) == 3
+            service.get_stations()
+            assert server.get_stats()["radiko_stations"] == 1
+            service.clear_station_cache()
+            assert len(service.get_stations()) == 3
+            assert server.get_stats()["radiko_stations"] == 2
+
+
+def test__split_time_window():
+    ft = datetime.datetime(2024, 6, 4, 1, 0)
+    windows = _split_time_window(ft, 2 * 60 * 60, 4)
+    assert windows == [
+        (ft + datetime.timedelta(minutes=30 * i), 30 * 60) for i in range(4)
+    ]
+
+    windows = _split_time_window(ft, 1003, 3)
+    assert [d for _, d in windows] == [335, 335, 333]
+    assert windows[1][0] == ft + datetime.timedelta(seconds=335)
+    assert _split_time_window(ft, 1003, 1) == [(ft, 1003)]
+
+
+def test__get_chunk_jobs_reuses_only_matching_chunks(tmp_path):
+    ft = datetime.datetime(2024, 6, 4, 1, 0)
+    program = Program(station_id="TBS", pub_date=ft, duration=60 * 60)
+    file_path = tmp_path / "media.m4a"
+    service = Radiko(download_chunks=2)
+    windows = service._get_windows(program)
+    chunk_paths, jobs = service._get_chunk_jobs(program, file_path, windows)
+    assert len(jobs) == 2
+    chunk_paths[0].write_bytes(b"0")
+
+    # The same program resumes from the completed chunk.
+    _, jobs = service._get_chunk_jobs(program, file_path, windows)
+    assert [path for _, _, path in jobs] == [chunk_paths[1]]
+
+    # A chunk of another program is not reused.
+    other = Program(station_id="TBS", pub_date=ft, duration=30 * 60)
+    windows = service._get_windows(other)
+    _, jobs = service._get_chunk_jobs(other, file_path, windows)
+    assert len(jobs) == 2
+    assert not chunk_paths[0].exists()
+
+    # Nor is a chunk of the same program split differently.
+    chunk_paths[0].write_bytes(b"0")
+    chunk_paths[1].write_bytes(b"1")
+    windows = Radiko(download_chunks=1)._get_windows(other)
+    _, jobs = service._get_chunk_jobs(other, file_path, windows)
+    assert len(jobs) == 1
+    assert not chunk_paths[0].exists() and not chunk_paths[1].exists()
+
+
+def test__iterparse_programs():
+    content = (
+        Path(__file__).parents[1] / "data" / "radiko_weekly_TBS.xml"
+    ).read_bytes()
+    raw_programs = _parse_programs_tree(ElementTree.fromstring(content))
+    raw_station = raw_programs["stations"][0]
+    expected = [
+        _convert_raw_data_to_program(
+            {
+                "attr": raw_station["attr"],
+                "name": raw_station["name"],
+                "date": raw_station["date"],
+                "progs": [raw_program],
+            },
+            "radiko.jp",
+        )
+        for raw_program in raw_station["progs"]
+    ]
+    header = {}
+    programs = list(_iterparse_programs(content, "radiko.jp", header))
+    assert header == {"ttl": 1800, "srvtime": 1717430400}
+    assert len(programs) == 4
+    for program, expected_program in zip(programs, expected):
+        if program.episode_id == 10003:
+            # attr.to is empty and resolved to the current time.
+            continue
+        assert program == expected_program
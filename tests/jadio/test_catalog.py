@@ -0,0 +1,84 @@
+import datetime
+import time
+
+from jadio import Catalog, Hibiki, Program, Station
+
+
+def _get_program(episode_id: int) -> Program:
+    return Program(
+        service_id="radiko.jp",
+        station_id="TBS",
+        program_id="tbs_tue_0100",
+        episode_id=episode_id,
+        pub_date=datetime.datetime(2024, 6, 4, 1, 0),
+        duration=7200,
+        program_title="title",
+        performers=["a", "b"],
+        raw_data={"progs": [{"attr": {"id": episode_id}}]},
+    )
+
+
+def test_put_and_get_programs(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    programs = [_get_program(i) for i in range(3)]
+    catalog.put_programs("radiko.jp", "weekly/TBS", programs)
+    catalog.put_programs("radiko.jp", "weekly/QRR", [_get_program(10)])
+    assert catalog.is_fresh("radiko.jp", "weekly/TBS")
+    assert catalog.get_programs("radiko.jp", "weekly/TBS") == programs
+    assert len(catalog.get_programs("radiko.jp")) == 4
+
+    # A scope is replaced as a whole.
+    catalog.put_programs("radiko.jp", "weekly/TBS", programs[:1])
+    assert catalog.get_programs("radiko.jp", "weekly/TBS") == programs[:1]
+    catalog.close()
+
+    # Data persists across instances.
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    assert catalog.get_programs("radiko.jp", "weekly/QRR") == [_get_program(10)]
+
+
+def test_expiration(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    catalog.put_programs("radiko.jp", "a", [], expires_at=time.time() - 1)
+    assert not catalog.is_fresh("radiko.jp", "a")
+    assert not catalog.is_fresh("radiko.jp", "unknown")
+
+
+def test_put_and_get_stations(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    stations = [Station("radiko.jp", "TBS", "TBSラジオ")]
+    catalog.put_stations("radiko.jp", stations)
+    assert catalog.is_fresh("radiko.jp", "stations")
+    assert catalog.get_stations("radiko.jp") == stations
+
+
+def test_get_programs_use_cache(tmp_path):
+    raw_program = {
+        "access_id": "program",
+        "episode_updated_at": "2024/06/04 12:00:00",
+        "name": "program",
+        "description": "",
+        "onair_information": "",
+        "copyright": "",
+        "share_url": "",
+        "pc_image_url": "",
+        "cast": "a, b",
+        "episode": {
+            "id": 1,
+            "name": "episode",
+            "media_type": 1,
+            "video": {"id": 2, "duration": 60.0},
+        },
+    }
+    calls = []
+
+    def get(href):
+        calls.append(href)
+        return [raw_program]
+
+    with Hibiki() as service:
+        service._get = get
+        service.set_catalog(Catalog(tmp_path / "catalog.sqlite3"))
+        programs = service.get_programs()
+        assert service.get_programs(use_cache=True) == programs
+        assert len(calls) == 1
@@ -0,0 +1,54 @@
+import copy
+import datetime
+import pickle
+
+import pytest
+
+from jadio import CompactProgram, CompactStation, Hibiki, Program, Station
+
+
+def _get_program() -> Program:
+    return Program(
+        service_id="hibiki-radio.jp",
+        program_id="program",
+        episode_id=1,
+        pub_date=datetime.datetime(2024, 6, 4, 12, 0),
+        program_title="title",
+        performers=["a", "b"],
+        raw_data={
+            "description": "x" * 1000,
+            "episode": {"id": 1, "video": {"id": 2, "duration": 60.0}},
+        },
+    )
+
+
+def test_compact_program():
+    program = _get_program()
+    compact = CompactProgram.from_program(program)
+    assert not hasattr(compact, "__dict__")
+    assert compact.program_title == "title"
+    assert compact.raw_data == program.raw_data
+    assert compact.to_program() == program
+    assert compact == CompactProgram.from_program(copy.deepcopy(program))
+    assert compact.to_json() == program.to_json()
+    with pytest.raises(AttributeError):
+        compact.unknown = 1
+
+
+def test_interned_fields():
+    a = CompactProgram.from_program(_get_program())
+    b = CompactProgram.from_program(pickle.loads(pickle.dumps(_get_program())))
+    assert a.service_id is b.service_id
+
+
+def test_service_compact_keeps_minimal_raw_data():
+    program = _get_program()
+    compact = Hibiki().compact(program, keep_raw_data=False)
+    assert compact.raw_data == {"episode": {"video": {"id": 2}}}
+
+
+def test_compact_station():
+    station = Station("radiko.jp", "TBS", "TBSラジオ")
+    compact = CompactStation.from_station(station)
+    assert not hasattr(compact, "__dict__")
+    assert compact.to_station() == station
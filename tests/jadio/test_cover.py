@@ -0,0 +1,76 @@
+import os
+import time
+
+from jadio import CoverCache
+
+
+class _Response:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class _Client:
+    def __init__(self, images):
+        self.images = images
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        etag = f'"{len(self.images[url])}"'
+        if headers.get("If-None-Match") == etag:
+            return _Response(304)
+        return _Response(200, self.images[url], {"ETag": etag})
+
+
+def _get_cache(tmp_path, images, **kwargs):
+    cache = CoverCache(tmp_path, **kwargs)
+    cache._client = _Client(images)
+    return cache
+
+
+def test_get_uses_stored_image(tmp_path):
+    cache = _get_cache(tmp_path, {"a": b"aaa"})
+    assert cache.get("a") == b"aaa"
+    assert cache.get("a") == b"aaa"
+    assert len(cache._client.requests) == 1
+
+    # Another instance shares the images on disk.
+    cache = _get_cache(tmp_path, {"a": b"aaa"})
+    assert cache.get("a") == b"aaa"
+    assert len(cache._client.requests) == 0
+
+
+def test_get_revalidates_stale_image(tmp_path):
+    images = {"a": b"aaa"}
+    cache = _get_cache(tmp_path, images, revalidate_after=0)
+    assert cache.get("a") == b"aaa"
+    assert cache.get("a") == b"aaa"
+    assert cache._client.requests[-1] == ("a", {"If-None-Match": '"3"'})
+
+    images["a"] = b"aaaa"
+    assert cache.get("a") == b"aaaa"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = _get_cache(tmp_path, {"a": b"a" * 4, "b": b"b" * 4, "c": b"c" * 4})
+    cache._max_bytes = 8
+    cache.get("a")
+    cache.get("b")
+    # Make "a" older than "b" regardless of the file system time resolution.
+    now = time.time()
+    os.utime(cache._get_paths("a")[0], (now - 10, now - 10))
+    cache.get("c")
+    assert cache._load("a")[0] is None
+    assert cache._load("b")[0] == b"b" * 4
+    assert cache._load("c")[0] == b"c" * 4
+
+
+def test_prefetch_fetches_each_url_once(tmp_path):
+    cache = _get_cache(tmp_path, {"a": b"aaa", "b": b"bbb"})
+    assert cache.prefetch(["a", "b", "a", None, "x"], max_workers=2) == 2
+    assert sorted(url for url, _ in cache._client.requests) == ["a", "b", "x"]
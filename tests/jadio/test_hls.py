@@ -0,0 +1,130 @@
+import io
+import time
+from pathlib import Path
+
+import pytest
+
+from jadio.hls import HLSDownloader, UnsupportedStreamError, _strip_id3, parse_m3u8
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=52973,CODECS="mp4a.40.5"
+low/chunklist.m3u8
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=192000,CODECS="mp4a.40.2"
+high/chunklist.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:5
+#EXT-X-MEDIA-SEQUENCE:10
+#EXTINF:5,
+segment_10.aac
+#EXTINF:5,
+segment_11.aac
+#EXTINF:4.5,
+https://cdn.example.com/segment_12.aac?x=1
+#EXT-X-ENDLIST
+"""
+
+
+def test_parse_master_playlist():
+    playlist = parse_m3u8(MASTER, "https://example.com/a/playlist.m3u8")
+    assert playlist.is_master
+    assert max(playlist.variants) == (
+        192000,
+        "https://example.com/a/high/chunklist.m3u8",
+    )
+
+
+def test_parse_media_playlist():
+    playlist = parse_m3u8(MEDIA, "https://example.com/a/chunklist.m3u8")
+    assert not playlist.is_master and playlist.endlist and not playlist.encrypted
+    assert [s.sequence for s in playlist.segments] == [10, 11, 12]
+    assert [s.duration for s in playlist.segments] == [5.0, 5.0, 4.5]
+    assert playlist.segments[0].url == "https://example.com/a/segment_10.aac"
+    assert playlist.segments[2].url == "https://cdn.example.com/segment_12.aac?x=1"
+
+
+def test_download_rejects_encrypted_stream(tmp_path):
+    media = MEDIA.replace(
+        "#EXT-X-MEDIA-SEQUENCE:10",
+        '#EXT-X-MEDIA-SEQUENCE:10\n#EXT-X-KEY:METHOD=AES-128,URI="key"',
+    )
+    downloader = HLSDownloader()
+    downloader._get = lambda url, headers: media.encode()
+    with pytest.raises(UnsupportedStreamError):
+        downloader.download("https://example.com/a.m3u8", tmp_path / "a.m4a")
+    # Nothing is left for ffmpeg to trip over.
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_strip_id3():
+    tag = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"x" * 5
+    assert _strip_id3(tag + b"\xff\xf1data") == b"\xff\xf1data"
+    assert _strip_id3(b"\xff\xf1data") == b"\xff\xf1data"
+
+
+def test_fetch_writes_segments_in_order():
+    responses = {
+        "https://example.com/master.m3u8": MASTER.encode(),
+        "https://example.com/high/chunklist.m3u8": MEDIA.replace(
+            "https://cdn.example.com/segment_12.aac?x=1", "segment_12.ts"
+        ).encode(),
+    }
+
+    def get(url, headers):
+        if url in responses:
+            return responses[url]
+        sequence = int(url.rsplit("_", 1)[1].split(".")[0])
+        time.sleep(0.01 * (13 - sequence))  # finish in reverse order
+        return f"[{sequence}]".encode()
+
+    downloader = HLSDownloader(max_workers=3, buffer_size=1)
+    downloader._get = get
+    fp = io.BytesIO()
+    size = downloader.fetch("https://example.com/master.m3u8", fp)
+    assert fp.getvalue() == b"[10][11][12]"
+    assert size == len(fp.getvalue())
+
+
+def test_download_resumes_from_checkpoint(tmp_path, monkeypatch):
+    media = "#EXTM3U\n#EXT-X-TARGETDURATION:5\n"
+    media += "".join(f"#EXTINF:5,\nsegment_{i}.ts\n" for i in range(5))
+    media += "#EXT-X-ENDLIST\n"
+    requested = []
+    fail_at = [3]
+
+    def get(url, headers):
+        if url.endswith(".m3u8"):
+            return media.encode()
+        sequence = int(url.rsplit("_", 1)[1].split(".")[0])
+        if sequence == fail_at[0]:
+            raise ConnectionError("interrupted")
+        requested.append(sequence)
+        return f"[{sequence}]".encode()
+
+    def mux(src_path, dst_path, duration=None, tag=None, timeout=None):
+        Path(dst_path).write_bytes(Path(src_path).read_bytes())
+
+    monkeypatch.setattr("jadio.hls.mux", mux)
+    downloader = HLSDownloader(max_workers=1, buffer_size=0)
+    downloader._get = get
+    file_path = tmp_path / "a.m4a"
+    with pytest.raises(ConnectionError):
+        downloader.download("https://example.com/a.m3u8", file_path)
+    assert not file_path.exists()
+    assert (tmp_path / "a.m4a.part").read_bytes() == b"[0][1][2]"
+
+    fail_at[0] = None
+    requested.clear()
+    downloader.download("https://example.com/a.m3u8", file_path)
+    assert requested == [3, 4]
+    assert file_path.read_bytes() == b"[0][1][2][3][4]"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.m4a"]
+
+    # A different stream is not resumed.
+    (tmp_path / "a.m4a.part").write_bytes(b"[0]")
+    (tmp_path / "a.m4a.part.json").write_text('{"key": "x", "segments": 1, "size": 3}')
+    requested.clear()
+    downloader.download("https://example.com/a.m3u8", file_path)
+    assert requested == [0, 1, 2, 3, 4]
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+import requests
+
+from jadio import Hibiki, Onsen, Radiko
+from jadio.http_client import HTTPClient
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+def _get_client(results, **kwargs):
+    client = HTTPClient(**kwargs)
+    calls = []
+
+    def request(method, url, timeout=None, **kwargs):
+        calls.append((method, url, timeout))
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    client._session.request = request
+    return client, calls
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    waits = []
+    monkeypatch.setattr("jadio.http_client.time.sleep", waits.append)
+    return waits
+
+
+def test_retries_transient_failures(no_sleep):
+    results = [requests.ConnectionError(), _Response(503), _Response(200)]
+    client, calls = _get_client(results, retries=3, backoff=1.0)
+    assert client.get("https://example.com/").status_code == 200
+    assert len(calls) == 3
+    assert len(no_sleep) == 2
+    assert 0 <= no_sleep[0] <= 1.0 and 0 <= no_sleep[1] <= 2.0
+
+
+def test_gives_up_after_retries():
+    client, calls = _get_client([_Response(500)] * 3, retries=2)
+    assert client.get("https://example.com/").status_code == 500
+    client, calls = _get_client([requests.Timeout()] * 3, retries=2)
+    with pytest.raises(requests.Timeout):
+        client.get("https://example.com/")
+    assert len(calls) == 3
+
+
+def test_does_not_retry_post():
+    client, calls = _get_client([_Response(503)])
+    assert client.post("https://example.com/").status_code == 503
+    assert len(calls) == 1
+
+
+def test_retry_after(no_sleep):
+    client, _ = _get_client([_Response(429, {"Retry-After": "5"}), _Response(200)])
+    client.get("https://example.com/")
+    assert no_sleep == [5.0]
+
+
+def test_host_timeouts():
+    client = HTTPClient(timeout=10, host_timeouts={"radiko.jp": 3})
+    assert client.get_timeout("https://radiko.jp/v3/") == 3
+    assert client.get_timeout("https://api.radiko.jp/v3/") == 3
+    assert client.get_timeout("https://example.com/") == 10
+
+
+def test_async_client_retries(monkeypatch):
+    pytest.importorskip("aiohttp")
+    from jadio.http_client import AsyncHTTPClient
+    from jadio.testing.server import FakeServer
+
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr("jadio.http_client.asyncio.sleep", sleep)
+
+    async def main(url):
+        client = AsyncHTTPClient()
+        try:
+            responses = [await client.get(url) for _ in range(5)]
+            with pytest.raises(requests.HTTPError):
+                (await client.get(url + "unknown")).raise_for_status()
+        finally:
+            await client.aclose()
+        return responses
+
+    with FakeServer(error_rate=0.3, n_hibiki_programs=3) as server:
+        responses = asyncio.run(main(server.hibiki_url + "programs"))
+        stats = server.get_stats()
+    assert all(len(r.json()) == 3 for r in responses)
+    assert stats["errors"] > 1
+
+
+@pytest.mark.parametrize("service_cls", [Hibiki, Onsen, Radiko])
+def test_service_client_options(service_cls):
+    service = service_cls(pool_maxsize=20, host_timeouts={"example.com": 1})
+    assert service._client.get_timeout("https://a.example.com/") == 1
+    assert service._aclient.get_timeout("https://a.example.com/") == 1
+    assert service._aclient._limit_per_host == 20
+
+
+def test_service_close_closes_async_session():
+    pytest.importorskip("aiohttp")
+    from jadio.testing.server import FakeServer
+
+    with FakeServer(n_hibiki_programs=3) as server:
+        service = Hibiki(base_url=server.hibiki_url)
+        loop = asyncio.new_event_loop()
+        try:
+            assert len(loop.run_until_complete(service.aget_programs())) == 3
+            session = service._aclient._session
+            service.close()
+            assert session.closed
+            assert service._aclient._session is None
+        finally:
+            loop.close()
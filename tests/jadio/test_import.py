@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+import jadio
+
+HEAVY_MODULES = ["selenium", "webdriver_manager", "requests", "mutagen", "aiohttp"]
+
+SCRIPT = """
+import sys
+
+import jadio
+{access}
+print(",".join(m for m in {modules!r} if m in sys.modules))
+"""
+
+
+def _import(access: str = "", modules=HEAVY_MODULES):
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(access=access, modules=modules)],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout.strip()
+    return [m for m in output.split(",") if m]
+
+
+def test_import_does_not_load_heavy_modules():
+    # Checking the loaded modules instead of timing the import keeps the
+    # test stable on loaded machines.
+    loaded = _import(modules=HEAVY_MODULES + ["dataclasses_json", "asyncio"])
+    assert loaded == []
+
+
+def test_service_does_not_load_other_services_dependencies():
+    loaded = _import("jadio.Hibiki")
+    assert "selenium" not in loaded
+    assert "mutagen" not in loaded
+    assert "aiohttp" not in loaded
+    loaded = _import("jadio.Jadio")
+    assert "selenium" not in loaded
+    assert "aiohttp" not in loaded
+
+
+def test_lazy_attributes():
+    assert jadio.Program is jadio.program.Program
+    assert jadio.Hibiki is jadio.services.Hibiki
+    assert set(jadio.__all__) <= set(dir(jadio))
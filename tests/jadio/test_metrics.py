@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from jadio import metrics
+from jadio.metrics import MetricsCollector
+from jadio.services import Hibiki
+from jadio.testing.server import FakeServer
+
+
+@pytest.fixture
+def collector():
+    ret = MetricsCollector()
+    metrics.add_observer(ret)
+    yield ret
+    metrics.remove_observer(ret)
+
+
+def test_disabled():
+    assert not metrics.is_enabled()
+    assert metrics.span("a") is metrics.span("b")
+    metrics.count("a")
+
+
+def test_collector(collector):
+    with metrics.span("ffmpeg", service="radiko.jp"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span("ffmpeg", service="radiko.jp"):
+            raise ValueError()
+    metrics.count("http_requests", host="radiko.jp")
+    metrics.count("http_requests", 2, host="radiko.jp")
+    metrics.count("http_requests", host="onsen.ag")
+
+    assert collector.get_counter("http_requests") == 4
+    assert collector.get_counter("http_requests", host="radiko.jp") == 3
+    data = json.loads(collector.to_json())
+    assert [(x["labels"], x["count"]) for x in data["spans"]] == [
+        ({"error": "ValueError", "service": "radiko.jp"}, 1),
+        ({"service": "radiko.jp"}, 1),
+    ]
+
+    text = collector.to_prometheus()
+    assert "# TYPE jadio_http_requests_total counter" in text
+    assert 'jadio_http_requests_total{host="radiko.jp"} 3' in text
+    assert 'jadio_ffmpeg_seconds_count{service="radiko.jp"} 1' in text
+    assert "# TYPE jadio_ffmpeg_seconds_max gauge" in text
+
+    collector.reset()
+    assert collector.to_dict() == {"counters": [], "spans": []}
+
+
+def test_http_client(collector):
+    with FakeServer(n_hibiki_programs=3) as server:
+        with Hibiki(base_url=server.hibiki_url) as service:
+            service.get_programs()
+        sent = server.get_stats()["bytes"]
+    assert collector.get_counter("http_responses", host="127.0.0.1") == 1
+    assert collector.get_counter("http_bytes", host="127.0.0.1") == sent
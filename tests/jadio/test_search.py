@@ -0,0 +1,74 @@
+import random
+
+from jadio import Program, ProgramIndex
+
+
+def _get_program(episode_id: int, **kwargs) -> Program:
+    return Program(service_id="s", program_id="p", episode_id=episode_id, **kwargs)
+
+
+PROGRAMS = [
+    _get_program(0, program_title="鬼滅ラヂヲ", performers=["櫻井孝宏", "小西克幸"]),
+    _get_program(1, program_title="ラジオ", description="鬼滅の刃の特集", guests=["鬼"]),
+    _get_program(2, program_title="JUNK", performers="伊集院光", information="月曜日"),
+    _get_program(3, program_title="x", performers=["櫻井孝宏"]),
+]
+
+
+def _linear_search(programs, keyword):
+    return [
+        p
+        for p in programs
+        if (
+            keyword in p.program_title
+            or keyword in (p.description or "")
+            or keyword in (p.information or "")
+            or keyword in (p.performers or [])
+            or keyword in (p.guests or [])
+        )
+    ]
+
+
+def test_search():
+    index = ProgramIndex(PROGRAMS)
+    assert index.search("鬼滅") == PROGRAMS[:2]
+    assert index.search("櫻井孝宏") == [PROGRAMS[0], PROGRAMS[3]]
+    assert index.search("櫻井") == []  # performers are matched exactly
+    assert index.search("集院") == [PROGRAMS[2]]  # unless it is a string
+    assert index.search("鬼") == PROGRAMS[:2]
+    assert index.search("滅ラ") == [PROGRAMS[0]]
+    assert index.search("ラヂオ") == []
+    assert index.search_many(["x", "月曜"]) == {
+        "x": [PROGRAMS[3]],
+        "月曜": [PROGRAMS[2]],
+    }
+    assert index.search_any(["JUNK", "鬼滅"]) == PROGRAMS[:3]
+
+
+def test_incremental_update():
+    index = ProgramIndex(PROGRAMS)
+    updated = _get_program(1, program_title="ラジオ", description="特集")
+    index.add([updated, _get_program(4, program_title="鬼滅")])
+    assert len(index) == 5
+    assert [p.episode_id for p in index.search("鬼滅")] == [0, 4]
+    assert index.search("特集") == [updated]
+    assert index.remove(updated) and not index.remove(updated)
+    assert index.search("特集") == []
+
+
+def test_same_as_linear_search():
+    rng = random.Random(0)
+    chars = "鬼滅の刃ラジオabc"
+    programs = [
+        _get_program(
+            i,
+            program_title="".join(rng.choice(chars) for _ in range(8)),
+            description="".join(rng.choice(chars) for _ in range(20)),
+            performers=[rng.choice(chars)],
+        )
+        for i in range(200)
+    ]
+    index = ProgramIndex(programs)
+    for _ in range(100):
+        keyword = "".join(rng.choice(chars) for _ in range(rng.randint(1, 3)))
+        assert index.search(keyword) == _linear_search(programs, keyword)
@@ -0,0 +1,87 @@
+import datetime
+
+from jadio import Program, Radiko
+from jadio.station import Station
+from jadio.sync import SyncState
+
+WEEKLY_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<radiko>
+  <ttl>1800</ttl>
+  <srvtime>{srvtime}</srvtime>
+  <stations>
+    <station id="TBS">
+      <name>TBSラジオ</name>
+      <progs>
+        <date>20240604</date>
+        <prog id="1" master_id="" ft="20240604010000" to="20240604030000"
+              ftl="0100" tol="0300" dur="7200">
+          <title>{title}</title>
+          <url>https://www.tbsradio.jp/</url>
+          <failed_record>0</failed_record>
+          <ts_in_ng>0</ts_in_ng>
+          <ts_out_ng>0</ts_out_ng>
+          <desc>desc</desc>
+          <info>info</info>
+          <pfm>a、b</pfm>
+          <img>https://example.com/a.jpg</img>
+          <metas />
+        </prog>
+        <prog id="2" master_id="" ft="29990604010000" to="29990604030000"
+              ftl="0100" tol="0300" dur="7200">
+          <title>future</title>
+          <url />
+          <failed_record>0</failed_record>
+          <ts_in_ng>0</ts_in_ng>
+          <ts_out_ng>0</ts_out_ng>
+          <desc>desc</desc>
+          <info>info</info>
+          <pfm />
+          <img />
+          <metas />
+        </prog>
+      </progs>
+    </station>
+  </stations>
+</radiko>
+"""
+
+
+def test_sync_state_update():
+    state = SyncState()
+    programs = [
+        Program(program_id="p", episode_id=i, program_title="a") for i in range(2)
+    ]
+    assert state.update("s", "programs", programs) == programs
+
+    state = SyncState.decode(state.encode())
+    changed = Program(program_id="p", episode_id=1, program_title="b")
+    added = Program(program_id="p", episode_id=2, program_title="a")
+    assert state.update("s", "programs", [programs[0], changed, added]) == [
+        changed,
+        added,
+    ]
+    assert state.update("s", "programs", [programs[0], changed, added]) == []
+
+
+def test_radiko_get_new_programs():
+    contents = {"TBS": WEEKLY_XML.format(title="title", srvtime=1717430400).encode()}
+    parsed = []
+    service = Radiko()
+    service.get_stations = lambda **kwargs: [Station("radiko.jp", "TBS", "TBS")]
+    service._get_program_station_weekly_content = lambda x: contents[x]
+    parse = service._parse_station_programs
+    service._parse_station_programs = lambda x: parsed.append(x) or parse(x)
+
+    programs, state = service.get_new_programs(only_downloadable=True)
+    assert [p.episode_id for p in programs] == [1]
+    assert programs[0].pub_date == datetime.datetime(2024, 6, 4, 1, 0)
+
+    # The unchanged response is not parsed again even if the server time in
+    # it differs.
+    contents["TBS"] = WEEKLY_XML.format(title="title", srvtime=1717430460).encode()
+    programs, state = service.get_new_programs(state, only_downloadable=True)
+    assert programs == [] and len(parsed) == 1
+
+    contents["TBS"] = WEEKLY_XML.format(title="new title", srvtime=1717430520).encode()
+    programs, state = service.get_new_programs(state, only_downloadable=True)
+    assert [p.program_title for p in programs] == ["new title"]
@@ -0,0 +1,123 @@
+import datetime
+import shutil
+import struct
+import zlib
+from pathlib import Path
+
+import pytest
+
+from jadio import Hibiki, Program, hls
+from jadio.tag import FFmpegTag, get_mp4_tag, set_mp4_tag
+from jadio.testing.data import adts_frames, empty_mp4
+from jadio.testing.server import FakeServer
+
+_PNG = b"\x89PNG\r\n\x1a\n" + bytes(16)
+
+
+def _get_tag():
+    program = Program(
+        service_id="example.com",
+        program_title="program",
+        episode_id=1,
+        episode_title="episode",
+        pub_date=datetime.datetime(2024, 6, 3, 5),
+        performers=["a", "b"],
+        link_url="https://example.com/1",
+    )
+    tag = get_mp4_tag("artist", program, set_cover_image=False)
+    tag["covr"] = [_PNG]
+    return tag
+
+
+def test_ffmpeg_tag(tmp_path):
+    file_path = tmp_path / "a.m4a"
+    with FFmpegTag(_get_tag(), file_path, attach_cover=True) as tag:
+        cover_path = tmp_path / "a.m4a.cover.png"
+        assert cover_path.read_bytes() == _PNG
+        assert tag.get_input_args() == ["-i", str(cover_path)]
+        args = tag.get_output_args()
+        assert args[:8] == ["-map", "0:a", "-map", "1:v", "-c:v", "copy"] + [
+            "-disposition:v:0",
+            "attached_pic",
+        ]
+        assert "artist=artist" in args and "title=episode" in args
+        assert "episode_id=1" in args
+        # Unset fields such as the description are not passed to ffmpeg.
+        assert not any(x.startswith("description=") for x in args)
+        assert tag.get_rest() == {"\xa9con": "a, b", "\xa9url": "https://example.com/1"}
+    assert not cover_path.exists()
+
+
+def test_ffmpeg_tag_without_cover(tmp_path):
+    with FFmpegTag(_get_tag(), tmp_path / "a.mp4", attach_cover=False) as tag:
+        assert tag.get_input_args() == []
+        assert "-map" not in tag.get_output_args()
+        assert tag.get_rest()["covr"] == [_PNG]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_tag_while_muxing(tmp_path, monkeypatch):
+    pytest.importorskip("mutagen")
+    from mutagen import mp4
+
+    muxed = []
+
+    def mux(src_path, dst_path, duration=None, tag=None, timeout=None):
+        muxed.append(tag.get_output_args())
+        Path(dst_path).write_bytes(empty_mp4())
+
+    monkeypatch.setattr("jadio.hls.mux", mux)
+    with FakeServer(n_hibiki_programs=1) as server:
+        with Hibiki(base_url=server.hibiki_url, native_hls=True) as service:
+            program = service.get_programs()[0]
+            file_path = service.download(
+                program,
+                tmp_path / "a.m4a",
+                set_cover_image=False,
+                tag_while_muxing=True,
+            )
+    assert f"album={program.program_title}" in muxed[0]
+    # Only the rest of the tag is set after muxing.
+    media = mp4.MP4(str(file_path))
+    assert sorted(media.keys()) == ["\xa9con", "\xa9url"]
+
+
+def _get_png() -> bytes:
+    """1x1 PNG that ffmpeg can read."""
+
+    def chunk(name: bytes, data: bytes) -> bytes:
+        body = name + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    ihdr = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    idat = zlib.compress(b"\x00" + bytes(3))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", ihdr)
+        + chunk(b"IDAT", idat)
+        + chunk(b"IEND", b"")
+    )
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_ffmpeg_tag_with_ffmpeg(tmp_path):
+    pytest.importorskip("mutagen")
+    from mutagen import mp4
+
+    src_path = tmp_path / "a.aac"
+    src_path.write_bytes(adts_frames(1.0))
+    file_path = tmp_path / "a.m4a"
+    tag = _get_tag()
+    tag["covr"] = [_get_png()]
+    with FFmpegTag(tag, file_path, attach_cover=True) as ffmpeg_tag:
+        hls.mux(src_path, file_path, tag=ffmpeg_tag)
+        set_mp4_tag(file_path, ffmpeg_tag.get_rest())
+    media = mp4.MP4(str(file_path))
+    # The file has the same tag as one tagged only by `set_mp4_tag`.
+    for key, value in tag.items():
+        if value is None:
+            assert key not in media
+        elif key == "covr":
+            assert [bytes(x) for x in media[key]] == value
+        else:
+            assert media[key] == [value], key
@@ -0,0 +1,36 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+import pytest
+
+from jadio.util import arun, map_concurrently, submit_daemon
+
+
+def test_map_concurrently_keeps_order():
+    def fn(x: int) -> int:
+        time.sleep(0.01 * (5 - x))
+        return x * 2
+
+    assert map_concurrently(fn, range(5), max_workers=1) == [0, 2, 4, 6, 8]
+    assert map_concurrently(fn, range(5), max_workers=4) == [0, 2, 4, 6, 8]
+
+
+def test_arun():
+    asyncio.run(arun([sys.executable, "-c", "pass"]))
+    with pytest.raises(subprocess.CalledProcessError):
+        asyncio.run(arun([sys.executable, "-c", "import sys; sys.exit(3)"]))
+
+
+def test_submit_daemon_does_not_block_exit():
+    assert submit_daemon(sum, [1, 2]).result() == 3
+    with pytest.raises(ZeroDivisionError):
+        submit_daemon(lambda: 1 / 0).result()
+    # An abandoned call does not keep the interpreter alive.
+    script = "from jadio.util import submit_daemon; import time\n"
+    script += "submit_daemon(time.sleep, 10).result(timeout=0.1)"
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True)
+    assert result.returncode != 0 and b"TimeoutError" in result.stderr
+    assert time.monotonic() - start < 5
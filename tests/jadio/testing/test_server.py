@@ -0,0 +1,71 @@
+import io
+
+import pytest
+
+from jadio import Jadio
+from jadio.hls import HLSDownloader
+from jadio.services import Hibiki, Onsen, Radiko
+from jadio.testing.server import FakeServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeServer(n_stations=5, n_onsen_programs=10, n_hibiki_programs=10) as ret:
+        yield ret
+
+
+def test_radiko(server):
+    with Radiko(base_url=server.radiko_url, max_workers=5) as service:
+        assert len(service.get_stations()) == 5
+        programs = service.get_programs()
+        assert len(programs) == 5 * 7 * 40
+
+
+def test_onsen(server):
+    with Onsen(base_url=server.onsen_url) as service:
+        programs = service.get_programs()
+        assert len(programs) > 0
+        assert service._driver is None
+
+
+def test_hibiki(server):
+    with Hibiki(base_url=server.hibiki_url) as service:
+        assert len(service.get_programs()) == 10
+
+
+def test_jadio(server):
+    with Jadio(server.get_configs()) as service:
+        programs = service.get_programs()
+        assert {p.service_id for p in programs} == {
+            "radiko.jp",
+            "onsen.ag",
+            "hibiki-radio.jp",
+        }
+
+
+def test_stream(server):
+    with Hibiki(base_url=server.hibiki_url) as service:
+        program = service.get_programs()[0]
+        video_id = program.raw_data["episode"]["video"]["id"]
+        url = service._get(f"videos/play_check?video_id={video_id}")["playlist_url"]
+    fp = io.BytesIO()
+    downloader = HLSDownloader()
+    try:
+        size = downloader.fetch(url, fp)
+    finally:
+        downloader.close()
+    # 48 kbps for 1800.5 seconds
+    assert size == pytest.approx(48000 / 8 * 1800.5, rel=0.01)
+    assert fp.getvalue()[:2] == b"\xff\xf1"
+
+
+def test_error_injection(monkeypatch):
+    monkeypatch.setattr("jadio.http_client.time.sleep", lambda x: None)
+    with FakeServer(error_rate=0.3, n_hibiki_programs=3) as server:
+        for _ in range(5):
+            # Injected errors are retried by the client.
+            with Hibiki(base_url=server.hibiki_url) as service:
+                assert len(service.get_programs()) == 3
+        stats = server.get_stats()
+    assert stats["errors"] > 0
+    assert stats["hibiki_programs"] == 5